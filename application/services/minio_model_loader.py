@@ -1,9 +1,27 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
 import joblib
 import understand as und
-from minio import Minio
 from io import BytesIO
 from codart.learner.sbr_initializer.utils.utility import logger
 
+# The models are cached on disk by the SHA-256 of their content (blobs/<sha256>.joblib), and an index maps
+# each MinIO object to the ETag and SHA-256 of its cached version.
+DEFAULT_MODEL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "codart", "models")
+
+# Process-wide loaders, see get_model_loader
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+
+def is_offline_mode() -> bool:
+    """Whether models are read from the local cache only (MODEL_LOADER_OFFLINE=1)"""
+    return os.getenv("MODEL_LOADER_OFFLINE", "0").lower() in ("1", "true", "yes")
+
 
 class MinioModelLoader:
     def __init__(
@@ -13,43 +31,86 @@ class MinioModelLoader:
         minio_secret_key: str,
         bucket_name: str = "ml-models",
         dataset_number: int = 1,
+        cache_dir: str = None,
+        offline: bool = None,
     ):
-        """Initialize MinIO client for model loading"""
-        self.minio_client = Minio(
-            endpoint=minio_endpoint,
-            access_key=minio_access_key,
-            secret_key=minio_secret_key,
-            secure=False,
-        )
+        """Initialize the model loader, the MinIO client is created on first use"""
+        self.minio_endpoint = minio_endpoint
+        self.minio_access_key = minio_access_key
+        self.minio_secret_key = minio_secret_key
         self.bucket_name = bucket_name
         self.ds_number = dataset_number
-        try:
-            if not self.minio_client.bucket_exists(self.bucket_name):
-                self.minio_client.make_bucket(self.bucket_name)
-                print(f"Created bucket: {self.bucket_name}")
-        except Exception as e:
-            print(f"Could not verify bucket existence: {e}")
+        self.cache_dir = cache_dir or os.getenv("MODEL_CACHE_DIR", DEFAULT_MODEL_CACHE_DIR)
+        self.offline = is_offline_mode() if offline is None else offline
+        self._minio_client = None
+        self._models = {}  # Model type --> loaded model
+        self._versions = {}  # Model path --> SHA-256 of the loaded model content ('dummy' for dummy models)
+        self._lock = threading.RLock()
+
+    @property
+    def minio_client(self):
+        """The MinIO client, created (and the bucket checked) on first use"""
+        if self._minio_client is None:
+            from minio import Minio
+
+            self._minio_client = Minio(
+                endpoint=self.minio_endpoint,
+                access_key=self.minio_access_key,
+                secret_key=self.minio_secret_key,
+                secure=False,
+            )
+            try:
+                if not self._minio_client.bucket_exists(self.bucket_name):
+                    self._minio_client.make_bucket(self.bucket_name)
+                    print(f"Created bucket: {self.bucket_name}")
+            except Exception as e:
+                print(f"Could not verify bucket existence: {e}")
+        return self._minio_client
+
+    def model_path(self, model_type: str) -> str:
+        return f"models/DS{self.ds_number}/{model_type}_DS{self.ds_number}.joblib"
 
     def load_model(self, model_type: str):
-        """Load a model from MinIO with fallback to dummy models"""
-        from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-        from sklearn.neural_network import MLPRegressor
-        from sklearn.preprocessing import StandardScaler
-        import numpy as np
+        """Load a model once per loader, from the local cache if it is up to date, otherwise from MinIO"""
+        with self._lock:
+            if model_type not in self._models:
+                self._models[model_type] = self._load_model(model_type)
+            return self._models[model_type]
+
+    def model_version(self, model_type: str) -> str:
+        """The SHA-256 of the content of a model ('dummy' for a dummy model), the model is loaded if needed"""
+        self.load_model(model_type)
+        return self._versions.get(self.model_path(model_type), "unknown")
+
+    def _load_model(self, model_type: str):
+        """Load a model from MinIO (through the local cache) with fallback to dummy models"""
+        model_path = self.model_path(model_type)
+        if self.offline:
+            model = self._load_cached_model(model_path)
+            if model is not None:
+                return model
+            logger.warning(f"Model {model_path} is not in the local cache {self.cache_dir} (offline mode)")
+            return self._create_dummy_model(model_type, save=False)
 
-        model_path = f"models/DS{self.ds_number}/{model_type}_DS{self.ds_number}.joblib"
         try:
             # Check if the object exists first
             try:
-                self.minio_client.stat_object(
+                stat = self.minio_client.stat_object(
                     bucket_name=self.bucket_name, object_name=model_path
                 )
-                # Object exists, proceed with loading
+                # Object exists, use the cached copy of the same version if any
+                model = self._load_cached_model(model_path, etag=stat.etag)
+                if model is not None:
+                    return model
                 model_data = self.minio_client.get_object(
                     bucket_name=self.bucket_name, object_name=model_path
                 )
-                model = joblib.load(BytesIO(model_data.data))
+                content = model_data.data
                 model_data.close()
+                self._verify_etag(model_path, content, stat.etag)
+                model = joblib.load(BytesIO(content))
+                self._versions[model_path] = hashlib.sha256(content).hexdigest()
+                self._store_cached_model(model_path, content, etag=stat.etag)
                 logger.info(f"Successfully loaded model {model_path} from MinIO")
                 return model
             except Exception as e:
@@ -63,10 +124,79 @@ class MinioModelLoader:
                     raise
         except Exception as e:
             logger.error(f"Error loading model {model_path}: {str(e)}")
+            model = self._load_cached_model(model_path)
+            if model is not None:
+                logger.info(f"Using the cached model {model_path}")
+                return model
             logger.info("Falling back to dummy model")
             return self._create_dummy_model(model_type)
 
-    def _create_dummy_model(self, model_type):
+    # Local cache
+    def _index_path(self):
+        return os.path.join(self.cache_dir, "index.json")
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.cache_dir, "blobs", f"{sha256}.joblib")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path(), mode="r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def _cache_key(self, model_path):
+        return f"{self.minio_endpoint}/{self.bucket_name}/{model_path}"
+
+    def _load_cached_model(self, model_path: str, etag: str = None):
+        """Load the cached version of a model (with the given ETag if any) after verifying its hash"""
+        entry = self._read_index().get(self._cache_key(model_path))
+        if entry is None or (etag is not None and entry.get("etag") != etag):
+            return None
+        try:
+            with open(self._blob_path(entry["sha256"]), mode="rb") as fp:
+                content = fp.read()
+        except OSError:
+            return None
+        if hashlib.sha256(content).hexdigest() != entry["sha256"]:
+            logger.warning(f"The cached model {model_path} is corrupted and is ignored")
+            return None
+        logger.info(f"Loaded model {model_path} from the local cache")
+        model = joblib.load(BytesIO(content))
+        self._versions[model_path] = entry["sha256"]
+        return model
+
+    def _store_cached_model(self, model_path: str, content: bytes, etag: str):
+        try:
+            sha256 = hashlib.sha256(content).hexdigest()
+            os.makedirs(os.path.dirname(self._blob_path(sha256)), exist_ok=True)
+            self._write_atomic(self._blob_path(sha256), content)
+            index = self._read_index()
+            index[self._cache_key(model_path)] = {"etag": etag, "sha256": sha256}
+            self._write_atomic(self._index_path(), json.dumps(index, indent=2).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Could not cache model {model_path} in {self.cache_dir}: {e}")
+
+    @staticmethod
+    def _write_atomic(path, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as fp:
+                fp.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _verify_etag(model_path, content: bytes, etag: str):
+        """The ETag of an object uploaded in one part is the MD5 of its content"""
+        etag = (etag or "").strip('"')
+        if len(etag) == 32 and "-" not in etag and hashlib.md5(content).hexdigest() != etag:
+            raise ValueError(f"The content of {model_path} does not match its ETag")
+
+    def _create_dummy_model(self, model_type, save=True):
         """Create a dummy model when the real one isn't available"""
         from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
         from sklearn.neural_network import MLPRegressor
@@ -74,6 +204,7 @@ class MinioModelLoader:
         import numpy as np
 
         logger.info(f"Creating dummy {model_type} model")
+        self._versions[self.model_path(model_type)] = "dummy"
         # Create and train a minimal model
         X_dummy = np.array([[0, 0, 0, 0], [1, 1, 1, 1]])
         y_dummy = np.array([0, 1])
@@ -97,19 +228,15 @@ class MinioModelLoader:
             model.fit(X_dummy, y_dummy)
 
         # Optionally, save the dummy model to MinIO for future use
-        self._save_dummy_model(model, model_type)
+        if save:
+            self._save_dummy_model(model, model_type)
 
         return model
 
     def _save_dummy_model(self, model, model_type):
         """Save a dummy model to MinIO for future use"""
         try:
-            model_path = (
-                f"models/DS{self.ds_number}/{model_type}_DS{self.ds_number}.joblib"
-            )
-
-            # Create the directory structure if it doesn't exist
-            dir_path = f"models/DS{self.ds_number}"
+            model_path = self.model_path(model_type)
 
             # Serialize the model
             buffer = BytesIO()
@@ -127,3 +254,24 @@ class MinioModelLoader:
             logger.info(f"Saved dummy model to {model_path}")
         except Exception as e:
             logger.warning(f"Could not save dummy model to MinIO: {e}")
+
+
+def get_model_loader(
+    minio_endpoint: str,
+    minio_access_key: str,
+    minio_secret_key: str,
+    bucket_name: str = "ml-models",
+    dataset_number: int = 1,
+) -> MinioModelLoader:
+    """Return the loader of a bucket and dataset, created once per process (its models are loaded once)"""
+    key = (minio_endpoint, bucket_name, dataset_number)
+    with _loaders_lock:
+        if key not in _loaders:
+            _loaders[key] = MinioModelLoader(
+                minio_endpoint=minio_endpoint,
+                minio_access_key=minio_access_key,
+                minio_secret_key=minio_secret_key,
+                bucket_name=bucket_name,
+                dataset_number=dataset_number,
+            )
+        return _loaders[key]
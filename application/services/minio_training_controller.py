@@ -74,15 +74,24 @@ class ModelTrainingService:
         dataset_path: str,
         project_name: str = None,
         project_version: str = None,
+        search: str = None,
+        n_jobs: int = None,
     ):
         """
         Train dataset and save models directly to MinIO without local files
 
+        The base models are trained concurrently and share a budget of n_jobs CPUs, and their hyperparameter
+        searches are cached by the hash of the dataset (see `Regression.regress_concurrently`).
+
         Args:
             ds_number (int): Dataset number to train
             dataset_path (str): Path to dataset in MinIO
             project_name (str, optional): Project name to include in model paths
             project_version (str, optional): Project version to include in model paths
+            search (str, optional): 'grid' or 'halving' (successive-halving) search.
+                Defaults to the TRAINING_SEARCH environment variable, or 'grid' (halving is opt-in).
+            n_jobs (int, optional): The CPU budget of the training. Defaults to the TRAINING_N_JOBS
+                environment variable, or the number of CPUs.
 
         Returns:
             dict: Training results and model paths
@@ -119,10 +128,23 @@ class ModelTrainingService:
         results = {}
         trained_models = {}
 
-        # First, train all the base models and save them to memory
-        for config in model_configs:
-            if config["model_type"] == "VR1":
-                continue  # Skip VR1 for now, it will be trained after the base models
+        # First, train all the base models concurrently and keep them in memory
+        base_model_configs = [config for config in model_configs if config["model_type"] != "VR1"]
+        try:
+            models = reg.regress_concurrently(
+                model_paths={config["model_number"]: None for config in base_model_configs},  # Don't save to file
+                n_jobs=n_jobs or int(os.getenv("TRAINING_N_JOBS", "0")) or None,
+                search=search or os.getenv("TRAINING_SEARCH", "grid"),
+                return_models=True,  # Return the trained models
+            )
+        except Exception as e:
+            models = {}
+            for config in base_model_configs:
+                results[config["model_type"]] = {"error": str(e)}
+
+        for config in base_model_configs:
+            if config["model_number"] not in models:
+                continue
 
             model_type = config["model_type"]
             minio_model_path = (
@@ -130,12 +152,7 @@ class ModelTrainingService:
             )
 
             try:
-                # Train the model without saving to file, but return it
-                model = reg.regress(
-                    model_path=None,  # Don't save to file
-                    model_number=config["model_number"],
-                    return_model=True,  # Return the trained model
-                )
+                model = models[config["model_number"]]
 
                 # Store the trained model in memory cache for VR1
                 model_key = f"{model_type}_DS{ds_number}"
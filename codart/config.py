@@ -22,7 +22,12 @@ CROSSOVER_PROBABILITY = float(os.environ.get("CROSSOVER_PROBABILITY"))
 
 WARM_START = bool(int(os.environ.get("WARM_START")))
 
-USE_CPP_BACKEND = bool(int(os.environ.get("USE_CPP_BACKEND")))
+USE_CPP_BACKEND = bool(int(os.environ.get("USE_CPP_BACKEND", 1)))  # See codart.utility.parse_backend
+USE_OBJECTIVE_CACHE = bool(int(os.environ.get("USE_OBJECTIVE_CACHE", 0)))  # Reuses objective values across runs
+PREFIX_TRIE_EVALUATION = bool(int(os.environ.get("PREFIX_TRIE_EVALUATION", 0)))
+N_EVALUATION_WORKERS = int(os.environ.get("N_EVALUATION_WORKERS", 1))
+PROFILING = bool(int(os.environ.get("PROFILING", 0)))
+PROFILING_FORMAT = os.environ.get("PROFILING_FORMAT", "jsonl")  # jsonl or chrome
 
 PROJECT_ROOT_DIR = os.environ.get("PROJECT_ROOT_DIR")
 CSV_ROOT_DIR = os.environ.get("CSV_ROOT_DIR")
@@ -409,6 +414,14 @@ FORMATTER = logging.Formatter('%(asctime)s %(levelname)-8s %(message)s')
 if not os.path.exists(PROJECT_LOG_DIR):
     os.makedirs(PROJECT_LOG_DIR)
 
+# Objective values cache shared by all executions (including resumed ones) on the project
+OBJECTIVE_CACHE_PATH = os.environ.get(
+    "OBJECTIVE_CACHE_PATH",
+    os.path.join(f'{PROJECT_PATH}_CodART_Log', 'objective_cache.sqlite3')
+)
+# Git worktrees and Understand databases of the parallel evaluation workers
+WORKERS_ROOT_DIR = os.environ.get("WORKERS_ROOT_DIR", f'{PROJECT_PATH}_CodART_Workers')
+
 # logging.basicConfig(
 #     format='%(asctime)s %(levelname)-8s %(message)s',
 #     datefmt='%Y-%m-%d %H:%M:%S',
@@ -460,6 +473,10 @@ def log_experiment_info():
     logger.info(f"Mutation probability: {MUTATION_PROBABILITY}")
     logger.info(f"Warm start mode: {WARM_START}")
     logger.info(f"CPP back-end mode: {USE_CPP_BACKEND}")
+    logger.info(f"Objective cache: {OBJECTIVE_CACHE_PATH if USE_OBJECTIVE_CACHE else 'disabled'}")
+    logger.info(f"Prefix-sharing trie evaluation: {PREFIX_TRIE_EVALUATION}")
+    logger.info(f"Number of evaluation workers: {N_EVALUATION_WORKERS}")
+    logger.info(f"Profiling: {PROFILING_FORMAT if PROFILING else 'disabled'}")
     logger.info(f"Experimenter: {EXPERIMENTER}")
     logger.info(f"Main script running the experiments: {SCRIPT}")
     logger.info(f"Experiment description: {DESCRIPTION}")
@@ -18,6 +18,7 @@ from torchrl.envs.utils import check_env_specs, step_mdp
 from codart.utility.directory_utils import update_understand_database
 from codart.refactorings.handler import RefactoringManager, RefactoringOperation
 from codart.metrics.qmood import DesignQualityAttributes
+from codart.metrics.incremental_metrics import IncrementalMetricsStore
 from multiprocessing import Process, Array
 import pandas as pd
 import os
@@ -62,6 +63,8 @@ class RefactoringSequenceEnvironment(EnvBase):
         self.n_obj = n_obj
         self.evaluate_in_parallel = False  # Default value for evaluate_in_parallel
         self.verbose_design_metrics = False  # Default value for verbose_design_metrics
+        # Keeps the class-level metrics between steps, such that only the changed classes are recomputed
+        self.metrics_store = IncrementalMetricsStore(udb_path=udb_path, project_dir=project_path)
         self.generator = SmellInitialization(
             udb_path=udb_path,
             project_name=project_name,
@@ -456,7 +459,7 @@ class RefactoringSequenceEnvironment(EnvBase):
     def calculate_metrics(self):
         objective_values = []
         arr = Array("d", range(self.n_obj))
-        qmood_quality_attributes = DesignQualityAttributes(udb_path=self.udb_path)
+        qmood_quality_attributes = DesignQualityAttributes(udb_path=self.udb_path, metrics_store=self.metrics_store)
         if self.evaluate_in_parallel:
             p1 = Process(
                 target=self.calc_qmood_objectives,
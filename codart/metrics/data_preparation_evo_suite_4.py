@@ -1,5 +1,7 @@
 import os
+import json
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import warnings
 import math
 import pandas as pd
@@ -848,6 +850,7 @@ class PreProcess:
             db = understand.open(os.path.join(udbs_path, f))
             cls.write_project_classes(project_name=f[:-4], db=db, csv_path=class_list_csv_path_root + f[:-4] + '.csv')
             print('processing understand db file {0} was finished'.format(f))
+            UnderstandUtility.clear_index(db)
             db.close()
 
     @classmethod
@@ -918,6 +921,7 @@ class PreProcess:
             cls.compute_metrics_by_class_list(project_name=f[:-4], database=db, class_list=df, csv_path=csvs_path)
 
             print('processing understand db file {0} was finished'.format(f))
+            UnderstandUtility.clear_index(db)
             db.close()
 
     @classmethod
@@ -989,6 +993,89 @@ class PreProcess:
         print('df for class {0} with shape {1}'.format(project_name, df.shape))
         return df
 
+    @classmethod
+    def build_metrics_dataset(cls, udbs_path: str = r'sf110_without_test',
+                              class_list_csv_path: str = r'runtime_result/evosuit160_sf110_result_html_with_project.csv',
+                              dataset_path: str = r'dataset06/DS060Raw',
+                              n_jobs: int = None,
+                              resume: bool = True):
+        """
+        Parallel and resumable version of `extract_metrics_and_coverage_all` and `create_complete_dataset`.
+        The projects (Understand databases) are shared between a pool of worker processes,
+        each worker opens the database of one project at a time and computes the metrics of all its classes.
+        The metrics of each project are written to one partition of a Parquet dataset
+        (`dataset_path/Project=<project name>/part-0.parquet`), and finished projects are recorded in
+        `dataset_path/_finished_projects.json`, such that an interrupted run resumes with the remaining projects.
+
+        :param udbs_path: The directory of Understand databases (one per project)
+        :param class_list_csv_path: The csv file of classes (with 'Class' column)
+        :param dataset_path: The directory of the Parquet dataset
+        :param n_jobs: The number of worker processes (default: number of CPUs)
+        :param resume: Whether to skip the projects finished by previous runs
+        :return: The names of the projects computed by this run
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('Writing the Parquet dataset requires pyarrow (pip install pyarrow).')
+
+        df = pd.read_csv(class_list_csv_path, delimiter=',', index_col=False)
+        class_names = list(df['Class'])
+        os.makedirs(dataset_path, exist_ok=True)
+        finished_projects = cls.read_finished_projects(dataset_path) if resume else set()
+
+        projects = sorted(f[:-4] for f in os.listdir(udbs_path)
+                          if os.path.isfile(os.path.join(udbs_path, f)) and f.endswith('.udb'))
+        pending_projects = [project for project in projects if project not in finished_projects]
+        print('{0} projects, {1} finished before, {2} pending'.format(
+            len(projects), len(projects) - len(pending_projects), len(pending_projects)))
+
+        computed_projects = list()
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {
+                executor.submit(compute_project_partition, os.path.join(udbs_path, project + '.udb'), project,
+                                class_names, dataset_path): project
+                for project in pending_projects
+            }
+            for future in as_completed(futures):
+                project = futures[future]
+                try:
+                    number_of_rows = future.result()
+                except Exception as e:
+                    warnings.warn('Computing the metrics of project {0} failed: {1}'.format(project, e))
+                    continue
+                finished_projects.add(project)
+                cls.write_finished_projects(dataset_path, finished_projects)
+                computed_projects.append(project)
+                print('processing project {0} was finished ({1} classes, {2}/{3})'.format(
+                    project, number_of_rows, len(finished_projects), len(projects)))
+        return computed_projects
+
+    @classmethod
+    def read_finished_projects(cls, dataset_path: str) -> set:
+        try:
+            with open(os.path.join(dataset_path, '_finished_projects.json'), mode='r', encoding='utf8') as fp:
+                return set(json.load(fp))
+        except (OSError, ValueError):
+            return set()
+
+    @classmethod
+    def write_finished_projects(cls, dataset_path: str, finished_projects: set):
+        checkpoint_path = os.path.join(dataset_path, '_finished_projects.json')
+        with open(checkpoint_path + '.tmp', mode='w', encoding='utf8') as fp:
+            json.dump(sorted(finished_projects), fp, indent=2)
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+    @classmethod
+    def read_metrics_dataset(cls, dataset_path: str = r'dataset06/DS060Raw') -> pd.DataFrame:
+        """
+        Reads the Parquet dataset written by `build_metrics_dataset` as one DataFrame (with a 'Project' column)
+
+        :param dataset_path: The directory of the Parquet dataset
+        :return: pandas.DataFrame
+        """
+        return pd.read_parquet(dataset_path)
+
 
     # -------------------------------------------
     @classmethod
@@ -1061,6 +1148,10 @@ class PreProcess:
     @classmethod
     def remove_irrelevant_samples(cls, csv_path, csv_new_path):
         df = pd.read_csv(csv_path, delimiter=',', index_col=False)
+        cls.remove_irrelevant_samples_frame(df).to_csv(csv_new_path, index=False)
+
+    @classmethod
+    def remove_irrelevant_samples_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
         print('df:', df.shape)
 
         df1 = df.loc[
@@ -1072,11 +1163,15 @@ class PreProcess:
         print('df1 Removed:', df1.shape)
         df1 = pd.concat([df, df1]).drop_duplicates(keep=False)
         print('df1:', df1.shape)
-        df1.to_csv(csv_new_path, index=False)
+        return df1
 
     @classmethod
     def remove_dataclasses(cls, csv_path, csv_new_path):
         df = pd.read_csv(csv_path, delimiter=',', index_col=False)
+        cls.remove_dataclasses_frame(df).to_csv(csv_new_path, index=False)
+
+    @classmethod
+    def remove_dataclasses_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
         print('df:', df.shape)
 
         df['NumberOfMethod'] = df['CSORD_CountDeclInstanceMethod'] + df['CSORD_CountDeclClassMethod']
@@ -1110,7 +1205,7 @@ class PreProcess:
         df2.drop(columns=['NumberOfMethodNAMM', 'NumberOfMethod'], inplace=True)
 
         print('df2:', df2.shape)
-        df2.to_csv(csv_new_path, index=False)
+        return df2
 
     @classmethod
     def remove_high_coverage_classes_samples(cls, csv_path, csv_new_path):
@@ -1147,6 +1242,10 @@ class PreProcess:
     @classmethod
     def remove_zero_variance_column(cls, path: str = None, path_new: str = None):
         df1 = pd.read_csv(path, delimiter=',', index_col=False)
+        cls.remove_zero_variance_column_frame(df1).to_csv(path_new, index=False)
+
+    @classmethod
+    def remove_zero_variance_column_frame(cls, df1: pd.DataFrame) -> pd.DataFrame:
         df = df1.iloc[:, 1:-5]
         all_cols = df.columns
 
@@ -1202,7 +1301,7 @@ class PreProcess:
         # 5. Drop many_zero_rows
         print('-' * 25)
         many_zero_rows = []
-        for index, item in ((df == 0).sum(1)).iteritems():
+        for index, item in ((df == 0).sum(1)).items():
             if item >= round((len(df.columns) - 6) * 1 / 2):
                 # print(index, item)
                 many_zero_rows.append([index, item])
@@ -1220,7 +1319,7 @@ class PreProcess:
         # constant_col = (set(all_cols)).difference(set(non_constant_cols))
         # print(len(constant_col))
         # print(constant_col)
-        df.to_csv(path_new, index=False)
+        return df
 
     # Step 2: Discretization (Convert numerical branch coverage to nominal coverageability labels)
     # Step 2.1:
@@ -1238,6 +1337,10 @@ class PreProcess:
                                  index_col=False,
                                  # usecols=[0,2]
                                  )
+        cls.discretize_frame(data_frame).to_csv(path_new, index=False)
+
+    @classmethod
+    def discretize_frame(cls, data_frame: pd.DataFrame) -> pd.DataFrame:
         # data_frame.columns = [column.replace(' ', '_') for column in data_frame.columns]
         # print(data_frame)
         # quit()
@@ -1293,11 +1396,15 @@ class PreProcess:
         # path_new = r'es_complete_dataset_all_1_0_6_without_test_93col_discretize_91col_15417.csv'
         # print(data_frame_dropped.shape)
         # data_frame_dropped.to_csv(path_new, index=False)
-        data_frame.to_csv(path_new, index=False)
+        return data_frame
 
     @classmethod
     def label_with_line_and_branch(cls, path: str = None, path_new: str = None):
         df = pd.read_csv(path, delimiter=',', index_col=False, )
+        cls.label_with_line_and_branch_frame(df).to_csv(path_new, index=False)
+
+    @classmethod
+    def label_with_line_and_branch_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
         merged_label = list()
         for index, row in df.iterrows():
             if row['LineCategorical'] == 'Low' and row['BranchCategorical'] == 'Low':
@@ -1309,7 +1416,7 @@ class PreProcess:
             else:
                 merged_label.append('HighLow')
         df['LabelMerged'] = merged_label
-        df.to_csv(path_new, index=False)
+        return df
 
     # Step 2.2
     #  Discretize variable into equal-sized buckets based
@@ -1322,6 +1429,10 @@ class PreProcess:
         :return:
         """
         data_frame = pd.read_csv(path, delimiter=',', index_col=False, )
+        cls.discretize_q_frame(data_frame).to_csv(path_new, index=False)
+
+    @classmethod
+    def discretize_q_frame(cls, data_frame: pd.DataFrame) -> pd.DataFrame:
         # data_frame['Label_BranchCoverage'].replace(to_replace=0, value=np.nan, inplace=True)
 
         # Define fine-grain coverageability nominal labels (five category)
@@ -1365,7 +1476,7 @@ class PreProcess:
         print(data_frame_dropped)
         # path_new = r'es_complete_dataset_all_1_0_6_without_test_93col_discretize_91col_15417.csv'
         # print(data_frame_dropped.shape)
-        data_frame_dropped.to_csv(path_new, index=False)
+        return data_frame_dropped
         # data_frame.to_csv(path_new, index=False)
 
     # Step 3: Remove data classes
@@ -1377,12 +1488,16 @@ class PreProcess:
         :param path_new: The path of new dataset
         :return:
         """
-        # pd.set_option('display.max_rows', None, 'display.max_columns', None)
-        # pd.options.display.max_colwidth = 1000
         df = pd.read_csv(path, delimiter=',',
                          index_col=False,
                          # usecols=[0,2],
                          )
+        cls.mitigate_imbalanced_frame(df).to_csv(path_new, index=False)
+
+    @classmethod
+    def mitigate_imbalanced_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
+        # pd.set_option('display.max_rows', None, 'display.max_columns', None)
+        # pd.options.display.max_colwidth = 1000
         # df.columns = [column.replace(' ', '_') for column in df.columns]
         print('df0:', df.shape)
 
@@ -1509,7 +1624,7 @@ class PreProcess:
         #            header=True,
         #            index=True,
         #            index_label='index')
-        df4.to_csv(path_new, index=False)
+        return df4
 
     # Step 4: Remove outlier records based on z_scores of all features (base data preparing has finished)
     # Step 4.1: Remove outliers with z-score
@@ -1941,6 +2056,134 @@ class PreProcess:
 
 
 
+class PreProcessPipeline:
+    """
+    Lazy chain of the PreProcess cleanup stages on one in-memory DataFrame.
+    The dataset is read once (with float32 and int32 columns), each stage transforms the DataFrame of the
+    previous stage (`PreProcess.<stage>_frame`), and only the final output is written.
+
+    Example:
+        PreProcessPipeline('DS060Raw.csv').remove_irrelevant_samples().remove_dataclasses().discretize_q()\
+            .mitigate_imbalanced().to_csv('DS060.csv')
+
+    """
+
+    STAGES = ('remove_irrelevant_samples', 'remove_dataclasses', 'remove_zero_variance_column', 'discretize',
+              'label_with_line_and_branch', 'discretize_q', 'mitigate_imbalanced')
+
+    def __init__(self, path: str = None, df: pd.DataFrame = None, downcast: bool = True, chunksize: int = 10000):
+        """
+        :param path: The path of the input dataset (csv file or Parquet file/directory)
+        :param df: The input DataFrame (instead of path)
+        :param downcast: Whether to convert float64 columns to float32 and int64 columns to int32
+        :param chunksize: The number of csv rows parsed and downcast at once
+        """
+        self.path = path
+        self.df = df
+        self.downcast = downcast
+        self.chunksize = chunksize
+        self.stages = list()
+
+    def stage(self, name: str):
+        if name not in self.STAGES:
+            raise ValueError('Unknown preprocessing stage {0}, expected one of {1}'.format(name, self.STAGES))
+        self.stages.append(name)
+        return self
+
+    def remove_irrelevant_samples(self):
+        return self.stage('remove_irrelevant_samples')
+
+    def remove_dataclasses(self):
+        return self.stage('remove_dataclasses')
+
+    def remove_zero_variance_column(self):
+        return self.stage('remove_zero_variance_column')
+
+    def discretize(self):
+        return self.stage('discretize')
+
+    def label_with_line_and_branch(self):
+        return self.stage('label_with_line_and_branch')
+
+    def discretize_q(self):
+        return self.stage('discretize_q')
+
+    def mitigate_imbalanced(self):
+        return self.stage('mitigate_imbalanced')
+
+    def load(self) -> pd.DataFrame:
+        if self.df is not None:
+            return downcast_columns(self.df) if self.downcast else self.df
+        if os.path.isdir(self.path) or self.path.endswith('.parquet'):
+            df = pd.read_parquet(self.path)
+            return downcast_columns(df) if self.downcast else df
+        if not self.downcast:
+            return pd.read_csv(self.path, delimiter=',', index_col=False)
+        # Each chunk is downcast before the next one is parsed
+        chunks = pd.read_csv(self.path, delimiter=',', index_col=False, chunksize=self.chunksize)
+        # Columns whose type differs between chunks (e.g., int and float) are downcast again after concatenation
+        return downcast_columns(pd.concat([downcast_columns(chunk) for chunk in chunks], ignore_index=True))
+
+    def run(self) -> pd.DataFrame:
+        """
+        Executes the stages in order and returns the final DataFrame
+        """
+        df = self.load()
+        for name in self.stages:
+            print('Preprocessing stage {0}, input shape {1}'.format(name, df.shape))
+            df = getattr(PreProcess, name + '_frame')(df)
+        return df
+
+    def to_csv(self, path_new: str):
+        df = self.run()
+        df.to_csv(path_new, index=False)
+        return df
+
+    def to_parquet(self, path_new: str):
+        df = self.run()
+        df.to_parquet(path_new, index=False)
+        return df
+
+
+def downcast_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts float64 columns to float32, and int64 columns to int32 (if their values fit in int32)
+    """
+    int32_info = np.iinfo(np.int32)
+    types = dict()
+    for column, dtype in df.dtypes.items():
+        if dtype == np.float64:
+            types[column] = np.float32
+        elif dtype == np.int64 and len(df.index) > 0 and \
+                int32_info.min <= df[column].min() and df[column].max() <= int32_info.max:
+            types[column] = np.int32
+    return df.astype(types, copy=False) if types else df
+
+
+def compute_project_partition(udb_path: str, project_name: str, class_names: list, dataset_path: str) -> int:
+    """
+    Computes the metrics of the classes of one project and writes them to the project partition of the dataset
+    (worker function of `PreProcess.build_metrics_dataset`)
+
+    :return: The number of classes (rows)
+    """
+    db = understand.open(udb_path)
+    try:
+        df = PreProcess.compute_metrics_by_class_list(project_name=project_name, database=db,
+                                                      class_list=pd.DataFrame({'Class': class_names}))
+    finally:
+        UnderstandUtility.clear_index(db)
+        db.close()
+
+    partition_path = os.path.join(dataset_path, 'Project={0}'.format(project_name))
+    os.makedirs(partition_path, exist_ok=True)
+    # Hidden temporary files are ignored when the dataset is read
+    temporary_path = os.path.join(partition_path, '.part-0.parquet.tmp')
+    df.to_parquet(temporary_path, index=False, engine='pyarrow')
+    os.replace(temporary_path, os.path.join(partition_path, 'part-0.parquet'))
+    return len(df.index)
+
+
 # Test this module
 # if __name__ == '__main__':
 #     db_path = r'sf110_without_test/104_vuze.udb'
@@ -0,0 +1,463 @@
+"""
+
+This module implements the class dependency graph (design graph) used by the design testability prediction.
+
+The graph is kept in a compact CSR adjacency (NumPy `indptr` and `indices` arrays) with a map between class
+long names and node ids, instead of a networkx `DiGraph` read from the `und export` CSV file on every call.
+A refactoring changes the dependencies of a few classes: the new successors of those classes are recorded
+(`set_successors`, `update_from_understand`) and merged into the CSR arrays before the next feature computation.
+
+The node features of the design testability model are computed with sparse matrix operations,
+and are equal (up to the convergence tolerance of the iterative methods) to their networkx counterparts
+used by `design_testability_prediction` v0.1.0:
+the breadth-first searches of all sources are run level by level in batches, from which the shortest
+path betweenness (Brandes), closeness, harmonic centrality, and average path length are computed,
+and the current-flow centralities are computed per weakly connected component from the inverse Laplacian.
+
+## Changelog
+### v0.1.0
+- Add DesignGraph
+
+"""
+
+__version__ = '0.1.0'
+__author__ = 'Morteza Zakeri'
+
+import re
+
+import numpy as np
+import pandas as pd
+import scipy.linalg
+import scipy.sparse as sp
+import scipy.sparse.linalg
+from scipy.sparse.csgraph import connected_components
+
+from codart.learner.sbr_initializer.utils.utility import logger
+from codart.metrics.modularity import DependencyGraphModularity
+
+# The node features of the design testability model, in the order of the model
+NODE_FEATURES = [
+    'InDegree', 'OutDegree', 'AverageNeighborDegree',
+    'DegreeCentrality', 'InDegreeCentrality', 'OutDegreeCentrality',
+    'ClosenessCentrality', 'BetweennessCentrality', 'KatzCentrality', 'EigenvectorCentrality',
+    'HarmonicCentrality', 'CurrentFlowClosenessCentrality', 'CurrentFlowBetweennessCentrality',
+    'PageRank', 'AverageDijkstraPathLength',
+]
+
+# The number of sources of each batch of breadth-first searches (bounded by the memory of the batch)
+BFS_BATCH_CELLS = 1 << 22
+
+
+class DesignGraph:
+    """
+    Class dependency digraph in CSR format. Like the edge list exported by `und export -dependencies class`,
+    the nodes are the classes having at least one dependency or dependent.
+    """
+
+    class_filter = DependencyGraphModularity.class_filter
+
+    def __init__(self, node_names=None, indptr=None, indices=None):
+        """
+        :param node_names: The class long name of each node id
+        :param indptr: The CSR row pointers (the successors of node i are indices[indptr[i]:indptr[i + 1]])
+        :param indices: The CSR column indices, sorted for each row
+        """
+        self.node_names = list(node_names or [])
+        self.node_ids = {name: i for i, name in enumerate(self.node_names)}
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else np.asarray(indptr, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64) if indices is None else np.asarray(indices, dtype=np.int64)
+        self.node_kinds = dict()  # Class long name --> Understand kind name, or None if it is not a class to predict
+        self._pending_successors = dict()  # Class long name --> new set of successor names, or None if removed
+        self._adjacency = None
+
+    @classmethod
+    def from_edges(cls, sources, targets):
+        """
+        :param sources: The class long name of the source of each edge
+        :param targets: The class long name of the target of each edge
+        :return: The design graph, whose nodes are numbered in the order of their first appearance
+        """
+        sources, targets = list(sources), list(targets)
+        interleaved = [None] * (2 * len(sources))
+        interleaved[0::2], interleaved[1::2] = sources, targets
+        node_names = list(dict.fromkeys(interleaved))
+        node_ids = {name: i for i, name in enumerate(node_names)}
+        rows = np.fromiter((node_ids[name] for name in sources), dtype=np.int64, count=len(sources))
+        columns = np.fromiter((node_ids[name] for name in targets), dtype=np.int64, count=len(targets))
+        indptr, indices = cls._to_csr(rows, columns, len(node_names))
+        return cls(node_names, indptr, indices)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """
+        :param csv_path: The class dependencies exported by `und export -dependencies class` (MDG csv file)
+        """
+        mdg_df = pd.read_csv(csv_path, usecols=['From Class', 'To Class'])
+        return cls.from_edges(mdg_df['From Class'].values, mdg_df['To Class'].values)
+
+    @classmethod
+    def from_understand(cls, db):
+        """
+        Builds the design graph from the dependencies of the class entities of an Understand database,
+        without running `und export`
+        """
+        class_entities = db.ents(cls.class_filter)
+        names = {class_entity.uniquename(): class_entity.longname() for class_entity in class_entities}
+        sources, targets = list(), list()
+        for class_entity in class_entities:
+            for dependency in class_entity.depends():
+                target = names.get(dependency.uniquename())
+                if target is not None:
+                    sources.append(class_entity.longname())
+                    targets.append(target)
+        design_graph = cls.from_edges(sources, targets)
+        for class_entity in class_entities:
+            design_graph.node_kinds[class_entity.longname()] = cls.get_node_kind(class_entity)
+        return design_graph
+
+    @staticmethod
+    def get_node_kind(class_entity):
+        """
+        :return: The kind name of a class entity, or None for nested classes, which are not found by
+        `design_testability_prediction` v0.1.0 (their exported names contain '$')
+        """
+        parent = class_entity.parent()
+        if parent is not None and ('Class' in parent.kindname() or 'Interface' in parent.kindname()):
+            return None
+        return class_entity.kind().name()
+
+    @staticmethod
+    def _to_csr(rows, columns, n):
+        # Each dependency is one unweighted edge
+        keys = np.unique(rows * max(n, 1) + columns)
+        rows, columns = keys // max(n, 1), keys % max(n, 1)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, columns.astype(np.int64)
+
+    # Incremental updates
+    def set_successors(self, class_name, successors):
+        """
+        Replaces the dependencies of a class, the change is applied by the next `compact`
+        :param class_name: The class long name
+        :param successors: The class long names of the new dependencies of the class
+        """
+        self._pending_successors[class_name] = set(successors)
+        self._adjacency = None
+
+    def remove_class(self, class_name):
+        """
+        Removes a class and all of its incoming and outgoing edges
+        """
+        self._pending_successors[class_name] = None
+        self.node_kinds.pop(class_name, None)
+        self._adjacency = None
+
+    def update_from_understand(self, db, class_names):
+        """
+        Updates the dependencies of changed classes from the reanalyzed Understand database.
+        The changed classes must include the classes whose dependencies changed,
+        e.g., the dependency neighborhood of the refactored classes before and after the refactoring.
+        :param db: The Understand database of the refactored program
+        :param class_names: The long names of the changed classes
+        """
+        class_entities = db.ents(self.class_filter)
+        names = {class_entity.uniquename(): class_entity.longname() for class_entity in class_entities}
+        entities_by_name = dict()
+        for class_entity in class_entities:
+            entities_by_name.setdefault(class_entity.longname(), class_entity)
+        for class_name in class_names:
+            class_entity = entities_by_name.get(class_name)
+            if class_entity is None:
+                self.remove_class(class_name)
+                continue
+            successors = {names[d.uniquename()] for d in class_entity.depends() if d.uniquename() in names}
+            self.set_successors(class_name, successors)
+            self.node_kinds[class_name] = self.get_node_kind(class_entity)
+
+    def compact(self):
+        """
+        Merges the pending updates into the CSR arrays. The nodes without any edge are removed,
+        and the ids of the remaining nodes keep their relative order (new nodes come last).
+        """
+        if not self._pending_successors:
+            return
+        n = len(self.node_names)
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+        columns = self.indices
+        node_names = list(self.node_names)
+        node_ids = dict(self.node_ids)
+        for class_name in self._pending_successors:
+            if class_name not in node_ids:
+                node_ids[class_name] = len(node_names)
+                node_names.append(class_name)
+
+        changed = np.zeros(len(node_names), dtype=bool)
+        removed = np.zeros(len(node_names), dtype=bool)
+        new_rows, new_columns = list(), list()
+        for class_name, successors in self._pending_successors.items():
+            changed[node_ids[class_name]] = True
+            if successors is None:
+                removed[node_ids[class_name]] = True
+                continue
+            for successor in successors:
+                if successor not in node_ids:
+                    node_ids[successor] = len(node_names)
+                    node_names.append(successor)
+                new_rows.append(node_ids[class_name])
+                new_columns.append(node_ids[successor])
+        changed = np.pad(changed, (0, len(node_names) - len(changed)))
+        removed = np.pad(removed, (0, len(node_names) - len(removed)))
+
+        keep = ~changed[rows]
+        rows = np.concatenate([rows[keep], np.asarray(new_rows, dtype=np.int64)])
+        columns = np.concatenate([columns[keep], np.asarray(new_columns, dtype=np.int64)])
+        keep = ~removed[columns]
+        rows, columns = rows[keep], columns[keep]
+
+        # Relabel the nodes which have at least one edge
+        used = np.unique(np.concatenate([rows, columns]))
+        relabel = np.full(len(node_names), -1, dtype=np.int64)
+        relabel[used] = np.arange(len(used))
+        self.node_names = [node_names[i] for i in used]
+        self.node_ids = {name: i for i, name in enumerate(self.node_names)}
+        self.indptr, self.indices = self._to_csr(relabel[rows], relabel[columns], len(used))
+        self._pending_successors.clear()
+        self._adjacency = None
+
+    # Graph structure
+    @property
+    def adjacency(self):
+        """The adjacency matrix (scipy.sparse.csr_matrix) after the pending updates"""
+        self.compact()
+        if self._adjacency is None:
+            n = len(self.node_names)
+            self._adjacency = sp.csr_matrix(
+                (np.ones(len(self.indices), dtype=np.float64), self.indices, self.indptr), shape=(n, n)
+            )
+        return self._adjacency
+
+    def number_of_nodes(self):
+        self.compact()
+        return len(self.node_names)
+
+    def number_of_edges(self):
+        self.compact()
+        return len(self.indices)
+
+    def successors(self, class_name):
+        self.compact()
+        i = self.node_ids[class_name]
+        return [self.node_names[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def weakly_connected_components(self):
+        """
+        :return: The number of components and the component label of each node
+        """
+        return connected_components(self.adjacency, directed=True, connection='weak')
+
+    # Node features
+    def node_features(self):
+        """
+        Computes the node features of the design testability model for all nodes
+        :return: A DataFrame with the class long name and the `NODE_FEATURES` of each node, in node id order
+        """
+        A = self.adjacency
+        n = A.shape[0]
+        df = pd.DataFrame({'Class': self.node_names})
+        if n == 0:
+            for feature in NODE_FEATURES:
+                df[feature] = []
+            return df
+
+        out_degree = np.diff(A.indptr).astype(np.float64)
+        in_degree = np.bincount(A.indices, minlength=n).astype(np.float64)
+        df['InDegree'] = in_degree.astype(np.int64)
+        df['OutDegree'] = out_degree.astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df['AverageNeighborDegree'] = np.where(out_degree > 0, (A @ out_degree) / out_degree, 0.)
+        scale = 1. / (n - 1) if n > 1 else 1.
+        df['DegreeCentrality'] = (in_degree + out_degree) * scale if n > 1 else 1.
+        df['InDegreeCentrality'] = in_degree * scale if n > 1 else 1.
+        df['OutDegreeCentrality'] = out_degree * scale if n > 1 else 1.
+
+        shortest_path_features = self._shortest_path_features(A)
+        df['ClosenessCentrality'] = shortest_path_features['closeness']
+        df['BetweennessCentrality'] = shortest_path_features['betweenness']
+        df['KatzCentrality'] = self._katz_centrality(A)
+        df['EigenvectorCentrality'] = self._eigenvector_centrality(A)
+        df['HarmonicCentrality'] = shortest_path_features['harmonic']
+        current_flow_closeness, current_flow_betweenness = self._current_flow_centralities(A)
+        df['CurrentFlowClosenessCentrality'] = current_flow_closeness
+        df['CurrentFlowBetweennessCentrality'] = current_flow_betweenness
+        df['PageRank'] = self._pagerank(A)
+        df['AverageDijkstraPathLength'] = shortest_path_features['average_path_length']
+        return df
+
+    @staticmethod
+    def _shortest_path_features(A):
+        """
+        Breadth-first searches from all sources, batched as dense (sources x nodes) frontiers.
+        Betweenness is accumulated by the Brandes dependency recursion over the BFS levels.
+        """
+        n = A.shape[0]
+        AT = A.T.tocsr()
+        betweenness = np.zeros(n)
+        inward_distance_sum = np.zeros(n)
+        inward_reach = np.zeros(n)
+        harmonic = np.zeros(n)
+        average_path_length = np.zeros(n)
+        batch_size = max(1, min(n, BFS_BATCH_CELLS // n))
+        for start in range(0, n, batch_size):
+            sources = np.arange(start, min(start + batch_size, n))
+            b = len(sources)
+            batch_rows = np.arange(b)
+            distance = np.full((b, n), -1, dtype=np.int64)
+            distance[batch_rows, sources] = 0
+            sigma = np.zeros((b, n))
+            sigma[batch_rows, sources] = 1.
+            frontier = sigma.copy()
+            levels = [distance == 0]
+            while True:
+                paths = np.asarray(AT @ frontier.T).T  # Number of shortest paths reaching each node
+                discovered = (paths > 0) & (distance < 0)
+                if not discovered.any():
+                    break
+                distance[discovered] = len(levels)
+                sigma[discovered] = paths[discovered]
+                frontier = np.where(discovered, paths, 0.)
+                levels.append(discovered)
+
+            delta = np.zeros((b, n))
+            safe_sigma = np.where(sigma > 0, sigma, 1.)
+            for level in range(len(levels) - 1, 0, -1):
+                t = np.where(levels[level], (1. + delta) / safe_sigma, 0.)
+                delta += np.where(levels[level - 1], sigma * np.asarray(A @ t.T).T, 0.)
+            delta[batch_rows, sources] = 0.
+            betweenness += delta.sum(axis=0)
+
+            reached = distance >= 0
+            inward_distance_sum += np.where(reached, distance, 0).sum(axis=0)
+            inward_reach += reached.sum(axis=0)
+            with np.errstate(divide='ignore'):
+                harmonic += np.where(distance > 0, 1. / distance, 0.).sum(axis=0)
+            average_path_length[sources] = np.where(reached, distance, 0).sum(axis=1) / reached.sum(axis=1)
+
+        if n > 2:
+            betweenness *= 1. / ((n - 1) * (n - 2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            closeness = np.where(
+                inward_distance_sum > 0,
+                (inward_reach - 1) / inward_distance_sum * (inward_reach - 1) / max(n - 1, 1),
+                0.
+            )
+        return {
+            'betweenness': betweenness,
+            'closeness': closeness if n > 1 else np.zeros(n),
+            'harmonic': harmonic,
+            'average_path_length': average_path_length,
+        }
+
+    @staticmethod
+    def _katz_centrality(A, alpha=0.1, beta=1.0, max_iter=1000, tol=1.0e-6):
+        # Power iteration of networkx.katz_centrality: x = alpha * A^T x + beta
+        n = A.shape[0]
+        AT = A.T.tocsr()
+        x = np.zeros(n)
+        for _ in range(max_iter):
+            x_last = x
+            x = alpha * (AT @ x_last) + beta
+            if np.abs(x - x_last).sum() < n * tol:
+                return x / np.sqrt((x ** 2).sum())
+        logger.warning(f"Katz centrality did not converge in {max_iter} iterations, solving the linear system")
+        x = scipy.sparse.linalg.spsolve((sp.identity(n, format='csc') - alpha * AT).tocsc(), np.full(n, beta))
+        return x / np.sqrt((x ** 2).sum())
+
+    @staticmethod
+    def _eigenvector_centrality(A, max_iter=50, tol=0):
+        # networkx.eigenvector_centrality_numpy: the leading left eigenvector of the adjacency matrix
+        n = A.shape[0]
+        if n > 2:
+            _, eigenvector = scipy.sparse.linalg.eigs(A.T.astype(np.float64), k=1, which='LR', maxiter=max_iter,
+                                                      tol=tol)
+        else:
+            eigenvalues, eigenvectors = np.linalg.eig(A.T.toarray())
+            eigenvector = eigenvectors[:, np.argmax(eigenvalues.real)]
+        largest = eigenvector.flatten().real
+        norm = np.sign(largest.sum()) * np.linalg.norm(largest)
+        return largest / norm if norm != 0 else largest
+
+    @staticmethod
+    def _pagerank(A, alpha=0.85, max_iter=100, tol=1.0e-6):
+        # Power iteration of networkx.pagerank, the rank of dangling nodes is distributed uniformly
+        n = A.shape[0]
+        out_degree = np.asarray(A.sum(axis=1)).ravel()
+        inverse_out_degree = np.divide(1., out_degree, out=np.zeros(n), where=out_degree != 0)
+        P = (sp.diags(inverse_out_degree) @ A).T.tocsr()
+        is_dangling = np.where(out_degree == 0)[0]
+        p = np.repeat(1.0 / n, n)
+        x = p.copy()
+        for _ in range(max_iter):
+            x_last = x
+            x = alpha * (P @ x + x[is_dangling].sum() * p) + (1 - alpha) * p
+            if np.abs(x - x_last).sum() < n * tol:
+                return x
+        logger.warning(f"PageRank did not converge in {max_iter} iterations")
+        return x
+
+    def _current_flow_centralities(self, A):
+        """
+        Current-flow closeness and betweenness (normalized) of the undirected graph,
+        computed for each weakly connected component from its grounded inverse Laplacian
+        """
+        n = A.shape[0]
+        closeness = np.zeros(n)
+        betweenness = np.zeros(n)
+        U = ((A + A.T) > 0).astype(np.float64).tolil()
+        U.setdiag(0)  # Self-loops do not change the Laplacian
+        U = U.tocsr()
+        n_components, labels = self.weakly_connected_components()
+        for component in range(n_components):
+            nodes = np.where(labels == component)[0]
+            k = len(nodes)
+            if k < 2:
+                continue
+            S = U[nodes][:, nodes]
+            L = (sp.diags(np.asarray(S.sum(axis=1)).ravel()) - S).toarray()
+            C = np.zeros((k, k))
+            C[1:, 1:] = scipy.linalg.inv(L[1:, 1:])  # The first node of the component is grounded
+
+            # Sum of the effective resistances between each node and all other nodes
+            closeness[nodes] = 1. / (k * np.diag(C) - 2 * C.sum(axis=1) + np.trace(C))
+
+            if k < 3:
+                continue
+            edges = sp.triu(S, k=1).tocoo()
+            component_betweenness = np.zeros(k)
+            positions = np.arange(k)
+            batch_size = max(1, BFS_BATCH_CELLS // k)
+            for start in range(0, len(edges.row), batch_size):
+                s = edges.row[start:start + batch_size]
+                t = edges.col[start:start + batch_size]
+                flows = C[s] - C[t]
+                order = np.argsort(flows, axis=1, kind='stable')[:, ::-1]
+                rank = np.empty_like(order)
+                np.put_along_axis(rank, order, positions[np.newaxis, :], axis=1)
+                np.add.at(component_betweenness, s, ((positions[np.newaxis, :] - rank) * flows).sum(axis=1))
+                np.add.at(component_betweenness, t, ((k - positions[np.newaxis, :] - 1 - rank) * flows).sum(axis=1))
+            betweenness[nodes] = (component_betweenness - positions) * 2. / ((k - 1.) * (k - 2.))
+        return closeness, betweenness
+
+    def classify_nodes(self, db):
+        """
+        Finds the kind of the nodes whose kind is unknown (e.g., graphs read from an MDG csv file) by looking up
+        their long names in the Understand database, like `design_testability_prediction` v0.1.0
+        """
+        for class_name in self.node_names:
+            if class_name in self.node_kinds:
+                continue
+            entities = db.lookup(re.compile(class_name + r'$'), )
+            if entities is None or len(entities) == 0:  # Nested classes
+                self.node_kinds[class_name] = None
+            else:
+                self.node_kinds[class_name] = entities[0].kind().name()
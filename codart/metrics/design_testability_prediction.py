@@ -2,36 +2,97 @@
 
 The module predicts design testability based on the novel design testability prediction model
 
+The node features are computed by `DesignGraph`. The graph of a database can be updated incrementally with
+the classes changed since the previous call (`changed_classes` of `main` and `get_design_graph`), however,
+no caller tracks the changed classes yet, hence the graph is rebuilt from the database on each call.
+The graph-level statistics of `design_testability.Design` (e.g., transitivity and edge betweenness) are not
+implemented by `DesignGraph`, and `Design` still builds a networkx graph from the csv file.
+
+## Changelog
+### v0.2.1
+- `main` is timed by the profiler when it is enabled
+### v0.2.0
+- Compute the node features with `DesignGraph` (CSR adjacency and sparse matrix operations) instead of networkx
+- Build the class dependency graph from the Understand database instead of `und export` and a csv file
+(the csv file is still used if `mdg_path` is given), and keep the graph of each database to be updated
+incrementally with the changed classes (`get_design_graph`)
+- Load the model and scaler once per process and return the design testability from `main`
+
 """
 
-__version__ = '0.1.0'
+__version__ = '0.2.1'
 __author__ = 'Morteza Zakeri'
 
 import os
+import functools
+
 import pandas as pd
-import networkx as nx
-import re
 import joblib
 
 import understand
 
+from codart.metrics.design_graph import DesignGraph, NODE_FEATURES
 from codart.utility.directory_utils import export_understand_dependencies_csv
+from codart.utility.profiling import profiled
+
+# Understand database path --> DesignGraph
+DESIGN_GRAPHS = dict()
+
+
+def get_design_graph(db_path, db=None, changed_classes=None):
+    """
+    Returns the design graph of a project, which is built once per database path and then
+    updated with the dependencies of the changed classes (see `DesignGraph.update_from_understand`)
+
+    Args:
+        db_path (str): The Understand database path
+
+        db (understand.Db): An already opened database to be used instead of `db_path`
+
+        changed_classes (iterable): The long names of the classes changed since the previous call,
+            None to rebuild the graph
+    """
+    opened_db = db is None
+    if opened_db:
+        db = understand.open(db_path)
+    try:
+        design_graph = DESIGN_GRAPHS.get(db_path)
+        if design_graph is None or changed_classes is None:
+            design_graph = DesignGraph.from_understand(db)
+            DESIGN_GRAPHS[db_path] = design_graph
+        else:
+            design_graph.update_from_understand(db, changed_classes)
+        return design_graph
+    finally:
+        if opened_db:
+            db.close()
+
+
+@functools.lru_cache(maxsize=8)
+def load_model(model_path):
+    return joblib.load(model_path)
 
 
 class TestabilityPrediction:
     def __init__(self, **kwargs):
+        """
+        Keyword Args:
+            db_path (str): The Understand database path
+
+            project_name (str): The project name
+
+            design_graph (DesignGraph): The design graph of the project (optional)
+
+            mdg_path (str): The class dependencies csv file exported by `create_mdg` to build the graph from (optional)
+        """
         self.db_path = kwargs['db_path']
         self.project_name = kwargs['project_name']
-        graph_path = self.create_mdg()
-        self.mdg_df = pd.read_csv(graph_path)
-        self.mdg_df.rename(columns={"From Entities": "From_Entities", "To Entities": "To_Entities"}, inplace=True)
-        if self.mdg_df is not None and not self.mdg_df.empty:
-            self.mdg_graph = nx.from_pandas_edgelist(
-                self.mdg_df, source='From Class', target='To Class',
-                edge_attr=True, create_using=nx.DiGraph()
-            )
+        if kwargs.get('design_graph') is not None:
+            self.design_graph = kwargs['design_graph']
+        elif kwargs.get('mdg_path') is not None:
+            self.design_graph = DesignGraph.from_csv(kwargs['mdg_path'])
         else:
-            self.mdg_graph = None
+            self.design_graph = get_design_graph(self.db_path)
 
     def create_mdg(self):
         csv_path = os.path.join(
@@ -45,84 +106,36 @@ class TestabilityPrediction:
         return csv_path
 
     def extract_node_statistics(self, ):
-        db: understand.Db = understand.open(self.db_path)
-        G = self.mdg_graph
-        # G = nx.subgraph(self.mdg_graph, max(nx.weakly_connected_components(self.mdg_graph), key=len))
         df = pd.DataFrame()
-        if self.mdg_graph is None:
+        if self.design_graph.number_of_nodes() == 0:
             return
 
-        print('Computing graph attributes for all nodes in the graph components ...')
-        average_neighbor_degree_dict = nx.average_neighbor_degree(G)
-        # Category: Node centrality features
-        degree_centrality_dict = nx.degree_centrality(G)
-        in_degree_centrality_dict = nx.in_degree_centrality(G)
-        out_degree_centrality_dict = nx.out_degree_centrality(G)
-        closeness_centrality_dict = nx.closeness_centrality(G)
-        betweenness_centrality_dict = nx.betweenness_centrality(G)
-        katz_centrality_dict = nx.katz_centrality(G)
-        eigenvector_centrality_numpy_dict = nx.eigenvector_centrality_numpy(G)
-        harmonic_centrality_dict = nx.harmonic_centrality(G)
-
-        current_flow_closeness_centrality_dict = dict()
-        current_flow_betweenness_centrality_dict = dict()
-        for node_set in nx.weakly_connected_components(self.mdg_graph):
-            CCG = nx.subgraph(self.mdg_graph, node_set)
-            current_flow_closeness_centrality_dict.update(nx.current_flow_closeness_centrality(nx.Graph(CCG)))
-            # time-consuming
-            current_flow_betweenness_centrality_dict.update(nx.current_flow_betweenness_centrality(nx.Graph(CCG)))
-
-        pagerank_dict = nx.pagerank(G)
-
         print('Computing feature vector for each node (class) ...')
-        for i, u in enumerate(self.mdg_graph.nodes()):
-            df_temp = pd.DataFrame()
-            df_temp['Class'] = [u]
-
-            entities = db.lookup(re.compile(u + r'$'), )
-            if entities is None or len(entities) == 0:  # Nested classes
-                continue
-            if str(entities[0].kind().name()).find('Enum') != -1:
-                continue
-            if str(entities[0].kind().name()).find('Unknown') != -1:
-                continue
-            if str(entities[0].kind().name()).find('Unresolved') != -1:
-                continue
-
-            if ('Abstract' in entities[0].kind().name()) or ('Interface' in entities[0].kind().name()):
-                df_temp['AbstractOrInterface'] = [1]
-            else:
-                df_temp['AbstractOrInterface'] = [0]
-
-            # Features for source class, u (15)
-            df_temp['InDegree'] = [self.mdg_graph.in_degree(u)]
-            df_temp['OutDegree'] = [self.mdg_graph.out_degree(u)]
-            df_temp['AverageNeighborDegree'] = [average_neighbor_degree_dict[u]]
-            # Category: Node centrality features
-            df_temp['DegreeCentrality'] = [degree_centrality_dict[u]]
-            df_temp['InDegreeCentrality'] = [in_degree_centrality_dict[u]]
-            df_temp['OutDegreeCentrality'] = [out_degree_centrality_dict[u]]
-            df_temp['ClosenessCentrality'] = [closeness_centrality_dict[u]]
-            df_temp['BetweennessCentrality'] = [betweenness_centrality_dict[u]]
-            df_temp['KatzCentrality'] = [katz_centrality_dict[u]]
-            df_temp['EigenvectorCentrality'] = [eigenvector_centrality_numpy_dict[u]]
-            df_temp['HarmonicCentrality'] = [harmonic_centrality_dict[u]]
-            df_temp['CurrentFlowClosenessCentrality'] = [current_flow_closeness_centrality_dict[u]]
-            df_temp['CurrentFlowBetweennessCentrality'] = [current_flow_betweenness_centrality_dict[u]]
-
-            df_temp['PageRank'] = [pagerank_dict[u]]
-            avg_shortest_path = nx.single_source_dijkstra_path_length(G=G, source=u).values()
-            df_temp['AverageDijkstraPathLength'] = [sum(avg_shortest_path) / len(avg_shortest_path)]
-
-            df = pd.concat([df, df_temp], ignore_index=True)
-            # print(df.values)
-        db.close()
+        df_features = self.design_graph.node_features()
+        db: understand.Db = understand.open(self.db_path)
+        try:
+            self.design_graph.classify_nodes(db)
+        finally:
+            db.close()
+
+        # Nested classes, enums, and unknown or unresolved classes are not predicted
+        kinds = [self.design_graph.node_kinds.get(class_name) for class_name in df_features['Class']]
+        predicted = [
+            kind is not None and all(word not in kind for word in ('Enum', 'Unknown', 'Unresolved')) for kind in kinds
+        ]
+        df_features = df_features.loc[predicted].reset_index(drop=True)
+        kinds = [kind for kind, is_predicted in zip(kinds, predicted) if is_predicted]
+
+        df['Class'] = df_features['Class']
+        df['AbstractOrInterface'] = [1 if ('Abstract' in kind) or ('Interface' in kind) else 0 for kind in kinds]
+        for feature in NODE_FEATURES:
+            df[feature] = df_features[feature]
         print(df)
         return df
 
     def inference_model(self, model_path=None, scaler_path=None):
-        model = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
+        model = load_model(model_path)
+        scaler = load_model(scaler_path)
 
         df_predict_data = self.extract_node_statistics()
         df_predict_data = df_predict_data.fillna(0)
@@ -144,9 +157,24 @@ class TestabilityPrediction:
         return df_new["Testability"].mean()
 
 
-def main(db_path=None, project_name=None, model_path=None, scaler_path=None):
-    tp = TestabilityPrediction(db_path=db_path, project_name=project_name)
-    tp.inference_model(model_path=model_path, scaler_path=scaler_path)
+@profiled('design_testability', category='objective')
+def main(db_path=None, project_name=None, model_path=None, scaler_path=None, initial_value=1.0, changed_classes=None):
+    """
+    Design testability API, to be used as a search objective
+
+    Args:
+        changed_classes (iterable): The long names of the classes changed since the previous call for the same
+            database, whose dependencies are updated in the kept design graph (None to rebuild the graph)
+
+    Returns:
+        float: The mean design testability of the project classes divided by `initial_value`
+    """
+    tp = TestabilityPrediction(
+        db_path=db_path, project_name=project_name,
+        design_graph=get_design_graph(db_path, changed_classes=changed_classes)
+    )
+    design_testability = tp.inference_model(model_path=model_path, scaler_path=scaler_path)
+    return round(design_testability / initial_value, 5)
 
 
 if __name__ == '__main__':
@@ -304,6 +304,7 @@ def do(class_entity_long_name, project_db_path):
     one_class_metrics_value.extend([package_metrics_dict[metric_name] for
                                     metric_name in TestabilityMetrics.get_package_metrics_names()])
 
+    UnderstandUtility.clear_index(db)
     db.close()
     del db
     # print(one_class_metrics_value)
@@ -330,6 +331,7 @@ class PreProcess:
         # print(project_db_path)
         db = und.open(project_db_path)
         class_list = UnderstandUtility.get_project_classes_longnames_java(db=db)
+        UnderstandUtility.clear_index(db)
         db.close()
         # del db
 
@@ -0,0 +1,306 @@
+"""
+
+## Module description
+
+This module implements an incremental store of class-level metrics.
+
+After a refactoring only a handful of classes change, while the QMOOD design metrics and the testability
+objective are computed over every class of the project. The store keeps the class-level rows of the previous
+evaluation, i.e., the QMOOD class-level design metrics (`DesignMetrics.compute_class_row`) and the
+testability metrics vectors (`testability_prediction2.compute_metrics_frame`) with their predicted testability,
+and recomputes only the dirty classes:
+
+1. Classes defined in files changed since the previous evaluation. The changed files are the files
+reported by `git diff --name-only` (plus untracked files) whose content differs from the previous evaluation.
+
+2. The dependency neighborhood of those classes in the Understand database (dependencies, dependents,
+and descendants), both before and after the change.
+
+3. For the testability objective, all classes of the packages containing a changed class,
+since the package-level metrics are part of each class vector.
+
+The project-level aggregates are updated by subtracting the old rows and adding the new ones.
+
+### Classes
+
+IncrementalMetricsStore: The per-class metrics store of a project
+
+## Changelog
+
+### version 0.1.1
+    1. Compute the package metrics of the dirty classes once per package
+
+### version 0.1.0
+    1. Add IncrementalMetricsStore
+
+"""
+
+__version__ = '0.1.1'
+__author__ = 'Morteza Zakeri'
+
+import os
+import hashlib
+import subprocess
+
+import understand as und
+
+from codart.learner.sbr_initializer.utils.utility import logger
+from codart.metrics.metrics_coverability import UnderstandUtility
+from codart.metrics.qmood import DesignMetrics, KNOWN_CLASSES_FILTER, CLASS_TABLE_FILTER, \
+    new_class_table_totals, add_class_row_to_totals, design_metrics_from_totals
+from codart.metrics.testability_prediction2 import get_testability_predictor, compute_metrics_frame, get_package_name
+from codart.utility.directory_utils import get_git_root
+
+PRISTINE = 'pristine'  # The file state of files not changed since the last commit
+DELETED = 'deleted'
+
+
+class IncrementalMetricsStore:
+    """
+
+    Keeps the class-level metrics of the last evaluation and recomputes only the dirty classes
+
+    """
+
+    def __init__(self, udb_path: str = None, project_dir: str = None):
+        """
+
+        Args:
+
+            udb_path (str): The absolute path of Understand database
+
+            project_dir (str): The absolute path of project's directory (used to find the changed files).\
+                If the project is not a git repository, all classes are recomputed in each evaluation.
+
+        """
+
+        self.udb_path = udb_path
+        self.project_dir = project_dir
+        self.git_root = get_git_root(project_dir) if project_dir is not None else None
+        self.file_states = dict()  # Absolute path --> content hash (files differing from the last commit)
+
+        # QMOOD class table
+        self.class_rows = dict()  # Class unique name --> class-level design metrics
+        self.class_files = dict()  # Class unique name --> absolute path of the file defining the class
+        self.class_longnames = dict()  # Class unique name --> class long name
+        self.class_neighbors = dict()  # Class unique name --> unique names of the dependency neighborhood
+        self.totals = new_class_table_totals()
+
+        # Testability class vectors
+        self.testability_predictions = dict()  # Class long name --> predicted testability (None if not computed)
+        self.testability_total = 0.
+        self.recompute_all_testability = False
+        self.pending_testability_classes = set()
+        self.pending_testability_packages = set()
+
+        self.recomputed_classes = 0
+        self.recomputed_testability_classes = 0
+
+    def changed_files(self):
+        """
+
+        Finds the files changed since the previous call.
+
+        Returns:
+
+            set: The absolute paths of the changed files or None if the changes cannot be determined
+
+        """
+
+        if self.git_root is None:
+            return None
+        paths = []
+        for command in [['git', 'diff', '--name-only', 'HEAD'], ['git', 'ls-files', '--others', '--exclude-standard']]:
+            result = subprocess.run(command, cwd=self.git_root, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True)
+            if result.returncode != 0:
+                logger.warning(f"Failed to list the changed files: {result.stderr}")
+                return None
+            paths.extend(line for line in result.stdout.splitlines() if line)
+
+        file_states = dict()
+        for relative_path in paths:
+            absolute_path = normalize_path(os.path.join(self.git_root, relative_path))
+            file_states[absolute_path] = file_digest(absolute_path)
+
+        changed_files = {
+            path for path in set(file_states) | set(self.file_states)
+            if file_states.get(path, PRISTINE) != self.file_states.get(path, PRISTINE)
+        }
+        self.file_states = file_states
+        return changed_files
+
+    def update_design_metrics(self) -> dict:
+        """
+
+        Recomputes the QMOOD class rows of the dirty classes and updates the class table totals
+
+        Returns:
+
+            dict: The raw (not normalized) project-level design metrics
+
+        """
+
+        changed_files = self.changed_files()
+        dbx: und.Db = und.open(self.udb_path)
+        try:
+            design_metrics = DesignMetrics(udb_path=self.udb_path, dbx=dbx)
+            design_size = len(design_metrics.user_defined_classes)
+            known_class_ids = {ent.id() for ent in dbx.ents(KNOWN_CLASSES_FILTER)}
+            entities = {ent.uniquename(): ent for ent in dbx.ents(CLASS_TABLE_FILTER)}
+
+            removed_classes = set(self.class_rows) - set(entities)
+            seeds = set(removed_classes)
+            for key, class_entity in entities.items():
+                if key not in self.class_rows or \
+                        self.class_rows[key]['is_known'] != (class_entity.id() in known_class_ids):
+                    seeds.add(key)
+
+            current_neighbors = dict()  # Neighborhoods computed on the current database
+            if changed_files is None:
+                dirty_classes = set(entities)
+                self.recompute_all_testability = True
+            else:
+                # New classes are already seeds, and a class moved to another file changes its previous file
+                seeds.update(key for key, path in self.class_files.items() if path in changed_files)
+                dirty_classes = set()
+                for key in seeds:
+                    dirty_classes.add(key)
+                    dirty_classes.update(self.class_neighbors.get(key, ()))
+                    if key in entities:
+                        current_neighbors[key] = get_class_neighbors(entities[key])
+                        dirty_classes.update(current_neighbors[key])
+                dirty_classes &= set(entities)
+
+            for key in seeds:
+                for longname in [self.class_longnames.get(key), entities[key].longname() if key in entities else None]:
+                    if longname is not None:
+                        self.pending_testability_packages.add(get_package_name(longname))
+
+            for key in removed_classes:
+                add_class_row_to_totals(self.totals, self.class_rows.pop(key), sign=-1)
+                self.pending_testability_classes.add(self.class_longnames.pop(key))
+                self.class_files.pop(key, None)
+                self.class_neighbors.pop(key, None)
+
+            for key in dirty_classes:
+                class_entity = entities[key]
+                if key in self.class_rows:
+                    add_class_row_to_totals(self.totals, self.class_rows[key], sign=-1)
+                row = design_metrics.compute_class_row(
+                    class_entity, is_known=class_entity.id() in known_class_ids
+                )
+                add_class_row_to_totals(self.totals, row)
+                self.class_rows[key] = row
+                self.class_files[key] = get_class_file(class_entity)
+                self.class_longnames[key] = class_entity.longname()
+                self.class_neighbors[key] = current_neighbors[key] if key in current_neighbors else \
+                    get_class_neighbors(class_entity)
+                self.pending_testability_classes.add(class_entity.longname())
+        finally:
+            UnderstandUtility.clear_index(dbx)
+            dbx.close()
+
+        self.recomputed_classes += len(dirty_classes)
+        logger.debug(f"QMOOD rows of {len(dirty_classes)} out of {len(entities)} classes were recomputed.")
+        return design_metrics_from_totals(self.totals, design_size=design_size)
+
+    def testability(self, initial_value=1.0):
+        """
+
+        Recomputes the testability vectors of the dirty classes (found by the last `update_design_metrics`)
+        and updates the sum of predicted testability
+
+        Args:
+
+            initial_value (float): The testability of the initial program
+
+        Returns:
+
+            float: The normalized testability objective
+
+        """
+
+        recompute_all = self.recompute_all_testability
+        db = und.open(self.udb_path)
+        try:
+            class_list = UnderstandUtility.get_project_classes_longnames_java(db=db)
+            dirty_classes = [
+                class_name for class_name in class_list
+                if recompute_all or class_name not in self.testability_predictions or
+                class_name in self.pending_testability_classes or
+                get_package_name(class_name) in self.pending_testability_packages
+            ]
+            df_metrics = compute_metrics_frame(db, dirty_classes)
+        finally:
+            UnderstandUtility.clear_index(db)
+            db.close()
+
+        removed_classes = set(self.testability_predictions) - set(class_list)
+        for class_name in list(removed_classes) + dirty_classes:
+            value = self.testability_predictions.pop(class_name, None)
+            if value is not None:
+                self.testability_total -= value
+        self.testability_predictions.update({class_name: None for class_name in dirty_classes})
+
+        if len(df_metrics) > 0:
+            df = get_testability_predictor().model.predict_classes(df_metrics)
+            for class_name, value in zip(df['Class'], df['PredictedTestability']):
+                self.testability_predictions[class_name] = float(value)
+                self.testability_total += float(value)
+
+        self.recompute_all_testability = False
+        self.pending_testability_classes.clear()
+        self.pending_testability_packages.clear()
+        self.recomputed_testability_classes += len(dirty_classes)
+        logger.debug(f"Testability vectors of {len(dirty_classes)} out of {len(class_list)} classes were recomputed.")
+        return round(self.testability_total / initial_value, 5)
+
+    def reset(self):
+        """
+
+        Drops all rows, such that the next evaluation recomputes all classes
+
+        """
+
+        self.__init__(udb_path=self.udb_path, project_dir=self.project_dir)
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.realpath(path))
+
+
+def file_digest(path):
+    if not os.path.isfile(path):
+        return DELETED
+    with open(path, mode='rb') as fp:
+        return hashlib.sha1(fp.read()).hexdigest()
+
+
+def get_class_file(class_entity):
+    ref = class_entity.ref('Definein')
+    if ref is None or ref.file() is None:
+        return None
+    return normalize_path(ref.file().longname())
+
+
+def get_class_neighbors(class_entity) -> set:
+    """
+
+    Returns:
+
+        set: The unique names of the dependencies, dependents, and (transitive) descendants of a class
+
+    """
+
+    neighbors = {ent.uniquename() for ent in class_entity.depends()}
+    neighbors.update(ent.uniquename() for ent in class_entity.dependsby())
+    stack = [class_entity]
+    while stack:
+        for descendant in stack.pop().ents("Coupleby Extendby, Coupleby Implementby"):
+            if descendant.uniquename() not in neighbors:
+                neighbors.add(descendant.uniquename())
+                stack.append(descendant)
+    neighbors.discard(class_entity.uniquename())
+    return neighbors
+
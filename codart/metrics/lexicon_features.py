@@ -0,0 +1,203 @@
+"""
+
+## Module description
+
+This module implements the one-pass extraction of the lexicon (CSLEX) metrics of classes.
+
+`TestabilityMetrics.compute_java_class_metrics_lexicon` used to walk the Understand lexer of each class token by
+token and classify each lexeme with several list membership checks, even when many classes share one file.
+Here, each file is lexed once and its lexemes (line, text, token) are cached by the hash of the file content.
+The lexemes of a class are the lexemes between the first and last lines of the class,
+and all lexicon counters are computed with a single `Counter` over the texts and token kinds of those lexemes.
+
+The scope of the lexemes is set by `lexicon_scope` in the `METRICS` section of the configuration:
+`file` (default) for the whole file of the class, as the lexemes of the features of the shipped testability and
+modularity models, and `class` (opt-in) for the lines of the class. The models must be retrained on the
+class-scope features before `class` is used for predictions.
+
+### Functions
+
+compute_class_lexicon_metrics: The lexicon metrics of a class entity
+
+## Changelog
+
+### version 0.1.1
+    1. The default scope is `file`, the scope of the features of the shipped models (`class` is opt-in)
+
+### version 0.1.0
+    1. Add one-pass file-level lexicon metrics with a content hash cache
+
+"""
+
+__version__ = '0.1.1'
+__author__ = 'Morteza Zakeri'
+
+import bisect
+import hashlib
+from collections import Counter, OrderedDict
+
+from codart.learner.sbr_initializer.utils.utility import logger, get_config_value
+
+RETURN_AND_PRINT_KEYWORDS = frozenset(['return', 'print', 'printf', 'println', 'write', 'writeln'])
+CONDITION_KEYWORDS = frozenset(['if', 'for', 'while', 'switch', '?', 'assert'])
+UNCONDITION_KEYWORDS = frozenset(['break', 'continue'])
+EXCEPTION_KEYWORDS = frozenset(['try', 'catch', 'throw', 'throws', 'finally'])
+
+# The lexemes of a class: 'file' (whole file, as in the training data of the models) or 'class' (lines of the class)
+LEXICON_SCOPE = get_config_value('METRICS', 'lexicon_scope', fallback='file')
+
+# Maximum number of files whose lexemes are cached
+MAX_CACHED_FILES = 4096
+
+# File content hash --> FileLexemes
+_file_lexemes_cache = OrderedDict()
+
+
+class FileLexemes:
+    """
+
+    The lexemes of one file, sorted by line
+
+    """
+
+    def __init__(self, lexemes: list):
+        """
+
+        Args:
+
+            lexemes (list): (line, text, token) tuples in the order of the lexer
+
+        """
+
+        self.lines = [lexeme[0] for lexeme in lexemes]
+        self.texts = [lexeme[1] for lexeme in lexemes]
+        self.tokens = [lexeme[2] for lexeme in lexemes]
+        self.metrics_cache = dict()  # (first line, last line) --> lexicon metrics
+
+    def metrics(self, first_line=None, last_line=None) -> dict:
+        key = (first_line, last_line)
+        if key not in self.metrics_cache:
+            begin = 0 if first_line is None else bisect.bisect_left(self.lines, first_line)
+            end = len(self.lines) if last_line is None else bisect.bisect_right(self.lines, last_line)
+            self.metrics_cache[key] = lexicon_metrics(self.texts[begin:end], self.tokens[begin:end])
+        return dict(self.metrics_cache[key])
+
+
+def lexicon_metrics(texts: list, tokens: list) -> dict:
+    """
+
+    Computes the lexicon counters of a sequence of lexemes
+
+    Args:
+
+        texts (list): The text of each lexeme
+
+        tokens (list): The token kind of each lexeme (e.g., 'Identifier', 'Keyword', and 'Operator')
+
+    Returns:
+
+        dict: The lexicon metrics, except 'NumberOfSemicolons'
+
+    """
+
+    text_counts = Counter(texts)
+    identifiers = Counter(text for text, token in zip(texts, tokens) if token == 'Identifier')
+    keywords = Counter(text for text, token in zip(texts, tokens) if token == 'Keyword')
+    operators = Counter(text for text, token in zip(texts, tokens) if token == 'Operator')
+
+    number_of_assignments = operators['=']
+    return {
+        'NumberOfTokens': len(texts),
+        'NumberOfUniqueTokens': len(text_counts),
+        'NumberOfIdentifies': sum(identifiers.values()),
+        'NumberOfUniqueIdentifiers': len(identifiers),
+        'NumberOfKeywords': sum(keywords.values()),
+        'NumberOfUniqueKeywords': len(keywords),
+        'NumberOfOperatorsWithoutAssignments': sum(operators.values()) - number_of_assignments,
+        'NumberOfAssignments': number_of_assignments,
+        'NumberOfUniqueOperators': len(operators) - (1 if number_of_assignments > 0 else 0),
+        'NumberOfDots': text_counts['.'],
+        'NumberOfReturnAndPrintStatements': sum(text_counts[kw] for kw in RETURN_AND_PRINT_KEYWORDS),
+        'NumberOfConditionalJumpStatements': sum(text_counts[kw] for kw in CONDITION_KEYWORDS),
+        'NumberOfUnConditionalJumpStatements': sum(text_counts[kw] for kw in UNCONDITION_KEYWORDS),
+        'NumberOfExceptionStatements': sum(text_counts[kw] for kw in EXCEPTION_KEYWORDS),
+        'NumberOfNewStatements': text_counts['new'],
+        'NumberOfSuperStatements': text_counts['super'],
+    }
+
+
+def read_lexemes(lexer_entity) -> list:
+    lexemes = list()
+    lexeme = lexer_entity.lexer(show_inactive=False).first()
+    while lexeme is not None:
+        lexemes.append((lexeme.line_begin(), lexeme.text(), lexeme.token()))
+        lexeme = lexeme.next()
+    return lexemes
+
+
+def get_file_lexemes(file_entity) -> FileLexemes:
+    """
+
+    Returns the lexemes of a file entity, lexing the file only if its content is not cached
+
+    """
+
+    try:
+        with open(file_entity.longname(), mode='rb') as fp:
+            digest = hashlib.sha1(fp.read()).hexdigest()
+    except OSError as e:
+        logger.debug(f"Cannot read {file_entity.longname()}, the lexemes are not cached: {e}")
+        return FileLexemes(read_lexemes(file_entity))
+
+    if digest in _file_lexemes_cache:
+        _file_lexemes_cache.move_to_end(digest)
+        return _file_lexemes_cache[digest]
+    file_lexemes = FileLexemes(read_lexemes(file_entity))
+    _file_lexemes_cache[digest] = file_lexemes
+    while len(_file_lexemes_cache) > MAX_CACHED_FILES:
+        _file_lexemes_cache.popitem(last=False)
+    return file_lexemes
+
+
+def get_class_lines(class_entity):
+    """
+
+    Returns:
+
+        tuple: The file entity, first line, and last line of a class (None if not found)
+
+    """
+
+    define_ref = class_entity.ref('Definein')
+    end_ref = class_entity.ref('End')
+    if define_ref is None or define_ref.file() is None:
+        return None, None, None
+    if end_ref is None:
+        return define_ref.file(), None, None
+    return define_ref.file(), define_ref.line(), end_ref.line()
+
+
+def compute_class_lexicon_metrics(class_entity) -> dict:
+    """
+
+    Computes the lexicon metrics of a class from the cached lexemes of its file
+
+    Args:
+
+        class_entity (understand.Ent): A Java class entity
+
+    Returns:
+
+        dict: The lexicon metrics, except 'NumberOfSemicolons'
+
+    """
+
+    file_entity, first_line, last_line = get_class_lines(class_entity)
+    if file_entity is None:
+        lexemes = read_lexemes(class_entity)
+        return lexicon_metrics([lexeme[1] for lexeme in lexemes], [lexeme[2] for lexeme in lexemes])
+
+    file_lexemes = get_file_lexemes(file_entity)
+    if LEXICON_SCOPE == 'file':
+        return file_lexemes.metrics()
+    return file_lexemes.metrics(first_line, last_line)
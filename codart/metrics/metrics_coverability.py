@@ -7,21 +7,137 @@ https://scitools.com/documents/manuals/perl/#ada_entity_kinds
 
 
 ## Changelog
+### v0.4.1
+- The callers drop the index of a database handle (`clear_index`) before closing it, such that closed handles and
+their entities are not retained
+
+### v0.4.0
+- Add UnderstandIndex, the per-database index of types, methods, packages, attributes,
+and constructors used by the UnderstandUtility helpers instead of scanning the database for each class
+
 ### v0.3.1
 - Remove dependency to nlp packages
 - Eliminate extra classes
 
 """
 
-__version__ = '0.3.1'
+__version__ = '0.4.1'
 __author__ = 'Morteza Zakeri'
 
+from collections import OrderedDict
+
+# Number of database handles whose index is kept
+MAX_INDEXED_DATABASES = 4
+
+
+class UnderstandIndex:
+    """
+    The index of the entities of one Understand database handle, built once per handle.
+    Each part of the index is built lazily on its first use with a single scan of the database.
+    """
+
+    def __init__(self, db):
+        """
+        :param db: An open Understand database handle
+        """
+        self.db = db
+        self._types_by_longname = None  # Long name --> first 'Type' entity with that long name
+        self._methods_by_class_longname = None  # Class long name --> 'Java Method' entities sorted by long name
+        self._packages_by_class_longname = dict()  # Class long name --> (package entity, package long name)
+        self._attributes_by_class_id = dict()  # Class entity id --> defined 'Java Variable' entities
+        self._constructors_by_class_id = dict()  # Class entity id --> defined constructors
+        self._methods_by_class_id = dict()  # Class entity id --> defined 'Java Method' entities
+
+    def get_type(self, longname):
+        if self._types_by_longname is None:
+            self._types_by_longname = dict()
+            for entity_ in self.db.ents('Type') or []:
+                self._types_by_longname.setdefault(entity_.longname(), entity_)
+        return self._types_by_longname.get(longname)
+
+    def get_methods_by_class_longname(self, class_longname) -> list:
+        if self._methods_by_class_longname is None:
+            self._methods_by_class_longname = dict()
+            for method_ in sorted(self.db.ents('Java Method'), key=UnderstandUtility.sort_key):
+                if method_.parent() is None:
+                    continue
+                self._methods_by_class_longname.setdefault(str(method_.parent().longname()), []).append(method_)
+        return list(self._methods_by_class_longname.get(class_longname, []))
+
+    def get_defined_methods(self, class_entity) -> list:
+        if class_entity.id() not in self._methods_by_class_id:
+            self._methods_by_class_id[class_entity.id()] = class_entity.ents(
+                'Define', 'Java Method ~Unknown ~Unresolved ~Jar ~Library'
+            )
+        return list(self._methods_by_class_id[class_entity.id()])
+
+    def get_constructors(self, class_entity) -> list:
+        if class_entity.id() not in self._constructors_by_class_id:
+            self._constructors_by_class_id[class_entity.id()] = class_entity.ents('Define', 'Java Method Constructor')
+        return list(self._constructors_by_class_id[class_entity.id()])
+
+    def get_attributes(self, class_entity) -> list:
+        if class_entity.id() not in self._attributes_by_class_id:
+            self._attributes_by_class_id[class_entity.id()] = class_entity.ents('Define', 'Java Variable')
+        return list(self._attributes_by_class_id[class_entity.id()])
+
+    def get_package(self, class_longname):
+        if class_longname not in self._packages_by_class_longname:
+            self._packages_by_class_longname[class_longname] = self._find_package(class_longname)
+        return self._packages_by_class_longname[class_longname]
+
+    def _find_package(self, class_longname):
+        class_entity = self.get_type(class_longname)
+        if class_entity is None:
+            return None, 'default'
+
+        package_list = class_entity.ents('Containin', 'Java Package')
+        while not package_list and class_entity.parent() is not None:
+            package_list = class_entity.parent().ents('Containin', 'Java Package')
+            class_entity = class_entity.parent()
+
+        if len(package_list) < 1:
+            return None, 'default'
+        else:
+            return package_list[0], package_list[0].longname()
+
+
+# id(db) --> (db, UnderstandIndex), the handle is kept to prevent reusing its id until `clear_index` is called
+_indexes = OrderedDict()
+
 
 class UnderstandUtility:
     """
 
     """
 
+    @classmethod
+    def get_index(cls, db) -> UnderstandIndex:
+        """
+        Returns the index of a database handle, built once per handle
+        :param db: Understand database of target project
+        :return: UnderstandIndex
+        """
+        key = id(db)
+        if key in _indexes:
+            _indexes.move_to_end(key)
+        else:
+            _indexes[key] = (db, UnderstandIndex(db))
+            while len(_indexes) > MAX_INDEXED_DATABASES:
+                _indexes.popitem(last=False)
+        return _indexes[key][1]
+
+    @classmethod
+    def clear_index(cls, db=None):
+        """
+        Drops the index of a database handle (or all indexes), must be called before the handle is closed
+        :param db: Understand database of target project
+        """
+        if db is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(id(db), None)
+
     @classmethod
     def is_accesor_or_mutator(cls, method_entity=None):
         if str(method_entity.simplename()).startswith(("get", "set", "Get", "Set")):
@@ -180,46 +296,14 @@ class UnderstandUtility:
     # Getting Types individually with their name
     @classmethod
     def get_class_entity_by_name(cls, db, class_name):
-        # https://docs.python.org/3/library/exceptions.html#exception-hierarchy
-        # Find relevant 'class' entity
-        entity_list = list()
-
-        entities = db.ents('Type')  # Use this for evo-suite SF110 already measured class
-        # entities = db.ents('Java Class ~Enum ~Unknown ~Unresolved ~Jar ~Library')
-        # entities = db.ents('Java Class ~Jar ~Library, Java Interface')
-        if entities is not None:
-            for entity_ in entities:
-                if entity_.longname() == class_name:
-                    entity_list.append(entity_)
-                    # print('Class entity:', entity_)
-                    # print('Class entity kind:', entity_.kind())
-        if len(entity_list) == 0:
-            # raise UserWarning('Java class with name {0} is not found in project'.format(class_name))
-            return None
-        if len(entity_list) > 1:
-            # print('######', len(entity_list))
-            # raise ValueError('There is more than one Java class with name {0} in the project'.format(class_name))
-            return entity_list[0]
-        else:
-            return entity_list[0]
+        # Find relevant 'class' entity among 'Type' entities (use this for evo-suite SF110 already measured class)
+        # The first entity is returned if there is more than one Java class with name class_name in the project
+        return cls.get_index(db).get_type(class_name)
 
     @classmethod
     def get_method_of_class_java(cls, db, class_name):
-        method_list = list()
-        # entities = db.ents('function, method Member ~Unresolved')
-        entities = db.ents('Java Method')
-        # print(class_name)
-        for method_ in sorted(entities, key=UnderstandUtility.sort_key):
-            # print(method_)
-            # print(method_.parent().longname())
-            if method_.parent() is None:
-                continue
-            if str(method_.parent().longname()) == class_name:
-                # print('\tname:', method_.name(), '\tkind:', method_.kind().name(), '\ttype:', method_.type())
-                method_list.append(method_)
-        # print('len method list', len(method_list))
-        # print(method_list)
-        return method_list
+        # The 'Java Method' entities whose parent is class_name, sorted by long name
+        return cls.get_index(db).get_methods_by_class_longname(class_name)
 
     @classmethod
     def get_method_of_class_java2(cls, db, class_name=None, class_entity=None):
@@ -232,10 +316,7 @@ class UnderstandUtility:
         """
         if class_entity is None:
             class_entity = cls.get_class_entity_by_name(db=db, class_name=class_name)
-        method_list = class_entity.ents('Define', 'Java Method ~Unknown ~Unresolved ~Jar ~Library')
-        # print('len method list', len(method_list))
-        # print(method_list)
-        return method_list
+        return cls.get_index(db).get_defined_methods(class_entity)
 
     @classmethod
     def get_constructor_of_class_java(cls, db, class_name=None, class_entity=None):
@@ -247,10 +328,7 @@ class UnderstandUtility:
         """
         if class_entity is None:
             class_entity = cls.get_class_entity_by_name(db=db, class_name=class_name)
-        constructor_list = class_entity.ents('Define', 'Java Method Constructor')
-        # print('len constructor list', len(constructor_list))
-        # print(constructor_list)
-        return constructor_list
+        return cls.get_index(db).get_constructors(class_entity)
 
     @classmethod
     def get_method_name_of_class(cls, db, class_name):
@@ -280,16 +358,7 @@ class UnderstandUtility:
     def get_class_attributes_java(cls, db, class_name=None, class_entity=None) -> list:
         if class_entity is None:
             class_entity = UnderstandUtility.get_class_entity_by_name(db=db, class_name=class_name)
-        class_attributes_list = list()
-        for java_var in class_entity.ents('Define', 'Java Variable'):
-            # print(java_var.longname())
-            # print(java_var.kind())
-            # print('TYPE::', java_var.type())
-            # print(java_var.library())
-            # print('-------------')
-            class_attributes_list.append(java_var)
-
-        return class_attributes_list
+        return cls.get_index(db).get_attributes(class_entity)
 
     @classmethod
     def get_data_abstraction_coupling(cls, db, class_name=None, class_entity=None) -> int:
@@ -337,24 +406,8 @@ class UnderstandUtility:
 
     @classmethod
     def get_package_of_given_class_2(cls, db, class_name):
-        class_entity = UnderstandUtility.get_class_entity_by_name(db, class_name)
-        # print(class_entity.parent())
-        # print('class_name', class_entity.longname())
-        # print('class_name', class_name)
-
-        if class_entity is None:
-            return None, 'default'
-
-        package_list = class_entity.ents('Containin', 'Java Package')
-        while not package_list and class_entity.parent() is not None:
-            package_list = class_entity.parent().ents('Containin', 'Java Package')
-            class_entity = class_entity.parent()
-
-        # print('package_name', package_list)
-        if len(package_list) < 1:
-            return None, 'default'
-        else:
-            return package_list[0], package_list[0].longname()
+        # (package entity, package long name) or (None, 'default')
+        return cls.get_index(db).get_package(class_name)
 
     @classmethod
     def get_package_clasess_java(cls, package_entity=None):
@@ -4,6 +4,15 @@ This module contains modularity measurement script at package-level
 to be used in refactoring process in addition to QMOOD metrics
 
 ## Changelog
+### v0.3.1
+- `main` is timed by the profiler when it is enabled
+
+### v0.3.0
+- Add DependencyGraphModularity, which builds the class dependency graph and the class-package map from the
+Understand database in one pass (no `und export` subprocess and no CSV file) and computes Newman-Leicht
+modularity with sparse matrices
+- `main` uses DependencyGraphModularity, such that concurrent evaluations do not share any file
+
 ### v0.2.1
 - Improve performance
 - Improve accuracy
@@ -17,21 +26,23 @@ to be used in refactoring process in addition to QMOOD metrics
 
 """
 
-__version__ = '0.2.1'
+__version__ = '0.3.1'
 __author__ = 'Morteza Zakeri'
 
 import os
 import re
 from collections import defaultdict
 
+import numpy as np
 import pandas
+import scipy.sparse as sp
 import networkx as nx
 import networkx.algorithms.community as nx_comm
 
 import understand
 
 from codart.learner.sbr_initializer.utils.utility import logger, config
-from codart.utility.directory_utils import export_understand_dependencies_csv
+from codart.utility.profiling import profiled
 
 
 class Modularity:
@@ -103,26 +114,109 @@ class Modularity:
         return q
 
 
+class DependencyGraphModularity:
+    """
+    Modularity of the class dependency graph, where the packages are the communities.
+    The graph is built directly from the Understand database, similar to the class dependencies exported by
+    `und export -dependencies class` (anonymous classes are excluded and each dependency is one unweighted edge).
+    """
+
+    class_filter = "Java Class ~Unknown ~Unresolved ~Jar ~Library ~Anonymous ~TypeVariable, " \
+                   "Java Interface ~Unknown ~Unresolved ~Jar ~Library"
+
+    def __init__(self, project_db_path=None, db=None):
+        """
+        :param project_db_path: The understand database path
+        :param db: An already opened understand database to be used instead of `project_db_path`
+        """
+        self.project_db_path = project_db_path
+        self.class_names = list()
+        self.class_packages = list()  # The package index of each class
+        self.package_names = list()
+        self.adjacency = None  # Sparse adjacency matrix of the class dependency graph
+
+        if db is None:
+            db = understand.open(self.project_db_path)
+            try:
+                self.build(db)
+            finally:
+                db.close()
+        else:
+            self.build(db)
+
+    def build(self, db):
+        """
+        Builds the class dependency digraph and the class-package map in one pass over the class entities
+        """
+        class_entities = db.ents(self.class_filter)
+        class_index = {class_entity.uniquename(): i for i, class_entity in enumerate(class_entities)}
+        package_index = dict()
+        rows, columns = list(), list()
+        for i, class_entity in enumerate(class_entities):
+            self.class_names.append(class_entity.longname())
+            package_name = self.get_package_name(class_entity)
+            if package_name not in package_index:
+                package_index[package_name] = len(self.package_names)
+                self.package_names.append(package_name)
+            self.class_packages.append(package_index[package_name])
+
+            for dependency in class_entity.depends():
+                j = class_index.get(dependency.uniquename())
+                if j is not None:
+                    rows.append(i)
+                    columns.append(j)
+
+        n = len(class_entities)
+        self.adjacency = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, columns)), shape=(n, n)
+        )
+        # Duplicated edges are summed by csr_matrix, while each dependency is one edge
+        self.adjacency.data[:] = 1.
+
+    @staticmethod
+    def get_package_name(class_entity):
+        # Nested classes belong to the package of their top-level class
+        package_list = class_entity.ents('Containin', 'Java Package')
+        while not package_list and class_entity.parent() is not None:
+            class_entity = class_entity.parent()
+            package_list = class_entity.ents('Containin', 'Java Package')
+        return package_list[0].longname() if len(package_list) > 0 else 'default'
+
+    def compute_modularity_newman_leicht(self):
+        """
+        Directed modularity (Newman and Leicht), equal to `networkx.algorithms.community.modularity`:
+            Q = sum_c [ L_c / m - (K_out_c * K_in_c) / m^2 ]
+        where L_c is the number of edges inside package c, and K_out_c and K_in_c are the sum of out-degrees
+        and in-degrees of the classes in package c.
+        :return: The modularity of the class dependency graph
+        """
+        m = self.adjacency.sum()
+        if m == 0:
+            return 0.
+        packages = np.asarray(self.class_packages, dtype=np.int64)
+        coo = self.adjacency.tocoo()
+        intra_package_edges = coo.data[packages[coo.row] == packages[coo.col]].sum()
+        out_degree = np.asarray(self.adjacency.sum(axis=1)).ravel()
+        in_degree = np.asarray(self.adjacency.sum(axis=0)).ravel()
+        n_packages = len(self.package_names)
+        package_out_degree = np.bincount(packages, weights=out_degree, minlength=n_packages)
+        package_in_degree = np.bincount(packages, weights=in_degree, minlength=n_packages)
+        q = intra_package_edges / m - np.dot(package_out_degree, package_in_degree) / (m ** 2)
+        return float(q)
+
+
 # Modularity API
-def main(project_db_path=None, initial_value=1.0):
+@profiled('modularity', category='objective')
+def main(project_db_path=None, initial_value=1.0, db=None):
     """
     A demo of using modularity module to measure modularity quality attribute based on graph-analysis
+    :param project_db_path: The understand database path
+    :param initial_value: The modularity of the initial program
+    :param db: An already opened understand database to be used instead of `project_db_path`
     """
 
-    # csv_path = os.path.abspath('../metrics/mdg/MDG.csv')
-    csv_path = os.path.join(os.path.dirname(__file__), 'mdg/MDG.csv')
-    export_understand_dependencies_csv(
-        csv_path=csv_path,
-        db_path=project_db_path
-    )
-    # while not os.path.exists(csv_path):
-    #     time.sleep(0.05)
-
-    if not os.path.exists(csv_path):
-        return initial_value
-    modulo = Modularity(graph_path=csv_path, project_db_path=project_db_path)
+    modulo = DependencyGraphModularity(project_db_path=project_db_path, db=db)
     q = modulo.compute_modularity_newman_leicht()
-    os.remove(csv_path)
     return round(q / initial_value, 5)
 
 
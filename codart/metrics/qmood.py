@@ -6,9 +6,20 @@ to be used as six objectives in search-based refactoring
 [1] J. Bansiya and C. G. Davis, “A hierarchical model for object-oriented design quality assessment,”
 IEEE Trans. Softw. Eng., vol. 28, no. 1, pp. 4–17, 2002.
 
+## Changelog
+
+### version 0.4.1
+    1. The computation of the design metrics is timed by the profiler when it is enabled.
+
+### version 0.4.0
+    1. Add single-scan mode to DesignMetrics: the database is opened once, the Understand metrics of each class
+    are fetched with one batched `metric()` call, and all design metrics are computed from an in-memory class table.
+    2. DesignQualityAttributes uses the single-scan mode by default.
+    3. Add incremental computation of the design metrics and testability with IncrementalMetricsStore.
+
 """
 
-__version__ = '0.3.1'
+__version__ = '0.4.1'
 __author__ = 'Morteza Zakeri, Amin HZDEV'
 
 import os
@@ -16,33 +27,112 @@ import understand as und
 from configparser import ConfigParser
 from codart.metrics.modularity import main as modularity_main
 from codart.metrics.testability_prediction2 import main as testability_main
+from codart.utility.profiling import profiled
 
 
 config = ConfigParser()
 config.read("config.ini")
 
+# Understand metrics required by the class-level design metrics, fetched at once in the single-scan mode
+CLASS_UNDERSTAND_METRICS = [
+    'MaxInheritanceTree', 'PercentLackOfCohesion', 'CountDeclMethodAll', 'CountDeclMethodPublic',
+    'CountDeclMethod', 'SumCyclomaticModified'
+]
+CLASS_LEVEL_DESIGN_METRICS = ['MOA', 'DAM', 'CAMC', 'CIS', 'NOM', 'DCC', 'MFA', 'NOP']
+
+ALL_CLASSES_FILTER = "Java Class ~TypeVariable ~Anonymous ~Enum, Java Interface"
+KNOWN_CLASSES_FILTER = "Java Class ~Unresolved ~Unknown ~TypeVariable ~Anonymous ~Enum, Java Interface"
+USER_DEFINED_CLASSES_FILTER = "Java Class ~Unresolved ~Unknown ~TypeVariable ~Anonymous ~Enum ~Jar ~Library " \
+                              "~Standard, Java Interface"
+CLASS_TABLE_FILTER = "Java Class ~Unknown ~TypeVariable ~Anonymous ~Enum, Java Interface"
+
+
+def normalize_design_metric(name, value):
+    initial = config.CURRENT_METRICS.get(name)
+    if initial == 0:
+        initial = 1.
+    return round(value / initial, 5)
+
+
 def divide_by_initial_value(func):
-    def wrapper(*args, **kwargs):
-        value = func(*args, **kwargs)
-        initial = config.CURRENT_METRICS.get(func.__name__)
-        if initial == 0:
-            initial = 1.
-        value = round(value / initial, 5)
-        return value
+    """
+    Normalizes a design metric by its initial value.
+    In the single-scan mode, the raw value is read from the values computed by `DesignMetrics.scan`.
+    """
+    def wrapper(self, *args, **kwargs):
+        if self.raw_design_metrics is not None:
+            value = self.raw_design_metrics[func.__name__]
+        else:
+            value = func(self, *args, **kwargs)
+        return normalize_design_metric(func.__name__, value)
 
     return wrapper
 
 
-class DesignMetrics:
+def new_class_table_totals() -> dict:
+    totals = {'classes': 0, 'hierarchies': 0, 'ancestor_classes': 0, 'ancestors': 0}
+    totals.update({design_metric: 0 for design_metric in CLASS_LEVEL_DESIGN_METRICS})
+    return totals
+
+
+def add_class_row_to_totals(totals: dict, row: dict, sign: int = 1):
     """
-    Class to compute 11 design metrics listed by J. Bansiya et G. Davis, 2002
+    Adds (sign=1) or subtracts (sign=-1) the contribution of a class row to the totals of the class table
+    """
+    totals['classes'] += sign
+    totals['hierarchies'] += sign * int(row['is_hierarchy_root'])
+    if row['ancestors'] is not None:
+        totals['ancestor_classes'] += sign
+        totals['ancestors'] += sign * row['ancestors']
+    for design_metric in CLASS_LEVEL_DESIGN_METRICS:
+        totals[design_metric] += sign * row[design_metric]
 
+
+def design_metrics_from_totals(totals: dict, design_size: int) -> dict:
+    """
+    :return: The raw (not normalized) project-level design metrics computed from the totals of the class table
     """
+    raw_design_metrics = {
+        'DSC': design_size,
+        'NOH': totals['hierarchies'],
+        'ANA': totals['ancestors'] / totals['ancestor_classes'] if totals['ancestor_classes'] > 0 else 0.,
+    }
+    for design_metric in CLASS_LEVEL_DESIGN_METRICS:
+        raw_design_metrics[design_metric] = round(totals[design_metric] / totals['classes'], 5) \
+            if totals['classes'] > 0 else 0.
+    return raw_design_metrics
 
-    def __init__(self, udb_path):
 
+class DesignMetrics:
+    """
+    Class to compute 11 design metrics listed by J. Bansiya et G. Davis, 2002
+
+    """
 
+    def __init__(self, udb_path, single_scan=False, metrics_store=None, dbx: und.Db = None):
+        """
+        :param udb_path: The understand database path
+        :param single_scan: Whether to compute all design metrics in one scan of the database or not.
+        :param metrics_store: An IncrementalMetricsStore to compute the design metrics from the class rows
+        of the previous evaluation, recomputing only the changed classes.
+        :param dbx: An already opened database. No design metric is computed in advance, and the
+        class-level design metrics are computed with the batched Understand metrics of each class.
+        """
         self.udb_path = udb_path
+        self.metrics_cache = None  # Class entity id --> Understand metrics (single-scan mode)
+        self.class_table = None  # Class unique name --> class-level design metrics (single-scan mode)
+        self.raw_design_metrics = None  # Design metric --> value before normalization (single-scan mode)
+        if dbx is not None:
+            self.metrics_cache = dict()
+            self.load_classes_simple_names(dbx)
+            return
+        if metrics_store is not None:
+            self.raw_design_metrics = metrics_store.update_design_metrics()
+            return
+        if single_scan:
+            self.scan()
+            return
+
         try:
             dbx = und.open(self.udb_path)
             print("Understand database opened successfully.")
@@ -86,7 +176,7 @@ class DesignMetrics:
                 if ref:
                     is_tree = True
                     break
-            mit = ent.metric(['MaxInheritanceTree'])['MaxInheritanceTree']
+            mit = self.class_metrics(ent, ['MaxInheritanceTree'])['MaxInheritanceTree']
             if ("Interface" in ent.kindname() or mit == 1) and is_tree:
                 count += 1
 
@@ -109,7 +199,7 @@ class DesignMetrics:
             if "Interface" in class_entity.kindname():
                 continue
 
-            metrics = class_entity.metric(['MaxInheritanceTree'])
+            metrics = self.class_metrics(class_entity, ['MaxInheritanceTree'])
             print(f"Metrics for {class_entity.longname()}: {metrics}")
 
             mit = metrics.get('MaxInheritanceTree', 0)
@@ -246,7 +336,7 @@ class DesignMetrics:
         if "Interface" in class_entity.kindname():
             return 2.
 
-        percentage = class_entity.metric(['PercentLackOfCohesion']).get('PercentLackOfCohesion', 0)
+        percentage = self.class_metrics(class_entity, ['PercentLackOfCohesion']).get('PercentLackOfCohesion', 0)
 
         if percentage is None:
             percentage = 0
@@ -261,9 +351,9 @@ class DesignMetrics:
         :return: Number of public methods in class
         """
         if "Interface" in class_entity.kindname():
-            value = class_entity.metric(['CountDeclMethodAll']).get('CountDeclMethodAll', 0)
+            value = self.class_metrics(class_entity, ['CountDeclMethodAll']).get('CountDeclMethodAll', 0)
         else:
-            value = class_entity.metric(['CountDeclMethodPublic']).get('CountDeclMethodPublic', 0)
+            value = self.class_metrics(class_entity, ['CountDeclMethodPublic']).get('CountDeclMethodPublic', 0)
             # public_methods = len(class_entity.ents("Define", "Java Method Public Member"))
 
         if value is None:
@@ -289,7 +379,7 @@ class DesignMetrics:
             if "Interface" in class_entity.kindname():
                 return 0
             # wmc = class_entity.metric(['SumCyclomatic']).get('SumCyclomatic', 0)
-            wmc2 = class_entity.metric(['SumCyclomaticModified']).get('SumCyclomaticModified', 0)
+            wmc2 = self.class_metrics(class_entity, ['SumCyclomaticModified']).get('SumCyclomaticModified', 0)
             # print(class_entity.longname(), wmc, wmc2)
             return wmc2
         return 0
@@ -328,8 +418,7 @@ class DesignMetrics:
         :param class_entity: The class entity
         :return: Ratio of the number of inherited methods per the total number of methods within a class.
         """
-        metrics = class_entity.metric(['CountDeclMethod', 'CountDeclMethodAll'])
-
+        metrics = self.class_metrics(class_entity, ['CountDeclMethod', 'CountDeclMethodAll'])
 
         local_methods = metrics.get('CountDeclMethod', 0) if metrics.get('CountDeclMethod') is not None else 0
         all_methods = metrics.get('CountDeclMethodAll', 0) if metrics.get('CountDeclMethodAll') is not None else 0
@@ -350,7 +439,7 @@ class DesignMetrics:
         else:
             implemented_methods = 0
             for interface_entity in implemented_interfaces:
-                count = interface_entity.metric(['CountDeclMethodAll']).get('CountDeclMethodAll', 0)
+                count = self.class_metrics(interface_entity, ['CountDeclMethodAll']).get('CountDeclMethodAll', 0)
                 implemented_methods += count if count is not None else 0
 
             if all_methods == 0:
@@ -370,8 +459,7 @@ class DesignMetrics:
         if "Final" in class_entity.kindname():
             return 0
 
-        metrics = class_entity.metric(['CountDeclMethodAll'])
-
+        metrics = self.class_metrics(class_entity, ['CountDeclMethodAll'])
 
         all_methods = metrics.get('CountDeclMethodAll', 0) if metrics.get('CountDeclMethodAll') is not None else 0
 
@@ -389,6 +477,78 @@ class DesignMetrics:
         number_of_polymorphic_methods = all_methods - private_or_static_or_final
         return number_of_polymorphic_methods if number_of_polymorphic_methods >= 0 else 0
 
+    def class_metrics(self, class_entity: und.Ent, metric_names: list) -> dict:
+        """
+        :param class_entity: The class entity
+        :param metric_names: The Understand metrics to be computed
+        :return: A dictionary of metric names and values.
+        In the single-scan mode, all Understand metrics used by the design metrics are computed with
+        one call per class and cached.
+        """
+        if self.metrics_cache is None:
+            return class_entity.metric(metric_names)
+        key = class_entity.id()
+        if key not in self.metrics_cache:
+            self.metrics_cache[key] = class_entity.metric(CLASS_UNDERSTAND_METRICS)
+        return self.metrics_cache[key]
+
+    def scan(self):
+        """
+        Single-scan mode: opens the database once, visits each class entity once, and computes the
+        class-level design metrics of all classes in an in-memory table (`class_table`).
+        The project-level design metrics are then computed from the table, with the same formulas and
+        normalization as the per-property computation.
+        :return: The raw (not normalized) design metrics
+        """
+        self.metrics_cache = dict()
+        self.class_table = dict()
+        dbx: und.Db = und.open(self.udb_path)
+        try:
+            self.load_classes_simple_names(dbx)
+            known_class_ids = {ent.id() for ent in dbx.ents(KNOWN_CLASSES_FILTER)}
+            for class_entity in dbx.ents(CLASS_TABLE_FILTER):
+                self.class_table[class_entity.uniquename()] = self.compute_class_row(
+                    class_entity, is_known=class_entity.id() in known_class_ids
+                )
+        finally:
+            dbx.close()
+
+        totals = new_class_table_totals()
+        for row in self.class_table.values():
+            add_class_row_to_totals(totals, row)
+        self.raw_design_metrics = design_metrics_from_totals(totals, design_size=len(self.user_defined_classes))
+        return self.raw_design_metrics
+
+    def load_classes_simple_names(self, dbx: und.Db):
+        """
+        Loads the sets of class names used by the class-level design metrics from an open database
+        """
+        self.all_classes = {ent.simplename() for ent in dbx.ents(ALL_CLASSES_FILTER)}
+        self.user_defined_classes = {ent.simplename() for ent in dbx.ents(USER_DEFINED_CLASSES_FILTER)}
+
+    def compute_class_row(self, class_entity: und.Ent, is_known: bool = True) -> dict:
+        """
+        :param class_entity: The class entity
+        :param is_known: Whether the class is a known (resolved) class or not. NOH and ANA only count known classes.
+        :return: The class-level design metrics of the class and its contribution to NOH and ANA
+        """
+        row = dict()
+        for design_metric in CLASS_LEVEL_DESIGN_METRICS:
+            value = getattr(self, f'{design_metric}_class_level')(class_entity)
+            row[design_metric] = value if value is not None else 0
+
+        row['is_known'] = is_known
+        row['is_hierarchy_root'] = False
+        row['ancestors'] = None
+        if is_known:
+            is_interface = "Interface" in class_entity.kindname()
+            mit = self.class_metrics(class_entity, ['MaxInheritanceTree'])['MaxInheritanceTree']
+            row['is_hierarchy_root'] = (is_interface or mit == 1) and \
+                len(class_entity.refs("Coupleby Extendby, Coupleby Implementby")) > 0
+            if not is_interface:
+                row['ancestors'] = mit if mit is not None else 0
+        return row
+
     def get_classes_simple_names(self, filter_string: str = None) -> set:
         """
         :return: a set of all classes (short name) names matched with a given filter on db entities
@@ -438,13 +598,19 @@ class DesignQualityAttributes:
         6. Effectiveness
     """
 
-    def __init__(self, udb_path: str = ""):
+    @profiled('qmood', category='objective')
+    def __init__(self, udb_path: str = "", single_scan: bool = True, metrics_store=None):
         """
         Implements Project Objectives due to QMOOD design metrics
         :param udb_path: The understand database path
+        :param single_scan: Whether to compute the design metrics in one scan of the database (faster) or
+        separately for each design metric.
+        :param metrics_store: An IncrementalMetricsStore kept between evaluations of the same project.
+        If given, the design metrics and testability are recomputed only for the changed classes.
         """
         self.udb_path = udb_path
-        self.__qmood = DesignMetrics(udb_path=udb_path)
+        self.metrics_store = metrics_store
+        self.__qmood = DesignMetrics(udb_path=udb_path, single_scan=single_scan, metrics_store=metrics_store)
         self.DSC = self.__qmood.DSC  # Design Size
         self.NOH = self.__qmood.NOH  # Hierarchies
         self.ANA = self.__qmood.ANA  # Abstraction
@@ -474,6 +640,11 @@ class DesignQualityAttributes:
 
     @property
     def testability(self):
+        if self.metrics_store is not None:
+            self._testability = self.metrics_store.testability(
+                initial_value=float(config["METRICS"]["initial_value_testability"])
+            )
+            return round(self._testability, 5)
         self._testability = testability_main(
             self.udb_path, initial_value=float(config["METRICS"]["initial_value_testability"])
         )
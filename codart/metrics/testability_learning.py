@@ -29,9 +29,16 @@ The results will be saved in sklearn_models6c
 ## Inferences
 Use the method `inference_model2` of the class `Regression` to predict testability of new Java classes.
 
+## Concurrent training
+`Regression.regress_concurrently` runs the hyperparameter searches of several models at the same time,
+sharing one CPU budget between them. The searches are either exhaustive (`search='grid'`) or successive-halving
+(`search='halving'`), and their results are cached with a joblib `Memory` under `SEARCH_CACHE_DIR`
+(default: ~/.cache/codart/search), keyed by the hash of the training set, the model, and its parameter grid.
+A search is therefore fitted once per dataset and reused by the later trainings.
+
 """
 
-__version__ = '0.7.3'
+__version__ = '0.8.0'
 __author__ = 'Morteza Zakeri'
 
 import os
@@ -39,7 +46,7 @@ import datetime
 
 import pandas as pd
 import joblib
-from joblib import dump, load
+from joblib import dump, load, Parallel, delayed
 
 from sklearn.metrics import *
 from sklearn.preprocessing import QuantileTransformer
@@ -53,6 +60,138 @@ from sklearn.ensemble import VotingRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, median_absolute_error, r2_score
 import math
 
+DEFAULT_SEARCH_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'codart', 'search')
+
+
+def get_regressor(model_number):
+    """
+    Returns the regressor of a model and its parameters to be tuned by cross-validation
+
+    Args:
+        model_number (int): 1: DTR, 2: RFR, 3: GBR, 4: HGBR, 5: SGDR, 6: MLPR
+
+    Returns:
+        tuple: (regressor, parameters)
+    """
+    if model_number == 1:
+        regressor = tree.DecisionTreeRegressor(random_state=23, )
+        # Set the parameters to be used for tuning by cross-validation
+        parameters = {
+            # 'criterion': ['mse', 'friedman_mse', 'mae'],
+            'max_depth': range(3, 50, 5),
+            'min_samples_split': range(2, 30, 2)
+        }
+    elif model_number == 2:
+        regressor = RandomForestRegressor(random_state=19, )
+        parameters = {
+            'n_estimators': range(100, 200, 100),
+            # 'criterion': ['mse', 'mae'],
+            'max_depth': range(10, 50, 10),
+            # 'min_samples_split': range(2, 30, 2),
+            # 'max_features': ['auto', 'sqrt', 'log2']
+        }
+    elif model_number == 3:
+        regressor = GradientBoostingRegressor(n_estimators=400, learning_rate=0.05, random_state=17, )
+        parameters = {
+            # 'loss': ['ls', 'lad', ],
+            'max_depth': range(10, 50, 10),
+            'min_samples_split': range(2, 30, 3)
+        }
+    elif model_number == 4:
+        regressor = HistGradientBoostingRegressor(max_iter=400, learning_rate=0.05, random_state=13, )
+        parameters = {
+            # 'loss': ['least_squares', 'least_absolute_deviation'],
+            'max_depth': range(10, 50, 10),
+            'min_samples_leaf': range(5, 50, 10)
+        }
+    elif model_number == 5:
+        regressor = linear_model.SGDRegressor(early_stopping=True, n_iter_no_change=5, random_state=11, )
+        parameters = {
+            'loss': ['squared_loss', 'huber', 'epsilon_insensitive'],
+            'penalty': ['l2', 'l1', 'elasticnet'],
+            'max_iter': range(50, 1000, 50),
+            'learning_rate': ['invscaling', 'optimal', 'constant', 'adaptive'],
+            'eta0': [0.1, 0.01],
+            'average': [32, ]
+        }
+    elif model_number == 6:
+        regressor = MLPRegressor(random_state=7, )
+        parameters = {
+            'hidden_layer_sizes': [(256, 100), (512, 256, 100), ],
+            'activation': ['tanh', ],
+            'solver': ['adam', ],
+            'max_iter': range(50, 200, 50)
+        }
+    else:
+        raise ValueError(f'Unknown model number {model_number}')
+    return regressor, parameters
+
+
+def create_search(model_number, search='grid', n_jobs=7):
+    """
+    Creates the hyperparameter search of a model with cross-validation
+
+    Args:
+        model_number (int): 1: DTR, 2: RFR, 3: GBR, 4: HGBR, 5: SGDR, 6: MLPR
+        search (str): 'grid' for an exhaustive grid search, 'halving' for a successive-halving grid search,
+            which fits all candidates on a few samples and only the best ones on all samples
+        n_jobs (int): The number of search jobs run in parallel
+    """
+    regressor, parameters = get_regressor(model_number)
+    # CrossValidation iterator object:
+    # https://scikit-learn.org/stable/tutorial/statistical_inference/model_selection.html
+    cv = ShuffleSplit(n_splits=5, test_size=0.20, random_state=101)
+    if search == 'grid':
+        # Set the objectives which must be optimized during parameter tuning
+        # scoring = ['r2', 'neg_mean_squared_error', 'neg_root_mean_squared_error', 'neg_mean_absolute_error',]
+        scoring = ['neg_root_mean_squared_error', ]
+        # Find the best model using gird-search with cross-validation
+        return GridSearchCV(regressor, param_grid=parameters, scoring=scoring, cv=cv,
+                            n_jobs=n_jobs, refit='neg_root_mean_squared_error')
+    elif search == 'halving':
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.model_selection import HalvingGridSearchCV
+        return HalvingGridSearchCV(regressor, param_grid=parameters, scoring='neg_root_mean_squared_error', cv=cv,
+                                   factor=3, random_state=101, n_jobs=n_jobs, refit=True)
+    raise ValueError(f'Unknown search {search}')
+
+
+def fit_search(dataset_hash, model_number, search, X, y, n_jobs=7):
+    """
+    Fits the hyperparameter search of a model, the result is cached by `get_search_memory`
+    keyed by (dataset_hash, model_number, search), the data and the number of jobs are not part of the key
+    """
+    clf = create_search(model_number, search=search, n_jobs=n_jobs)
+    print('Fitting model number', model_number, 'with', search, 'search')
+    clf.fit(X=X, y=y)
+    return clf
+
+
+def get_search_memory(cache_dir=None):
+    """
+    Returns the joblib `Memory` caching the fitted searches (`SEARCH_CACHE_DIR` environment variable)
+    """
+    cache_dir = cache_dir or os.getenv('SEARCH_CACHE_DIR', DEFAULT_SEARCH_CACHE_DIR)
+    return joblib.Memory(location=cache_dir, verbose=0)
+
+
+def fit_search_cached(dataset_hash, model_number, search, X, y, n_jobs=7, memory=None):
+    if memory is None:
+        return fit_search(dataset_hash, model_number, search, X, y, n_jobs=n_jobs)
+    regressor, parameters = get_regressor(model_number)
+    cached_fit_search = memory.cache(fit_search, ignore=['X', 'y', 'n_jobs'])
+    # The key also contains the regressor and its parameter grid, such that changing them refits the search
+    return cached_fit_search(
+        (dataset_hash, joblib.hash((regressor.get_params(), parameters))), model_number, search, X, y, n_jobs=n_jobs
+    )
+
+
+def split_cpu_budget(n_jobs, n_searches):
+    """
+    Splits a budget of n_jobs CPUs between n_searches concurrent searches (at least one each)
+    """
+    return [max(1, n_jobs // n_searches + (1 if i < n_jobs % n_searches else 0)) for i in range(n_searches)]
+
 
 class Regression(object):
     def __init__(self, df_path: str = None, feature_selection_mode=False):
@@ -99,6 +238,7 @@ class Regression(object):
         self.X_train = self.scaler.transform(self.X_train1)
         self.X_test = self.scaler.transform(self.X_test1)
         dump(self.scaler, df_path[:-4] + '.joblib')
+        self._dataset_hash = None
 
     def evaluate_model(self, model=None, model_path=None):
         if model is None:
@@ -135,7 +275,15 @@ class Regression(object):
 
     # Add these modifications to the Regression class in codart.metrics.testability_learning
 
-    def regress(self, model_path=None, model_number=None, return_model=False):
+    @property
+    def dataset_hash(self):
+        """The hash of the (preprocessed) training set"""
+        if self._dataset_hash is None:
+            self._dataset_hash = joblib.hash((self.X_train, self.y_train.values))
+        return self._dataset_hash
+
+    def regress(self, model_path=None, model_number=None, return_model=False, search='grid', n_jobs=7,
+                use_cache=False):
         """
         Train testability prediction on different model
 
@@ -143,72 +291,53 @@ class Regression(object):
             model_path (str, optional): Path to save the model. If None, model is not saved to file.
             model_number (int): 1: DTR, 2: RFR, 3: GBR, 4: HGBR, 5: SGDR, 6: MLPR
             return_model (bool): Whether to return the trained model
+            search (str): 'grid' or 'halving' (successive-halving), see `create_search`
+            n_jobs (int): The number of search jobs run in parallel
+            use_cache (bool): Whether to reuse the search fitted on the same training set before
 
         Returns:
             If return_model is True, returns the trained model object
         """
-        if model_number == 1:
-            regressor = tree.DecisionTreeRegressor(random_state=23, )
-            # Set the parameters to be used for tuning by cross-validation
-            parameters = {
-                # 'criterion': ['mse', 'friedman_mse', 'mae'],
-                'max_depth': range(3, 50, 5),
-                'min_samples_split': range(2, 30, 2)
-            }
-        elif model_number == 2:
-            regressor = RandomForestRegressor(random_state=19, )
-            parameters = {
-                'n_estimators': range(100, 200, 100),
-                # 'criterion': ['mse', 'mae'],
-                'max_depth': range(10, 50, 10),
-                # 'min_samples_split': range(2, 30, 2),
-                # 'max_features': ['auto', 'sqrt', 'log2']
-            }
-        elif model_number == 3:
-            regressor = GradientBoostingRegressor(n_estimators=400, learning_rate=0.05, random_state=17, )
-            parameters = {
-                # 'loss': ['ls', 'lad', ],
-                'max_depth': range(10, 50, 10),
-                'min_samples_split': range(2, 30, 3)
-            }
-        elif model_number == 4:
-            regressor = HistGradientBoostingRegressor(max_iter=400, learning_rate=0.05, random_state=13, )
-            parameters = {
-                # 'loss': ['least_squares', 'least_absolute_deviation'],
-                'max_depth': range(10, 50, 10),
-                'min_samples_leaf': range(5, 50, 10)
-            }
-        elif model_number == 5:
-            regressor = linear_model.SGDRegressor(early_stopping=True, n_iter_no_change=5, random_state=11, )
-            parameters = {
-                'loss': ['squared_loss', 'huber', 'epsilon_insensitive'],
-                'penalty': ['l2', 'l1', 'elasticnet'],
-                'max_iter': range(50, 1000, 50),
-                'learning_rate': ['invscaling', 'optimal', 'constant', 'adaptive'],
-                'eta0': [0.1, 0.01],
-                'average': [32, ]
-            }
-        elif model_number == 6:
-            regressor = MLPRegressor(random_state=7, )
-            parameters = {
-                'hidden_layer_sizes': [(256, 100), (512, 256, 100), ],
-                'activation': ['tanh', ],
-                'solver': ['adam', ],
-                'max_iter': range(50, 200, 50)
-            }
+        clf = fit_search_cached(self.dataset_hash, model_number, search, self.X_train, self.y_train,
+                                n_jobs=n_jobs, memory=get_search_memory() if use_cache else None)
+        return self.save_search_result(clf, model_path=model_path, return_model=return_model)
 
-        # Set the objectives which must be optimized during parameter tuning
-        # scoring = ['r2', 'neg_mean_squared_error', 'neg_root_mean_squared_error', 'neg_mean_absolute_error',]
-        scoring = ['neg_root_mean_squared_error', ]
-        # CrossValidation iterator object:
-        # https://scikit-learn.org/stable/tutorial/statistical_inference/model_selection.html
-        cv = ShuffleSplit(n_splits=5, test_size=0.20, random_state=101)
-        # Find the best model using gird-search with cross-validation
-        clf = GridSearchCV(regressor, param_grid=parameters, scoring=scoring, cv=cv,
-                           n_jobs=7, refit='neg_root_mean_squared_error')
-        print('Fitting model number', model_number)
-        clf.fit(X=self.X_train, y=self.y_train)
+    def regress_concurrently(self, model_paths: dict, n_jobs=None, search='grid', use_cache=True, return_models=False):
+        """
+        Train several models at the same time, the hyperparameter searches share a budget of n_jobs CPUs
+
+        Args:
+            model_paths (dict): Model number --> path to save the model (None not to save it)
+            n_jobs (int, optional): The CPU budget of all searches (default: the number of CPUs)
+            search (str): 'grid' or 'halving' (successive-halving), see `create_search`
+            use_cache (bool): Whether to reuse the searches fitted on the same training set before
+            return_models (bool): Whether to return the trained models
 
+        Returns:
+            If return_models is True, returns a dict of model number --> trained model
+        """
+        model_numbers = list(model_paths)
+        if not model_numbers:
+            return {} if return_models else None
+        budgets = split_cpu_budget(n_jobs or os.cpu_count() or 1, len(model_numbers))
+        memory = get_search_memory() if use_cache else None
+        # Each search runs in its own process, and its cross-validation jobs in threads of that process
+        searches = Parallel(n_jobs=len(model_numbers), backend='loky')(
+            delayed(fit_search_cached)(self.dataset_hash, model_number, search, self.X_train, self.y_train,
+                                       n_jobs=budget, memory=memory)
+            for model_number, budget in zip(model_numbers, budgets)
+        )
+        models = {
+            model_number: self.save_search_result(clf, model_path=model_paths[model_number], return_model=True)
+            for model_number, clf in zip(model_numbers, searches)
+        }
+        if return_models:
+            return models
+
+    def save_search_result(self, clf, model_path=None, return_model=False):
+        """
+        Saves the results and the best model of a fitted search if model_path is provided
+        """
         # Save evaluation results if model_path is provided
         if model_path:
             output_dir = os.path.dirname(model_path)
@@ -1039,6 +1039,7 @@ class PreProcess:
             # print('processing understand db file {0}:'.format(f))
             db = und.open(os.path.join(udbs_path, f))
             cls.write_project_classes(project_name=f[:-4], db=db, csv_path=class_list_csv_path_root + f[:-4] + '.csv')
+            UnderstandUtility.clear_index(db)
             db.close()
             # print('processing understand db file {0} was finished'.format(f))
 
@@ -1088,6 +1089,7 @@ class PreProcess:
         # class_entities = cls.read_project_classes(db=db, classes_names_list=class_list, )
         db = und.open(project_path)
         class_list = cls.extract_project_classes(db=db)
+        UnderstandUtility.clear_index(db)
         db.close()
         # Check if the class_list is empty
         if not class_list:
@@ -1157,6 +1159,7 @@ class PreProcess:
         df.drop(columns=['NOCLINFILE'], inplace=True)
         df['CSNOM'] = df['CSNOIM'] + df['CSNOSM']
         # df.to_csv(result_csv, index=False)
+        UnderstandUtility.clear_index(database_)
         database_.close()
         return df
 
@@ -1204,9 +1207,11 @@ class PreProcess:
             for metric_name in TestabilityMetrics.get_class_ordinary_metrics_names():
                 one_class_metrics_value.append(class_ordinary_metrics_dict[metric_name])
 
+            UnderstandUtility.clear_index(db)
             db.close()
             return one_class_metrics_value
         except Exception as e:
+            UnderstandUtility.clear_index(db)
             db.close()
             print(f"An error occurred during parallel processing: {e}")
 
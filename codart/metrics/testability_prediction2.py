@@ -6,6 +6,28 @@ This module contains light-weight version of testability prediction script (with
 to be used in refactoring process in addition to QMOOD metrics.
 
 ## Changelog
+### v0.4.3
+- Add `model_fingerprint`, the version of the models and features of the prediction (used to key cached objectives)
+### v0.4.2
+- A worker process keeps a single open database (`WORKER_DATABASE`) and closes it before opening the database
+of another snapshot, since Understand allows only one open database per process
+### v0.4.1
+- `main` is timed by the profiler when it is enabled
+### v0.4.0
+- Compute the package metrics once per package and evaluation (`TestabilityMetrics.compute_package_metrics_table`),
+and join them to the class-level metrics (`compute_metrics_frame`) instead of recomputing them for each class
+### v0.3.2
+- Load the models lazily on first use (not at import time) through a process-wide loader
+with a local disk cache (`MinioModelLoader`)
+### v0.3.1
+- Compute the lexicon metrics with one lexer pass per file, cached by file content hash (`lexicon_features`)
+### v0.3.0
+- Add TestabilityPredictor, a long-lived predictor which loads the models once, computes the class metrics with
+a pool of worker processes (one database handle per worker), and predicts all classes with one call
+- Add scoring of many project snapshots in one call (`TestabilityPredictor.predict_snapshots`)
+### v0.2.4
+- Add `do` to compute the metrics vector of one class
+- Add per-class predictions to `TestabilityModel` (used by the incremental metrics store)
 ### v0.2.3
 - Remove dependency to metrics_jcode_odor
 ### v0.2.2
@@ -19,18 +41,22 @@ to be used in refactoring process in addition to QMOOD metrics.
 
 """
 
-__version__ = '0.2.3'
+__version__ = '0.4.3'
 __author__ = 'Morteza Zakeri'
 
 import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import joblib
 from joblib import Parallel, delayed
 import understand as und
-from codart.learner.sbr_initializer.utils.utility import logger, config
+from codart.learner.sbr_initializer.utils.utility import logger, config, get_config_value
 from codart.metrics import metrics_names
 from codart.metrics.metrics_coverability import UnderstandUtility
-from application.services.minio_model_loader import MinioModelLoader
+from codart.metrics.lexicon_features import compute_class_lexicon_metrics, LEXICON_SCOPE
+from application.services.minio_model_loader import get_model_loader
+from codart.utility.profiling import profiled
 
 
 
@@ -40,19 +66,43 @@ from application.services.minio_model_loader import MinioModelLoader
 # model_line = joblib.load(config['MODEL_PATHS']['model_line_path'])
 
 
-loader = MinioModelLoader(
-    minio_endpoint=os.getenv('MINIO_ENDPOINT', 'minio:9000'),
-    minio_access_key=os.getenv('MINIO_ACCESS_KEY', 'minioadmin'),
-    minio_secret_key=os.getenv('MINIO_SECRET_KEY', 'minioadmin'),
-    bucket_name='metrics',
-    dataset_number=0
-)
+# Module attribute --> model type in MinIO
+MODEL_TYPES = {
+    'scaler': 'RFR1',  # Scaler is saved with RFR1
+    'model': 'HGBR1',  # Main model
+    'model_branch': 'MLPR1',  # Branch coverage model
+    'model_line': 'VR1',  # Line coverage model
+}
 
-# Load models from MinIO
-scaler = loader.load_model('RFR1')  # Scaler is saved with RFR1
-model = loader.load_model('HGBR1')  # Main model
-model_branch = loader.load_model('MLPR1')  # Branch coverage model
-model_line = loader.load_model('VR1')  # Line coverage model
+
+def get_loader():
+    """
+    The process-wide model loader, models are downloaded on first use and cached on disk
+    """
+    return get_model_loader(
+        minio_endpoint=os.getenv('MINIO_ENDPOINT', 'minio:9000'),
+        minio_access_key=os.getenv('MINIO_ACCESS_KEY', 'minioadmin'),
+        minio_secret_key=os.getenv('MINIO_SECRET_KEY', 'minioadmin'),
+        bucket_name='metrics',
+        dataset_number=0
+    )
+
+
+def model_fingerprint() -> str:
+    """
+    The version of the module, the lexicon scope, and the SHA-256 of each model (the models are loaded if needed).
+    Testability values predicted with different fingerprints are not comparable.
+    """
+    loader = get_loader()
+    model_versions = [f'{name}={loader.model_version(model_type)}' for name, model_type in sorted(MODEL_TYPES.items())]
+    return ';'.join([__version__, f'lexicon_scope={LEXICON_SCOPE}'] + model_versions)
+
+
+def __getattr__(name):
+    # Load models from MinIO on first access to `scaler`, `model`, `model_branch`, and `model_line`
+    if name in MODEL_TYPES:
+        return get_loader().load_model(MODEL_TYPES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class TestabilityMetrics:
@@ -107,9 +157,10 @@ class TestabilityMetrics:
 
         """
         #
-        class_name = entity.longname()
-        class_name_list = class_name.split('.')[:-1]
-        package_name = '.'.join(class_name_list)
+        return cls.compute_java_package_metrics_by_name(db=db, package_name=get_package_name(entity.longname()))
+
+    @classmethod
+    def compute_java_package_metrics_by_name(cls, db=None, package_name=None):
         package_list = db.lookup(package_name + '$', 'Package')
         if package_list is None:
             return None
@@ -137,9 +188,42 @@ class TestabilityMetrics:
 
         return package_metrics
 
+    @classmethod
+    def compute_package_metrics_table(cls, db=None, package_names=None) -> pd.DataFrame:
+        """
+
+        Computes the metrics of each package once
+
+        Args:
+
+            db (understand.Db):
+
+            package_names (iterable): The package names, as returned by `get_package_name`
+
+        Returns:
+
+            pandas.DataFrame: The 'PK_' metrics indexed by package name (packages not found are left out)
+
+        """
+
+        rows = []
+        for package_name in dict.fromkeys(package_names):
+            package_metrics_dict = cls.compute_java_package_metrics_by_name(db=db, package_name=package_name)
+            if package_metrics_dict is None or len(package_metrics_dict) == 0:
+                continue
+            row = [package_name]
+            row.extend([package_metrics_dict[metric_name] for metric_name in cls.get_package_metrics_names()])
+            rows.append(row)
+        columns = ['Package']
+        columns.extend(['PK_' + metric_name for metric_name in cls.get_package_metrics_names()])
+        return pd.DataFrame(data=rows, columns=columns).set_index('Package')
+
     @classmethod
     def compute_java_class_metrics_lexicon(cls, entity=None):
         """
+        The lexicon metrics are computed from the lexemes of the class file, which is lexed once
+        per file content (see `lexicon_features`).
+
         Args:
 
             entity (understand.Ent):
@@ -150,85 +234,8 @@ class TestabilityMetrics:
 
         """
 
-        class_lexicon_metrics_dict = dict()
-        tokens_list = list()
-        identifiers_list = list()
-        keywords_list = list()
-        operators_list = list()
-
-        return_and_print_count = 0
-        return_and_print_kw_list = ['return', 'print', 'printf', 'println', 'write', 'writeln']
-
-        condition_count = 0
-        condition_kw_list = ['if', 'for', 'while', 'switch', '?', 'assert', ]
-
-        uncondition_count = 0
-        uncondition_kw_list = ['break', 'continue', ]
-
-        exception_count = 0
-        exception_kw_list = ['try', 'catch', 'throw', 'throws', 'finally', ]
-
-        new_count = 0
-        new_count_kw_list = ['new']
-
-        super_count = 0
-        super_count_kw_list = ['super']
-
-        dots_count = 0
-        lexeme = entity.lexer(show_inactive=False).first()
-        while lexeme is not None:
-            tokens_list.append(lexeme.text())
-            if lexeme.token() == 'Identifier':
-                identifiers_list.append(lexeme.text())
-            if lexeme.token() == 'Keyword':
-                keywords_list.append(lexeme.text())
-            if lexeme.token() == 'Operator':
-                operators_list.append(lexeme.text())
-            if lexeme.text() in return_and_print_kw_list:
-                return_and_print_count += 1
-            if lexeme.text() in condition_kw_list:
-                condition_count += 1
-            if lexeme.text() in uncondition_kw_list:
-                uncondition_count += 1
-            if lexeme.text() in exception_kw_list:
-                exception_count += 1
-            if lexeme.text() in new_count_kw_list:
-                new_count += 1
-            if lexeme.text() in super_count_kw_list:
-                super_count += 1
-            if lexeme.text() == '.':
-                dots_count += 1
-            lexeme = lexeme.next()
-
-        number_of_assignments = operators_list.count('=')
-        number_of_operators_without_assignments = len(operators_list) - number_of_assignments
-        number_of_unique_operators = len(set(list(filter('='.__ne__, operators_list))))
-
-        class_lexicon_metrics_dict.update({'NumberOfTokens': len(tokens_list)})
-        class_lexicon_metrics_dict.update({'NumberOfUniqueTokens': len(set(tokens_list))})
-
-        class_lexicon_metrics_dict.update({'NumberOfIdentifies': len(identifiers_list)})
-        class_lexicon_metrics_dict.update({'NumberOfUniqueIdentifiers': len(set(identifiers_list))})
-
-        class_lexicon_metrics_dict.update({'NumberOfKeywords': len(keywords_list)})
-        class_lexicon_metrics_dict.update({'NumberOfUniqueKeywords': len(set(keywords_list))})
-
-        class_lexicon_metrics_dict.update(
-            {'NumberOfOperatorsWithoutAssignments': number_of_operators_without_assignments})
-        class_lexicon_metrics_dict.update({'NumberOfAssignments': number_of_assignments})
-        class_lexicon_metrics_dict.update({'NumberOfUniqueOperators': number_of_unique_operators})
-
-        class_lexicon_metrics_dict.update({'NumberOfDots': dots_count})
+        class_lexicon_metrics_dict = compute_class_lexicon_metrics(entity)
         class_lexicon_metrics_dict.update({'NumberOfSemicolons': entity.metric(['CountSemicolon'])['CountSemicolon']})
-
-        class_lexicon_metrics_dict.update({'NumberOfReturnAndPrintStatements': return_and_print_count})
-        class_lexicon_metrics_dict.update({'NumberOfConditionalJumpStatements': condition_count})
-        class_lexicon_metrics_dict.update({'NumberOfUnConditionalJumpStatements': uncondition_count})
-        class_lexicon_metrics_dict.update({'NumberOfExceptionStatements': exception_count})
-        class_lexicon_metrics_dict.update({'NumberOfNewStatements': new_count})
-        class_lexicon_metrics_dict.update({'NumberOfSuperStatements': super_count})
-
-        # print('class lexicon metrics dict', len(class_lexicon_metrics_dict), class_lexicon_metrics_dict)
         return class_lexicon_metrics_dict
 
     @classmethod
@@ -309,7 +316,149 @@ class TestabilityMetrics:
         return class_metrics
 
 
+def get_package_name(class_longname):
+    """
+
+    Returns the package name of a class, the key of the package metrics of the class
+
+    """
+
+    return '.'.join(class_longname.split('.')[:-1])
+
+
+def compute_class_row(class_entity_long_name, db):
+    """
+
+    Computes the class-level (lexicon and ordinary) metrics vector of one class, without the package metrics
+
+    Returns:
+
+        list: The class long name followed by the metrics values or None if the metrics cannot be computed
+
+    """
+
+    class_entity = UnderstandUtility.get_class_entity_by_name(class_name=class_entity_long_name, db=db)
+    if class_entity is None:
+        return None
+    one_class_metrics_value = [class_entity.longname()]
+
+    class_lexicon_metrics_dict = TestabilityMetrics.compute_java_class_metrics_lexicon(entity=class_entity)
+    if class_lexicon_metrics_dict is None or len(class_lexicon_metrics_dict) == 0:
+        return None
+
+    class_ordinary_metrics_dict = TestabilityMetrics.compute_java_class_metrics2(db=db, entity=class_entity)
+    if class_ordinary_metrics_dict is None or len(class_ordinary_metrics_dict) == 0:
+        return None
+
+    one_class_metrics_value.extend([class_lexicon_metrics_dict[metric_name] for
+                                    metric_name in TestabilityMetrics.get_class_lexicon_metrics_names()])
+    one_class_metrics_value.extend([class_ordinary_metrics_dict[metric_name] for
+                                    metric_name in TestabilityMetrics.get_class_ordinary_metrics_names()])
+    return one_class_metrics_value
+
 
+def join_package_metrics(class_rows, package_metrics_table) -> pd.DataFrame:
+    """
+
+    Broadcasts the package metrics to the classes of each package
+
+    Args:
+
+        class_rows (list): The class-level metrics vectors returned by `compute_class_row` (None values are skipped)
+
+        package_metrics_table (pandas.DataFrame): The package metrics returned by
+            `TestabilityMetrics.compute_package_metrics_table`
+
+    Returns:
+
+        pandas.DataFrame: The class names followed by the metrics in the order of
+        `TestabilityMetrics.get_all_primary_metrics_names`. The classes whose package is not found are left out.
+
+    """
+
+    class_columns = ['Class']
+    class_columns.extend(['CSLEX_' + metric_name for metric_name in metrics_names.class_lexicon_metrics_names])
+    class_columns.extend(['CSORD_' + metric_name for metric_name in metrics_names.class_ordinary_metrics_names_primary])
+    df = pd.DataFrame(data=list(filter(None, class_rows)), columns=class_columns)
+    df['Package'] = [get_package_name(class_name) for class_name in df['Class']]
+    df = df.merge(package_metrics_table, how='inner', left_on='Package', right_index=True, sort=False)
+
+    columns = ['Class']
+    columns.extend(TestabilityMetrics.get_all_primary_metrics_names())
+    return df[columns].reset_index(drop=True)
+
+
+def compute_metrics_frame(db, class_names, class_rows=None) -> pd.DataFrame:
+    """
+
+    Computes the metrics of classes, the metrics of each package are computed once
+
+    Args:
+
+        db (understand.Db):
+
+        class_names (list): The class long names
+
+        class_rows (list): The already computed `compute_class_row` vectors of the classes (optional)
+
+    Returns:
+
+        pandas.DataFrame: See `join_package_metrics`
+
+    """
+
+    if class_rows is None:
+        class_rows = [compute_class_row(class_name, db) for class_name in class_names]
+    package_metrics_table = TestabilityMetrics.compute_package_metrics_table(
+        db=db, package_names=[get_package_name(class_name) for class_name in class_names]
+    )
+    return join_package_metrics(class_rows, package_metrics_table)
+
+
+def do(class_entity_long_name, project_db_path, db=None):
+    """
+
+    Computes the metrics vector of one class in the order of `TestabilityMetrics.get_all_primary_metrics_names`
+
+    Args:
+
+        class_entity_long_name (str): The class long name
+
+        project_db_path (str): The absolute path of Understand database
+
+        db (understand.Db): An already opened database to be used instead of `project_db_path`
+
+    Returns:
+
+        list: The class long name followed by the metrics values or None if the metrics cannot be computed
+
+    """
+
+    opened_db = db is None
+    if opened_db:
+        db = und.open(project_db_path)
+    try:
+        class_entity = UnderstandUtility.get_class_entity_by_name(class_name=class_entity_long_name, db=db)
+        if class_entity is None:
+            return None
+
+        package_metrics_dict = TestabilityMetrics.compute_java_package_metrics(db=db, entity=class_entity)
+        if package_metrics_dict is None or len(package_metrics_dict) == 0:
+            return None
+
+        class_metrics_value = compute_class_row(class_entity_long_name, db)
+        if class_metrics_value is None:
+            return None
+
+        one_class_metrics_value = class_metrics_value[:1]
+        one_class_metrics_value.extend([package_metrics_dict[metric_name] for
+                                        metric_name in TestabilityMetrics.get_package_metrics_names()])
+        one_class_metrics_value.extend(class_metrics_value[1:])
+        return one_class_metrics_value
+    finally:
+        if opened_db:
+            UnderstandUtility.clear_index(db)
+            db.close()
 
 
 # ------------------------------------------------------------------------
@@ -330,21 +479,20 @@ class PreProcess:
         # class_entities = cls.read_project_classes(db=db, classes_names_list=class_list, )
         # print(project_db_path)
         db = und.open(project_db_path)
-        class_list = UnderstandUtility.get_project_classes_longnames_java(db=db)
-        db.close()
-        # del db
-
-        if n_jobs == 0:  # Sequential computing
-            res = [do(class_entity_long_name, project_db_path) for class_entity_long_name in class_list]
-        else:  # Parallel computing
-            res = Parallel(n_jobs=n_jobs, )(
-                delayed(do)(class_entity_long_name, project_db_path) for class_entity_long_name in class_list
-            )
-        res = list(filter(None, res))
-
-        columns = ['Class']
-        columns.extend(TestabilityMetrics.get_all_primary_metrics_names())
-        df = pd.DataFrame(data=res, columns=columns)
+        try:
+            class_list = UnderstandUtility.get_project_classes_longnames_java(db=db)
+            if n_jobs == 0:  # Sequential computing
+                res = None
+            else:  # Parallel computing
+                res = Parallel(n_jobs=n_jobs, )(
+                    delayed(compute_class_rows_with_new_database)(class_list[i:i + 16], project_db_path)
+                    for i in range(0, len(class_list), 16)
+                )
+                res = [row for rows in res for row in rows]
+            df = compute_metrics_frame(db, class_list, class_rows=res)
+        finally:
+            UnderstandUtility.clear_index(db)
+            db.close()
         # print('df for class {0} with shape {1}'.format(project_name, df.shape))
         # df.to_csv(csv_path + project_name + '.csv', index=False)
         # print(df)
@@ -359,10 +507,35 @@ class TestabilityModel:
     """
 
     def __init__(self, ):
-        self.scaler = scaler1
-        self.model = model5
-        self.model_branch = model_branch
-        self.model_line = model_line
+        loader = get_loader()
+        self.scaler = loader.load_model(MODEL_TYPES['scaler'])
+        self.model = loader.load_model(MODEL_TYPES['model'])
+        self.model_branch = loader.load_model(MODEL_TYPES['model_branch'])
+        self.model_line = loader.load_model(MODEL_TYPES['model_line'])
+
+    def predict_classes(self, df_predict_data=None, coverage=False):
+        """
+
+        Args:
+
+            df_predict_data (pandas.DataFrame): The class names followed by the metrics of each class
+
+            coverage (bool): Whether to predict the branch and line coverage of each class or not
+
+        Returns:
+
+            pandas.DataFrame: The predicted testability of each class
+
+        """
+
+        df_predict_data = df_predict_data.fillna(0)
+        X_test = self.scaler.transform(df_predict_data.iloc[:, 1:])
+        df_new = pd.DataFrame(df_predict_data.iloc[:, 0], columns=['Class'])
+        df_new['PredictedTestability'] = list(self.model.predict(X_test))
+        if coverage:
+            df_new['BranchCoverage'] = list(self.model_branch.predict(X_test))
+            df_new['LineCoverage'] = list(self.model_line.predict(X_test))
+        return df_new
 
     def inference(self, df_predict_data=None, verbose=False, log_path=None):
         df_predict_data = df_predict_data.fillna(0)
@@ -401,6 +574,218 @@ class TestabilityModel:
         df.to_csv(log_path, index=False)
 
 
+# The database opened by a worker process of TestabilityPredictor: (path, generation, database).
+# Understand allows only one open database per process, hence a worker keeps a single database.
+WORKER_DATABASE = (None, None, None)
+
+# The predictor of the current process, created by `get_testability_predictor`
+TESTABILITY_PREDICTOR = None
+
+
+def get_worker_database(project_db_path, generation):
+    """
+
+    Returns the database handle of the worker process for a project snapshot.
+    The handle is reopened once per generation, i.e., once per prediction call, since the database
+    is reanalyzed between calls. The handle of the previous snapshot (or path) is closed before
+    another database is opened.
+
+    """
+
+    global WORKER_DATABASE
+    opened_path, opened_generation, db = WORKER_DATABASE
+    if db is not None and opened_path == project_db_path and opened_generation == generation:
+        return db
+    WORKER_DATABASE = (None, None, None)
+    if db is not None:
+        UnderstandUtility.clear_index(db)
+        db.close()
+    db = und.open(project_db_path)
+    WORKER_DATABASE = (project_db_path, generation, db)
+    return db
+
+
+def compute_class_rows(class_names, project_db_path, generation):
+    """
+
+    Computes the class-level metrics vectors of a chunk of classes (executed in a worker process)
+
+    """
+
+    db = get_worker_database(project_db_path, generation)
+    return [compute_class_row(class_name, db) for class_name in class_names]
+
+
+def compute_class_rows_with_new_database(class_names, project_db_path):
+    db = und.open(project_db_path)
+    try:
+        return [compute_class_row(class_name, db) for class_name in class_names]
+    finally:
+        UnderstandUtility.clear_index(db)
+        db.close()
+
+
+class TestabilityPredictor:
+    """
+
+    Long-lived testability predictor.
+    The scaler and models are loaded once, the class metrics are computed in a pool of worker processes
+    which keep one database handle per worker, and all classes are predicted with one vectorized call.
+
+    """
+
+    def __init__(self, n_jobs: int = 0, chunk_size: int = 16):
+        """
+
+        Args:
+
+            n_jobs (int): The number of worker processes computing the class metrics (0: sequential)
+
+            chunk_size (int): The number of classes sent to a worker process in each task
+
+        """
+
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.model = TestabilityModel()
+        self._executor = None
+        self._generation = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_jobs)
+        return self._executor
+
+    def compute_metrics(self, project_db_paths: list) -> list:
+        """
+
+        Args:
+
+            project_db_paths (list): The absolute paths of the Understand databases of project snapshots
+
+        Returns:
+
+            list: A DataFrame of class metrics per project snapshot
+
+        """
+
+        self._generation += 1
+
+        if self.n_jobs == 0:
+            frames = []
+            for project_db_path in project_db_paths:
+                db = und.open(project_db_path)
+                try:
+                    class_list = UnderstandUtility.get_project_classes_longnames_java(db=db)
+                    frames.append(compute_metrics_frame(db, class_list))
+                finally:
+                    UnderstandUtility.clear_index(db)
+                    db.close()
+            return frames
+
+        # The chunks of all snapshots are submitted at once to keep the workers busy,
+        # while the package metrics of each snapshot are computed (once per package) in this process
+        futures = []
+        package_metrics_tables = []
+        for project_db_path in project_db_paths:
+            db = und.open(project_db_path)
+            try:
+                class_list = UnderstandUtility.get_project_classes_longnames_java(db=db)
+                futures.append([
+                    self.executor.submit(
+                        compute_class_rows, class_list[i:i + self.chunk_size], project_db_path, self._generation
+                    )
+                    for i in range(0, len(class_list), self.chunk_size)
+                ])
+                package_metrics_tables.append(TestabilityMetrics.compute_package_metrics_table(
+                    db=db, package_names=[get_package_name(class_name) for class_name in class_list]
+                ))
+            finally:
+                UnderstandUtility.clear_index(db)
+                db.close()
+
+        frames = []
+        for snapshot_futures, package_metrics_table in zip(futures, package_metrics_tables):
+            rows = [row for future in snapshot_futures for row in future.result()]
+            frames.append(join_package_metrics(rows, package_metrics_table))
+        return frames
+
+    def predict_frames(self, project_db_paths: list, coverage=False) -> list:
+        """
+
+        Returns:
+
+            list: A DataFrame of class predictions per project snapshot
+
+        """
+
+        frames = self.compute_metrics(project_db_paths)
+        df_all = pd.concat(frames, ignore_index=True)
+        if len(df_all) == 0:
+            return [pd.DataFrame(columns=['Class', 'PredictedTestability']) for _ in frames]
+
+        df_predictions = self.model.predict_classes(df_predict_data=df_all, coverage=coverage)
+        predictions = []
+        start = 0
+        for frame in frames:
+            predictions.append(df_predictions.iloc[start:start + len(frame)].reset_index(drop=True))
+            start += len(frame)
+        return predictions
+
+    def predict(self, project_db_path, verbose=False, log_path=None) -> float:
+        """
+
+        Returns:
+
+            float: The sum of the predicted testability of the project classes
+
+        """
+
+        df = self.predict_frames([project_db_path], coverage=verbose)[0]
+        if verbose:
+            TestabilityModel.export_class_testability_values(df=df, log_path=log_path)
+        return df['PredictedTestability'].sum()
+
+    def predict_snapshots(self, project_db_paths: list) -> list:
+        """
+
+        Scores many project snapshots, e.g., the programs of a population, with one prediction call
+
+        Args:
+
+            project_db_paths (list): The absolute paths of the Understand databases of project snapshots
+
+        Returns:
+
+            list: The sum of the predicted testability of each snapshot
+
+        """
+
+        return [df['PredictedTestability'].sum() for df in self.predict_frames(project_db_paths)]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def get_testability_predictor(n_jobs: int = None) -> TestabilityPredictor:
+    """
+
+    Returns the testability predictor of the current process, created once
+
+    """
+
+    global TESTABILITY_PREDICTOR
+    if TESTABILITY_PREDICTOR is None:
+        if n_jobs is None:
+            n_jobs = get_config_value('METRICS', 'testability_n_jobs', fallback=0, value_type=int)
+        TESTABILITY_PREDICTOR = TestabilityPredictor(n_jobs=n_jobs)
+    return TESTABILITY_PREDICTOR
+
+
+@profiled('testability', category='objective')
 def main(project_db_path, initial_value=1.0, verbose=False, log_path=None):
     """
 
@@ -408,9 +793,5 @@ def main(project_db_path, initial_value=1.0, verbose=False, log_path=None):
 
     """
 
-    df = PreProcess().compute_metrics_by_class_list(
-        project_db_path,
-        n_jobs=0
-    )
-    testability_ = TestabilityModel().inference(df_predict_data=df, verbose=verbose, log_path=log_path)
+    testability_ = get_testability_predictor().predict(project_db_path, verbose=verbose, log_path=log_path)
     return round(testability_ / initial_value, 5)
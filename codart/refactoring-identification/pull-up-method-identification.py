@@ -1,16 +1,14 @@
 import os
-import antlr4
-from antlr4.InputStream import InputStream
-from codart.gen.JavaLexer import JavaLexer
-from codart.gen.JavaParser import JavaParser
-from codart.gen.JavaParserVisitor import JavaParserVisitor
+from codart.gen.JavaParserLabeledVisitor import JavaParserLabeledVisitor
 from codart.refactorings.rename_method2 import main
 from codart.refactorings.pullup_method import main as pull_up_method
-from pull_up_field_identification import find_duplicate_fields_in_directory
+from codart.utility.parallel_parsing import parse_files
+from codart.utility.parse_tree_cache import parse_java_file
+from pull_up_field_identification import find_duplicate_fields_in_directory, get_java_files
 
 
 # Visitor class to extract method names, bodies, and the class and package they belong to
-class MethodBodyVisitor(JavaParserVisitor):
+class MethodBodyVisitor(JavaParserLabeledVisitor):
     def __init__(self):
         self.methods = []
         self.current_class = None  # Track the current class
@@ -45,28 +43,23 @@ class MethodBodyVisitor(JavaParserVisitor):
         return self.visitChildren(ctx)
 
 
-def extract_methods(file_path):
+def extract_file_methods(file_path, token_stream, tree):
     """
-    Given a Java file, this function will use ANTLR to parse the file and extract method names, bodies, and classes.
+    Extract method names, bodies, and classes of a parsed Java file (an extractor of `parse_files`).
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-
-    input_stream = InputStream(content)
-    lexer = JavaLexer(input_stream)
-    token_stream = antlr4.CommonTokenStream(lexer)
-    parser = JavaParser(token_stream)
-
-    # Parse the file starting from the compilation unit
-    tree = parser.compilationUnit()
     visitor = MethodBodyVisitor()
-
-    # Extract methods using the visitor
     visitor.visit(tree)
-
     return visitor.methods  # Return the list of methods (name, body, class, package)
 
 
+def extract_methods(file_path):
+    """
+    Given a Java file, this function will use ANTLR to parse the file and extract method names, bodies, and classes.
+    """
+    token_stream, tree = parse_java_file(file_path)
+    return extract_file_methods(file_path, token_stream, tree)
+
+
 def find_duplicate_methods_in_directory(directory_path):
     """
     Scan all Java files in the given directory and identify duplicate methods with identical bodies.
@@ -74,24 +67,21 @@ def find_duplicate_methods_in_directory(directory_path):
     method_bodies = {}
     duplicate_methods = []
 
-    # Iterate over all Java files in the directory
-    for root, _, files in os.walk(directory_path):
-        for file_name in files:
-            if file_name.endswith(".java"):  # Process only .java files
-                file_path = os.path.join(root, file_name)
-
-                # Extract methods from the Java file
-                methods = extract_methods(file_path)
-
-                # Identify duplicate methods
-                for method_name, method_body, class_name, package_name in methods:
-                    # Normalize the body to remove unnecessary spaces or differences
-                    normalized_body = method_body.strip()
-
-                    if normalized_body in method_bodies:
-                        method_bodies[normalized_body].append((method_name, file_path, class_name, package_name))
-                    else:
-                        method_bodies[normalized_body] = [(method_name, file_path, class_name, package_name)]
+    # Parse the Java files of the directory in parallel and extract their methods
+    file_methods = parse_files(get_java_files(directory_path), extract_file_methods)
+    for file_path, methods in file_methods.items():
+        if methods is None:
+            continue
+
+        # Identify duplicate methods
+        for method_name, method_body, class_name, package_name in methods:
+            # Normalize the body to remove unnecessary spaces or differences
+            normalized_body = method_body.strip()
+
+            if normalized_body in method_bodies:
+                method_bodies[normalized_body].append((method_name, file_path, class_name, package_name))
+            else:
+                method_bodies[normalized_body] = [(method_name, file_path, class_name, package_name)]
 
     # Find methods that have duplicates (more than one entry for the same body)
     for body, method_info in method_bodies.items():
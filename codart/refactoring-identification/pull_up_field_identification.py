@@ -1,14 +1,18 @@
 import os
-from antlr4 import FileStream, CommonTokenStream, ParseTreeWalker
-from antlr4.InputStream import InputStream
-from codart.gen.JavaParserListener import JavaParserListener
-from codart.gen.JavaParserVisitor import JavaParserVisitor
-from codart.gen.JavaLexer import JavaLexer
-from codart.gen.JavaParser import JavaParser
+from antlr4 import ParseTreeWalker
+from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
+from codart.gen.JavaParserLabeledVisitor import JavaParserLabeledVisitor
 from codart.refactorings.pullup_field import main as pull_up_field
+from codart.utility.parallel_parsing import parse_files
+from codart.utility.parse_tree_cache import parse_java_file
 
 
-class PackageExtractor(JavaParserListener):
+def get_java_files(directory_path):
+    return [os.path.join(root, file) for root, _, files in os.walk(directory_path)
+            for file in files if file.endswith(".java")]
+
+
+class PackageExtractor(JavaParserLabeledListener):
     def __init__(self):
         self.package_name = None
 
@@ -19,37 +23,26 @@ class PackageExtractor(JavaParserListener):
         self.package_name = ctx.qualifiedName().getText()
 
 
+def extract_package(file_path, token_stream, tree):
+    """
+    Extract the package name of a parsed Java file (an extractor of `parse_files`).
+    """
+    extractor = PackageExtractor()
+    ParseTreeWalker().walk(extractor, tree)
+    return extractor.package_name or "default"
+
+
 def extract_packages(directory_path):
     """
     Extract package declarations from all Java files in the directory.
     Returns a dictionary mapping file paths to their package names.
+    The files are parsed in parallel, and the files that cannot be parsed are logged and skipped.
     """
-    package_map = {}
-    for root, _, files in os.walk(directory_path):
-        for file in files:
-            if file.endswith(".java"):
-                file_path = os.path.join(root, file)
-                try:
-                    # Parse the Java file
-                    input_stream = FileStream(file_path, encoding="utf-8")
-                    lexer = JavaLexer(input_stream)
-                    token_stream = CommonTokenStream(lexer)
-                    parser = JavaParser(token_stream)
-                    tree = parser.compilationUnit()
-
-                    # Walk the parse tree to extract the package name
-                    extractor = PackageExtractor()
-                    walker = ParseTreeWalker()
-                    walker.walk(extractor, tree)
-
-                    # Store the package name in the map
-                    package_map[file_path] = extractor.package_name or "default"
-                except Exception as e:
-                    print(f"Error processing file {file_path}: {e}")
-    return package_map
-
-
-class FieldVisitor(JavaParserVisitor):
+    packages = parse_files(get_java_files(directory_path), extract_package)
+    return {file_path: package_name for file_path, package_name in packages.items() if package_name is not None}
+
+
+class FieldVisitor(JavaParserLabeledVisitor):
     def __init__(self):
         self.fields = []  # List to store field details
         self.current_class = None  # Track the current class name
@@ -75,26 +68,21 @@ class FieldVisitor(JavaParserVisitor):
         return self.visitChildren(ctx)
 
 
-def extract_fields(file_path):
+def extract_file_fields(file_path, token_stream, tree):
     """
-    Parse a Java file to extract field declarations.
+    Extract the package name and field declarations of a parsed Java file (an extractor of `parse_files`).
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-
-    input_stream = InputStream(content)
-    lexer = JavaLexer(input_stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = JavaParser(token_stream)
-
-    # Parse the file starting from the compilation unit
-    tree = parser.compilationUnit()
     visitor = FieldVisitor()
-
-    # Extract fields using the visitor
     visitor.visit(tree)
+    return extract_package(file_path, token_stream, tree), visitor.fields
 
-    return visitor.fields
+
+def extract_fields(file_path):
+    """
+    Parse a Java file to extract field declarations.
+    """
+    token_stream, tree = parse_java_file(file_path)
+    return extract_file_fields(file_path, token_stream, tree)[1]
 
 
 def find_duplicate_fields_in_directory(directory_path):
@@ -103,25 +91,21 @@ def find_duplicate_fields_in_directory(directory_path):
     """
     field_signatures = {}  # Map to track field signatures and associated classes
     duplicate_fields = []  # List to store duplicated fields
-    packages = extract_packages(directory_path)
-
-    # Traverse the directory and process each Java file
-    for root, _, files in os.walk(directory_path):
-        for file_name in files:
-            if file_name.endswith(".java"):  # Process only Java files
-                file_path = os.path.join(root, file_name)
-
-                # Extract fields from the Java file
-                fields = extract_fields(file_path)
-
-                # Check for duplicate fields
-                for field_type, field_name, class_name in fields:
-                    signature = f"{field_type} {field_name}"  # Create a unique signature for each field
-                    package_name = packages.get(file_path, "default")
-                    if signature in field_signatures:
-                        field_signatures[signature].append((class_name, package_name))  # Add the class to the signature
-                    else:
-                        field_signatures[signature] = [(class_name, package_name)]
+
+    # Parse the Java files of the directory in parallel and extract their packages and fields
+    file_fields = parse_files(get_java_files(directory_path), extract_file_fields)
+    for file_path, extracted in file_fields.items():
+        if extracted is None:
+            continue
+        package_name, fields = extracted
+
+        # Check for duplicate fields
+        for field_type, field_name, class_name in fields:
+            signature = f"{field_type} {field_name}"  # Create a unique signature for each field
+            if signature in field_signatures:
+                field_signatures[signature].append((class_name, package_name))  # Add the class to the signature
+            else:
+                field_signatures[signature] = [(class_name, package_name)]
 
     # Identify duplicated fields that exist in more than one class
     for signature, class_info in field_signatures.items():
@@ -34,7 +34,8 @@ from antlr4.TokenStreamRewriter import TokenStreamRewriter
 from codart.gen.JavaParserLabeled import JavaParserLabeled
 from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
 from codart.symbol_table import parse_and_walk
-from codart.config import logger, UDB_PATH
+from codart import config
+from codart.config import logger
 
 
 class DecreaseFieldVisibilityListener(JavaParserLabeledListener):
@@ -189,7 +190,7 @@ def test1():
 
 def test2():
     main(
-        udb_path=UDB_PATH,
+        udb_path=config.UDB_PATH,
         source_package='technology.tabula',
         source_class='TableWithRulingLines',
         source_field='si'
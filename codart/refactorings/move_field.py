@@ -3,6 +3,9 @@
 
 The module implements Move Field refactoring operation
 
+The rewritten files are written at once by a `RewriteTransaction`, hence the project is not changed
+if the refactoring fails.
+
 ## Pre and post-conditions
 
 ### Pre-conditions:
@@ -15,7 +18,7 @@ Todo: Add post-conditions
 
 """
 
-__version__ = '0.1.0'
+__version__ = '0.1.1'
 __author__ = 'Morteza Zakeri'
 
 # import logging
@@ -32,6 +35,7 @@ except ImportError as e:
     print(e)
 
 from codart.learner.sbr_initializer.utils.utility import logger, config
+from codart.utility.rewrite_transaction import RewriteTransaction, RewriteValidationError
 
 # from codart.config import logger
 
@@ -227,39 +231,50 @@ def main(source_class: str, source_package: str, target_class: str, target_packa
         # db.close()
         return False
 
-    # Propagate Changes
-    for file in usages.keys():
-        parse_and_walk(
-            file_path=file,
-            listener_class=PropagateListener,
+    # The rewritten files are written at once, or none of them if a rewritten file does not parse
+    with RewriteTransaction() as transaction:
+        # Propagate Changes
+        for file in usages.keys():
+            parse_and_walk(
+                file_path=file,
+                listener_class=PropagateListener,
+                has_write=True,
+                transaction=transaction,
+                field_name=field_name,
+                new_name=f"{instance_name}.{field_name}",
+                lines=usages[file],
+            )
+
+        # Do the cut and paste!
+        # Cut
+        listener = parse_and_walk(
+            file_path=src_class_file,
+            listener_class=CutFieldListener,
             has_write=True,
+            transaction=transaction,
+            class_name=target_class,
+            instance_name=instance_name,
             field_name=field_name,
-            new_name=f"{instance_name}.{field_name}",
-            lines=usages[file],
+            is_static=is_static,
+            import_statement=import_statement
         )
 
-    # Do the cut and paste!
-    # Cut
-    listener = parse_and_walk(
-        file_path=src_class_file,
-        listener_class=CutFieldListener,
-        has_write=True,
-        class_name=target_class,
-        instance_name=instance_name,
-        field_name=field_name,
-        is_static=is_static,
-        import_statement=import_statement
-    )
+        field_text = listener.field_text
 
-    field_text = listener.field_text
+        # Paste
+        parse_and_walk(
+            file_path=target_class_file,
+            listener_class=PasteFieldListener,
+            has_write=True,
+            transaction=transaction,
+            field_text=field_text,
+        )
 
-    # Paste
-    parse_and_walk(
-        file_path=target_class_file,
-        listener_class=PasteFieldListener,
-        has_write=True,
-        field_text=field_text,
-    )
+        try:
+            transaction.commit()
+        except (RewriteValidationError, OSError) as e:
+            logger.error(f"The rewritten files are discarded: {e}")
+            return False
 
     # db.close()
     return True
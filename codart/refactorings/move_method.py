@@ -28,7 +28,9 @@ from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
 from codart.refactorings.move_field import CheckCycleListener
 from codart.symbol_table import parse_and_walk
 from codart.learner.sbr_initializer.utils.utility import logger, config
-from codart.utility.directory_utils import git_restore
+from codart.utility.directory_utils import git_restore, cleanup_understand_processes
+from codart.utility.rewrite_transaction import RewriteTransaction, RewriteValidationError
+from codart.utility.reference_index import get_reference_index
 
 STATIC = "Static Method"
 DEFAULT_TIMEOUT = 60  # 60 seconds timeout for refactoring operations
@@ -295,15 +297,14 @@ class EnhancedMethodLookup:
         matches = []
 
         try:
-            # Search all methods in the database
-            all_methods = self.db.ents("Method")
-
-            for method in all_methods:
-                # Check if method name matches (case insensitive)
-                if method.simplename().lower() == method_name.lower():
-                    # Check if it's in the right class
-                    parent = method.parent()
-                    if parent and parent.simplename() == class_name:
+            # Search the methods of the reference index (case insensitive) instead of all methods in the database
+            reference_index = get_reference_index(self.db)
+            for member in reference_index.find_members(f"{class_name}.{method_name}", ignore_case=True):
+                # Check if it's in the right class
+                if member.class_name != class_name:
+                    continue
+                for method in self.db.lookup(member.longname, "Method"):
+                    if method.longname() == member.longname and method not in matches:
                         matches.append(method)
                         logger.debug(f"[FUZZY_SEARCH] Found fuzzy match: {method.longname()}")
 
@@ -571,10 +572,10 @@ def execute_git_restore_with_utility(project_dir):
 
 
 def kill_understand_processes():
-    """Kill any running understand processes to release file locks"""
+    """Kill the understand processes started by this process to release file locks"""
     try:
-        subprocess.run(["pkill", "-f", "und"], capture_output=True, timeout=10)
-        logger.debug("The und process was killed successfully using pkill")
+        cleanup_understand_processes()
+        logger.debug("The und processes of this process were killed successfully")
     except Exception as e:
         logger.warning(f"Failed to kill understand processes: {str(e)}")
 
@@ -703,6 +704,9 @@ def main(source_class, source_package, target_class, target_package, method_name
     result = False
     db = None
     overall_start_time = time.time()
+    # The rewritten files are staged in memory and written at once (step 11), hence the project is unchanged
+    # after a failure and the transaction is only abandoned (no restore)
+    transaction = RewriteTransaction()
 
     try:
         logger.info(f"[MOVE_METHOD] Starting move method refactoring with comprehensive monitoring")
@@ -730,18 +734,18 @@ def main(source_class, source_package, target_class, target_package, method_name
 
                 if not method_ent:
                     logger.error(f"[MOVE_METHOD] Method not found: {source_package}.{source_class}.{method_name}")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 # 4. Validate the found method
                 if method_ent.simplename() != method_name:
                     logger.error(f"[MOVE_METHOD] Method name mismatch. Found: {method_ent.simplename()}, Expected: {method_name}")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 if method_name == source_class:
                     logger.error("[MOVE_METHOD] Cannot move constructor method")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 # 5. Get class files with validation
@@ -753,7 +757,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                         src_class_files = db.lookup(f"{source_class}.java", "File")
                         if not src_class_files:
                             logger.error(f"[MOVE_METHOD] Source class file not found")
-                            cleanup_and_restore(None, project_dir)
+                            transaction.rollback()
                             return False
                     src_class_file = src_class_files[0].longname()
 
@@ -762,26 +766,26 @@ def main(source_class, source_package, target_class, target_package, method_name
                         target_class_files = db.lookup(f"{target_class}.java", "File")
                         if not target_class_files:
                             logger.error(f"[MOVE_METHOD] Target class file not found")
-                            cleanup_and_restore(None, project_dir)
+                            transaction.rollback()
                             return False
                     target_class_file = target_class_files[0].longname()
 
                     # Validate file paths exist
                     if not os.path.exists(src_class_file):
                         logger.error(f"[MOVE_METHOD] Source file does not exist: {src_class_file}")
-                        cleanup_and_restore(None, project_dir)
+                        transaction.rollback()
                         return False
 
                     if not os.path.exists(target_class_file):
                         logger.error(f"[MOVE_METHOD] Target file does not exist: {target_class_file}")
-                        cleanup_and_restore(None, project_dir)
+                        transaction.rollback()
                         return False
 
                     log_memory_usage("After file lookup")
 
                 except (IndexError, AttributeError) as e:
                     logger.error(f"[MOVE_METHOD] Error accessing class files: {str(e)}")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 # 6. Get source class mapping with memory monitoring
@@ -797,30 +801,20 @@ def main(source_class, source_package, target_class, target_package, method_name
                 logger.debug(f"[MOVE_METHOD] Method {method_name} is static: {is_static}")
 
                 # 8. Find method usages with timeout and memory monitoring
+                # The callers are looked up in the reference index of the project snapshot (built once per snapshot)
+                reference_index = get_reference_index(db)
                 usages = {}
                 try:
                     log_memory_usage("Before usage analysis")
                     with timeout_context(15):  # 15 second timeout for usage analysis
-                        usage_count = 0
-                        for ref in method_ent.refs("Callby"):
-                            file = ref.file().longname()
-                            if file in usages:
-                                usages[file].append(ref.line())
-                            else:
-                                usages[file] = [ref.line()]
-                            usage_count += 1
-
-                            # Check memory every 100 usages
-                            if usage_count % 100 == 0:
-                                high_memory = log_memory_usage(f"Usage analysis - {usage_count} usages")
-                                if high_memory:
-                                    logger.warning("[MOVE_METHOD] High memory usage during usage analysis")
-                                    force_cleanup()
+                        usages = reference_index.referencing_files(
+                            method_ent.longname(), parameters=method_ent.parameters() or ''
+                        )
 
                     log_memory_usage("After usage analysis")
                 except TimeoutError:
                     logger.error("[MOVE_METHOD] Usage analysis timed out")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 logger.debug(f"[MOVE_METHOD] Found {len(usages)} files with method calls")
@@ -854,6 +848,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                             file_path=file,
                             listener_class=PropagateListener,
                             has_write=True,
+                            transaction=transaction,
                             method_name=method_name,
                             new_name=f"{instance_name}.{method_name}",
                             lines=usages[file],
@@ -871,7 +866,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                     except (TimeoutError, Exception) as e:
                         logger.error(f"[MOVE_METHOD] Error updating usage in {file}: {str(e)}")
                         logger.error(f"[MOVE_METHOD] Traceback: {traceback.format_exc()}")
-                        cleanup_and_restore(None, project_dir)
+                        transaction.rollback()
                         return False
 
                 # Cut the method from source class with timeout and memory monitoring
@@ -883,6 +878,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                         file_path=src_class_file,
                         listener_class=CutMethodListener,
                         has_write=True,
+                        transaction=transaction,
                         class_name=target_class,
                         instance_name=instance_name,
                         method_name=method_name,
@@ -894,7 +890,7 @@ def main(source_class, source_package, target_class, target_package, method_name
 
                     if not method_text.strip():
                         logger.error("[MOVE_METHOD] Failed to extract method text")
-                        cleanup_and_restore(None, project_dir)
+                        transaction.rollback()
                         return False
 
                     # Explicitly delete listener to free memory
@@ -906,7 +902,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                 except (TimeoutError, Exception) as e:
                     logger.error(f"[MOVE_METHOD] Error cutting method from source class: {str(e)}")
                     logger.error(f"[MOVE_METHOD] Traceback: {traceback.format_exc()}")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 # Paste the method to target class with timeout and memory monitoring
@@ -918,6 +914,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                         file_path=target_class_file,
                         listener_class=PasteMethodListener,
                         has_write=True,
+                        transaction=transaction,
                         method_text=method_text,
                         source_class=source_class,
                         method_map=method_map,
@@ -934,7 +931,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                 except (TimeoutError, Exception) as e:
                     logger.error(f"[MOVE_METHOD] Error pasting method to target class: {str(e)}")
                     logger.error(f"[MOVE_METHOD] Traceback: {traceback.format_exc()}")
-                    cleanup_and_restore(None, project_dir)
+                    transaction.rollback()
                     return False
 
                 # Post-paste: Reference injection and constructor handling
@@ -946,6 +943,7 @@ def main(source_class, source_package, target_class, target_package, method_name
                         file_path=target_class_file,
                         listener_class=ReferenceInjectorAndConstructorListener,
                         has_write=True,
+                        transaction=transaction,
                         method_text=method_text,
                         source_class=source_class,
                         method_map=method_map,
@@ -963,6 +961,13 @@ def main(source_class, source_package, target_class, target_package, method_name
                     logger.warning(f"[MOVE_METHOD] Error in reference injection: {str(e)} - refactoring may still be successful")
                     # Don't fail here as the basic move might have worked
 
+                # 11. Validate the rewritten files and write all of them, or none of them
+                try:
+                    transaction.commit()
+                except (RewriteValidationError, OSError) as e:
+                    logger.error(f"[MOVE_METHOD] The rewritten files are discarded: {str(e)}")
+                    return False
+
                 elapsed = time.time() - overall_start_time
                 result = True
                 logger.info(f"[MOVE_METHOD] ✓ Move method refactoring completed successfully in {elapsed:.2f} seconds")
@@ -970,19 +975,19 @@ def main(source_class, source_package, target_class, target_package, method_name
 
         except TimeoutError as e:
             logger.error(f"[MOVE_METHOD] Move method refactoring timed out: {str(e)}")
-            cleanup_and_restore(db, project_dir)
+            transaction.rollback()
             result = False
 
         except Exception as e:
             logger.error(f"[MOVE_METHOD] Move method refactoring failed with exception: {str(e)}")
             logger.error(f"[MOVE_METHOD] Traceback: {traceback.format_exc()}")
-            cleanup_and_restore(db, project_dir)
+            transaction.rollback()
             result = False
 
     except Exception as e:
         logger.error(f"[MOVE_METHOD] Outer exception in move method: {str(e)}")
         logger.error(f"[MOVE_METHOD] Traceback: {traceback.format_exc()}")
-        cleanup_and_restore(db, project_dir)
+        transaction.rollback()
         result = False
 
     finally:
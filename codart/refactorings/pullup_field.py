@@ -23,14 +23,15 @@ Pull up field refactoring removes the repetitive field from subclasses and moves
 
 """
 
-__version__ = '0.2.0'
+__version__ = '0.2.1'
 __author__ = 'Morteza Zakeri'
 
 # import shutil
 import os
 # from codart.utility.directory_utils import git_restore
 from codart import symbol_table
-from codart.config import logger, PROJECT_PATH
+from codart import config
+from codart.config import logger
 from antlr4 import FileStream, CommonTokenStream, ParseTreeWalker
 from antlr4.InputStream import InputStream
 from codart.gen.JavaParserListener import JavaParserListener
@@ -248,22 +249,19 @@ class PullUpFieldRefactoring:
         datatype = _class.fields[self.field_name].datatype
 
         fields_to_remove = []
-        for pn in program.packages:
-            p: symbol_table.Package = program.packages[pn]
-            for cn in p.classes:
-                c: symbol_table.Class = p.classes[cn]
-                if (
-                        (
-                        (
-                                c.superclass_name == superclass_name
-                                and c.file_info.has_imported_class(self.package_name, superclass_name)
-                        )
-                        or (self.package_name is not None and c.superclass_name == superclass_name)
-                        )
-                        and
-                        self.field_name in c.fields and c.fields[self.field_name].datatype == datatype
-                ):
-                    fields_to_remove.append(c.fields[self.field_name])
+        for c in program.subclasses_of(superclass_name):
+            if (
+                    (
+                    (
+                            c.superclass_name == superclass_name
+                            and c.file_info.has_imported_class(self.package_name, superclass_name)
+                    )
+                    or (self.package_name is not None and c.superclass_name == superclass_name)
+                    )
+                    and
+                    self.field_name in c.fields and c.fields[self.field_name].datatype == datatype
+            ):
+                fields_to_remove.append(c.fields[self.field_name])
 
         if len(fields_to_remove) == 0:
             logger.error("No fields to remove.")
@@ -407,7 +405,7 @@ def test2():
 
 def test3():
     main(
-        project_dir=PROJECT_PATH,
+        project_dir=config.PROJECT_PATH,
         package_name="technology.tabula",
         children_class="Table",
         field_name="cells"
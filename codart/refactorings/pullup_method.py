@@ -4,6 +4,12 @@
 
 The module implements pull-up method refactoring operation.
 
+The children methods, the parent class, and the callers of the methods are looked up in the reference index
+of the project snapshot (`reference_index`) instead of all methods of the Understand database.
+
+The rewritten files are staged in a `RewriteTransaction` and written at once, or none of them if a file
+cannot be parsed or a rewritten file does not parse.
+
 
 ### Pre-conditions:
 
@@ -15,7 +21,7 @@ Todo: Add post-conditions
 
 """
 
-__version__ = '0.2.0'
+__version__ = '0.2.4'
 __author__ = 'Morteza Zakeri'
 
 import os.path
@@ -34,6 +40,8 @@ from codart.gen.JavaLexer import JavaLexer
 from codart.gen.JavaParserLabeled import JavaParserLabeled
 from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
 from codart.learner.sbr_initializer.utils.utility import logger, config
+from codart.utility.reference_index import get_reference_index
+from codart.utility.rewrite_transaction import RewriteTransaction, RewriteValidationError
 
 class CheckOverrideListener(JavaParserLabeledListener):
     pass
@@ -210,14 +218,7 @@ def get_removed_methods(program: Program, packagename: str, superclassname: str,
     returntypeofmethod = met.returntype
     nameofmethod = met.name
     # print(program)
-    for package_name in program.packages:
-        package = program.packages[package_name]
-        # print(package)
-        for class_name in package.classes:
-            _class = package.classes[class_name]
-
-            if _class.superclass_name == superclassname:
-                extendedclass.append(_class)
+    extendedclass.extend(program.subclasses_of(superclassname))
 
     i = 0
     for d in extendedclass:
@@ -279,19 +280,22 @@ def main(udb_path: str, children_classes: list, method_name: str, *args, **kwarg
                     db.close()
                     return False
 
-    for mth in db.ents("Java Method"):
-        for child in children_classes:
-            if mth.longname().endswith(child + "." + method_name):
-                fileslist_to_be_rafeactored.add(mth.parent().parent().longname())
-                for fth in mth.parent().refs("Extend"):
-                    destination_class = fth.ent().longname()
-                    fileslist_to_be_rafeactored.add(fth.ent().parent().longname())
-                for ref in mth.refs("Java Callby"):
-                    propagation_classes.add(ref.ent().parent().longname())
-                    fileslist_to_be_propagate.add(ref.ent().parent().parent().longname())
-
+    # The methods, their classes, and their callers are looked up in the reference index of the project
+    reference_index = get_reference_index(db)
     db.close()
 
+    for child in children_classes:
+        for mth in reference_index.find_members(child + "." + method_name):
+            child_class = reference_index.classes.get(mth.class_longname)
+            fileslist_to_be_rafeactored.add(child_class.file if child_class is not None else mth.file)
+            for superclass in (child_class.superclasses if child_class is not None else []):
+                destination_class = superclass
+                if superclass in reference_index.classes:
+                    fileslist_to_be_rafeactored.add(reference_index.classes[superclass].file)
+            for ref in mth.references:
+                propagation_classes.add(ref.scope_class)
+                fileslist_to_be_propagate.add(ref.file)
+
     # print("=========================================")
     # print("fileslist_to_be_propagate :", fileslist_to_be_propagate)
     # print("propagation_classes : ", propagation_classes)
@@ -302,49 +306,48 @@ def main(udb_path: str, children_classes: list, method_name: str, *args, **kwarg
     fileslist_to_be_propagate = list(fileslist_to_be_propagate)
     propagation_class = list(propagation_classes)
 
-    # refactored start
-    for file in fileslist_to_be_rafeactored:
+    # The rewritten files are written at once, or none of them if a file cannot be parsed
+    with RewriteTransaction() as transaction:
+        # refactored start
+        for file in fileslist_to_be_rafeactored:
+            try:
+                token_stream, parse_tree = transaction.parse(file)
+            except Exception as e:
+                logger.error(f"Cannot parse {file}, the rewritten files are discarded: {e}")
+                return False
+            my_listener_refactor = PullUpMethodRefactoringListener(common_token_stream=token_stream,
+                                                                   destination_class=destination_class,
+                                                                   children_class=children_classes,
+                                                                   moved_methods=method_name,
+                                                                   method_text=method_text)
+            walker = ParseTreeWalker()
+            walker.walk(t=parse_tree, listener=my_listener_refactor)
+            transaction.stage(file, my_listener_refactor.token_stream_rewriter.getDefaultText())
+        # end refactoring
+
+        # beginning of propagate
+        for file in fileslist_to_be_propagate:
+            if not os.path.exists(file):
+                continue
+            try:
+                token_stream, parse_tree = transaction.parse(file)
+            except Exception as e:
+                logger.error(f"Cannot parse {file}, the rewritten files are discarded: {e}")
+                return False
+            my_listener_propagate = PropagationPullUpMethodRefactoringListener(token_stream_rewriter=token_stream,
+                                                                               old_class_name=children_classes,
+                                                                               new_class_name=destination_class,
+                                                                               propagated_class_name=propagation_class)
+            walker = ParseTreeWalker()
+            walker.walk(t=parse_tree, listener=my_listener_propagate)
+            transaction.stage(file, my_listener_propagate.token_stream_rewriter.getDefaultText())
+        # end of propagate
+
         try:
-            stream = FileStream(file, encoding='utf-8', errors='ignore')
-        except:
-            continue
-        lexer = JavaLexer(stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = JavaParserLabeled(token_stream)
-        parser.getTokenStream()
-        parse_tree = parser.compilationUnit()
-        my_listener_refactor = PullUpMethodRefactoringListener(common_token_stream=token_stream,
-                                                               destination_class=destination_class,
-                                                               children_class=children_classes,
-                                                               moved_methods=method_name,
-                                                               method_text=method_text)
-        walker = ParseTreeWalker()
-        walker.walk(t=parse_tree, listener=my_listener_refactor)
-
-        with open(file, mode='w', encoding='utf-8', newline='') as f:
-            f.write(my_listener_refactor.token_stream_rewriter.getDefaultText())
-    # end refactoring
-
-    # beginning of propagate
-    for file in fileslist_to_be_propagate:
-        if not os.path.exists(file):
-            continue
-        stream = FileStream(file, encoding='utf-8', errors='ignore')
-        lexer = JavaLexer(stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = JavaParserLabeled(token_stream)
-        parser.getTokenStream()
-        parse_tree = parser.compilationUnit()
-        my_listener_propagate = PropagationPullUpMethodRefactoringListener(token_stream_rewriter=token_stream,
-                                                                           old_class_name=children_classes,
-                                                                           new_class_name=destination_class,
-                                                                           propagated_class_name=propagation_class)
-        walker = ParseTreeWalker()
-        walker.walk(t=parse_tree, listener=my_listener_propagate)
-
-        with open(file, mode='w', encoding='utf8', errors='ignore', newline='') as f:
-            f.write(my_listener_propagate.token_stream_rewriter.getDefaultText())
-    # end of propagate
+            transaction.commit()
+        except (RewriteValidationError, OSError) as e:
+            logger.error(f"The rewritten files are discarded: {e}")
+            return False
 
     return True
 
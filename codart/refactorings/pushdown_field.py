@@ -20,7 +20,7 @@ because of this, we push down the field from the superclass into its related sub
 2. There will be children and parents having their desired fields added or removed.
 """
 
-__version__ = '0.1.1'
+__version__ = '0.1.2'
 __author__ = 'Morteza Zakeri'
 
 from codart import symbol_table
@@ -99,23 +99,20 @@ class PushDownField:
 
         other_derived_classes = []
         classes_to_add_to = []
-        for pn in program.packages:
-            p: symbol_table.Package = program.packages[pn]
-            for cn in p.classes:
-                c: symbol_table.Class = p.classes[cn]
-                if ((c.superclass_name == self.superclass_name and
-                     c.file_info.has_imported_class(self.package_name, self.superclass_name)) or
-                        (
-                                self.package_name is not None and c.superclass_name == self.package_name + '.' + self.superclass_name)):
-                    # all_derived_classes.append(c)
-                    if len(self.class_names) == 0 or cn in self.class_names:
-                        if self.field_name in c.fields:
-                            print("some classes have same variable")
-                            return False
-                        else:
-                            classes_to_add_to.append(c)
+        for c in program.subclasses_of(self.superclass_name, f'{self.package_name}.{self.superclass_name}'):
+            if ((c.superclass_name == self.superclass_name and
+                 c.file_info.has_imported_class(self.package_name, self.superclass_name)) or
+                    (
+                            self.package_name is not None and c.superclass_name == self.package_name + '.' + self.superclass_name)):
+                # all_derived_classes.append(c)
+                if len(self.class_names) == 0 or c.name in self.class_names:
+                    if self.field_name in c.fields:
+                        print("some classes have same variable")
+                        return False
                     else:
-                        other_derived_classes.append(c)
+                        classes_to_add_to.append(c)
+                else:
+                    other_derived_classes.append(c)
 
         # Check if the field is used from the superclass or other derived classes
         for pn in program.packages:
@@ -4,6 +4,9 @@
 
 The module implements push-down method refactoring
 
+The method, the children classes, and the callers of the method are looked up in the reference index
+of the project snapshot (`reference_index`) instead of all methods of the Understand database.
+
 
 ### Pre-conditions:
 
@@ -15,7 +18,7 @@ Todo: Add post-conditions
 
 """
 
-__version__ = '0.1.1'
+__version__ = '0.1.2'
 __author__ = "Morteza Zakeri"
 
 try:
@@ -30,6 +33,7 @@ from codart.gen.JavaParserLabeled import JavaParserLabeled
 from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
 
 from codart.config import logger
+from codart.utility.reference_index import get_reference_index
 
 
 class PushDownMethodRefactoringListener(JavaParserLabeledListener):
@@ -248,22 +252,28 @@ def main(udb_path, source_package, source_class, method_name, target_classes: li
 
     # Initialize with understand
     db = und.open(udb_path)
-    methods = db.ents("Java Method")
-    for mth in methods:
-        if mth.longname() == source_package + "." + source_class + "." + source_method:
-            source_method_entity = mth
-            for child_ref in mth.parent().refs("Extendby"):
-                child_ref = child_ref.ent()
-                if child_ref.simplename() in target_classes:
-                    children_classes.append(child_ref.simplename())
-                    children_files.append(child_ref.parent().longname())
-            # print("mainfile : ", mth.parent().parent().longname())
-            is_static = mth.kind().check("static")
-            main_file = mth.parent().parent().longname()
-            for ref in mth.refs("Callby"):
-                propagation_files.append(ref.ent().parent().parent().longname())
-                propagation_classes.append(ref.ent().parent().simplename())
-                propagation_lines.append(ref.line())
+    # The method, its class, and its callers are looked up in the reference index of the project
+    reference_index = get_reference_index(db)
+    source_method_longname = source_package + "." + source_class + "." + source_method
+    for mth in reference_index.methods(source_method_longname):
+        source_method_entity = mth
+        source_class_entity = reference_index.classes.get(mth.class_longname)
+        for child_longname in (source_class_entity.subclasses if source_class_entity is not None else []):
+            child_ref = reference_index.classes.get(child_longname)
+            if child_ref is not None and child_ref.name in target_classes:
+                children_classes.append(child_ref.name)
+                children_files.append(child_ref.file)
+        is_static = "Static" in mth.kind
+        main_file = mth.file
+        for ref in mth.references:
+            propagation_files.append(ref.file)
+            propagation_classes.append(ref.scope_class_name)
+            propagation_lines.append(ref.line)
+
+    if source_method_entity is None:
+        logger.error(f"Method {source_method_longname} not found.")
+        db.close()
+        return False
 
     # Check pre-condition
     if not len(target_classes) == 1:
@@ -281,16 +291,23 @@ def main(udb_path, source_package, source_class, method_name, target_classes: li
         db.close()
         return False
 
-    for mth in methods:
-        if mth.simplename() == source_method:
-            if mth.parent().simplename() in target_classes:
-                if mth.type() == source_method_entity.type():
-                    if mth.kind() == source_method_entity.kind():
-                        if mth.parameters() == source_method_entity.parameters():
-                            logger.error("Duplicated method")
-                            db.close()
-                            return False
-
+    for mth in reference_index.find_members(children_classes[0] + "." + source_method):
+        if mth.type == source_method_entity.type:
+            if mth.kind == source_method_entity.kind:
+                if mth.parameters == source_method_entity.parameters:
+                    logger.error("Duplicated method")
+                    db.close()
+                    return False
+
+    # The Understand entity of the method, to check its dependencies and get its text
+    source_method_entities = [mth for mth in db.lookup(source_method_longname, "Java Method")
+                              if mth.longname() == source_method_longname and
+                              (mth.parameters() or '') == source_method_entity.parameters]
+    if not source_method_entities:
+        logger.error(f"Method {source_method_longname} not found.")
+        db.close()
+        return False
+    source_method_entity = source_method_entities[-1]
     for ref in source_method_entity.refs("use, call"):
         ref_ent = ref.ent()
         is_public = ref_ent.kind().check("public")
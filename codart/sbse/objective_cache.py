@@ -0,0 +1,291 @@
+"""
+
+## Module description
+
+This module implements a persistent, fingerprint-keyed cache of objective values
+for the individuals evaluated during search-based refactoring.
+
+NSGA-II/III frequently put the same refactoring sequence back into the population after
+crossover and mutation. Evaluating such an individual again requires a git restore,
+executing every refactoring operation, and a full Understand re-analysis.
+The cache maps a canonical fingerprint of the individual (the ordered list of
+refactoring names with their sorted parameters) plus the commit of the project under
+refactoring to the objective vector, such that a cache hit skips the evaluation completely.
+The namespace of the cache includes a fingerprint of the evaluation settings (e.g., the normalization
+metrics and the versions of the prediction models), such that the objective values computed with other
+settings are never returned.
+
+The cache is stored in a sqlite database next to the execution log directories of the
+project, therefore resumed executions reuse the objective values computed before.
+The cache must not be used for a project without a commit (see `get_project_commit`),
+since the objective values of different versions of its sources could not be told apart.
+
+## Changelog
+
+### version 0.1.2
+    1. Add the fingerprint of the evaluation settings to the cache namespace
+    2. The cache is disabled for projects which are not git repositories
+
+### version 0.1.1
+    1. Add the canonical string form of refactoring operations, used to hash and compare genes
+
+### version 0.1.0
+    1. Add ObjectiveCache
+
+"""
+
+__version__ = '0.1.2'
+__author__ = 'Morteza Zakeri'
+
+import os
+import json
+import hashlib
+import sqlite3
+import subprocess
+
+from codart.config import logger
+
+
+def refactoring_operation_key(refactoring_operation) -> list:
+    """
+
+    Returns the canonical (JSON serializable) form of a refactoring operation,
+    i.e., its name and its parameters sorted by name.
+
+    Args:
+
+        refactoring_operation (RefactoringOperation): A refactoring operation (gene)
+
+    """
+
+    params = refactoring_operation.params if refactoring_operation.params is not None else {}
+    return [refactoring_operation.name, [[k, params[k]] for k in sorted(params)]]
+
+
+def refactoring_operation_canonical_form(refactoring_operation) -> str:
+    """
+
+    Returns the canonical form of a refactoring operation as a compact JSON string.
+    Two refactoring operations are equal if and only if their canonical forms are equal.
+
+    Args:
+
+        refactoring_operation (RefactoringOperation): A refactoring operation (gene)
+
+    """
+
+    return json.dumps(
+        refactoring_operation_key(refactoring_operation),
+        sort_keys=True,
+        default=str,
+        separators=(',', ':')
+    )
+
+
+def individual_fingerprint(individual, salt: str = '') -> str:
+    """
+
+    Computes a canonical hash for a sequence of refactoring operations.
+
+    Args:
+
+        individual (Individual): A list of RefactoringOperation
+
+        salt (str): Extra data to be hashed with the sequence, e.g., the project commit
+
+    Returns:
+
+        str: The hex digest of the SHA-256 hash
+
+    """
+
+    canonical = json.dumps(
+        [salt, [refactoring_operation_key(ro) for ro in individual]],
+        sort_keys=True,
+        default=str,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def settings_fingerprint(settings: dict) -> str:
+    """
+
+    Computes a canonical hash for the settings which the objective values depend on.
+
+    Args:
+
+        settings (dict): The settings, e.g., the normalization metrics and the versions of the models
+
+    Returns:
+
+        str: The first 16 hex digits of the SHA-256 hash
+
+    """
+
+    canonical = json.dumps(settings, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def get_project_commit(project_dir: str = None) -> str:
+    """
+
+    Finds the HEAD commit of the git repository of the project.
+    Similar to `git_restore`, the repository is searched in the project directory and its direct subdirectories.
+
+    Args:
+
+        project_dir (str): The absolute path of project's directory.
+
+    Returns:
+
+        str: The commit hash or 'unknown' if the project is not a git repository
+
+    """
+
+    if project_dir is None or not os.path.isdir(project_dir):
+        return 'unknown'
+
+    candidates = [project_dir]
+    candidates.extend(
+        os.path.join(project_dir, item) for item in sorted(os.listdir(project_dir))
+        if not item.startswith('.') and os.path.exists(os.path.join(project_dir, item, '.git'))
+    )
+    for candidate in candidates:
+        result = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=candidate,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    return 'unknown'
+
+
+class ObjectiveCache:
+    """
+
+    A sqlite-backed cache mapping individual fingerprints to their objective values.
+
+    Each problem uses its own namespace (e.g., the problem class and number of objectives) since the
+    objective vectors of different problems are not comparable. The fingerprint of the evaluation settings is
+    appended to the namespace for the same reason.
+
+    """
+
+    def __init__(self, cache_path: str = None, project_dir: str = None, namespace: str = '', settings: dict = None):
+        """
+
+        Args:
+
+            cache_path (str): The absolute path of the sqlite database file
+
+            project_dir (str): The absolute path of project's directory (used to find the project commit)
+
+            namespace (str): The namespace of the cached objective values
+
+            settings (dict): The settings which the objective values depend on (see `settings_fingerprint`)
+
+        """
+
+        self.cache_path = cache_path
+        self.settings = settings
+        self.namespace = f'{namespace}#{settings_fingerprint(settings)}' if settings else namespace
+        self.project_commit = get_project_commit(project_dir)
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._create_table()
+        logger.info(f'Objective cache {self.cache_path} opened for commit {self.project_commit} '
+                    f'in namespace {self.namespace}.')
+
+    def __getstate__(self):
+        # sqlite connections are not picklable, the connection is reopened lazily.
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.cache_path, timeout=30)
+        return self._connection
+
+    def _create_table(self):
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS objectives ('
+                'fingerprint TEXT PRIMARY KEY, '
+                'namespace TEXT, '
+                'project_commit TEXT, '
+                'objective_values TEXT, '
+                'sequence TEXT, '
+                'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'
+            )
+
+    def fingerprint(self, individual) -> str:
+        return individual_fingerprint(individual, salt=f'{self.namespace}@{self.project_commit}')
+
+    def get(self, individual):
+        """
+
+        Args:
+
+            individual (Individual): A list of RefactoringOperation
+
+        Returns:
+
+            list: The cached objective values or None if the individual has not been evaluated yet
+
+        """
+
+        row = self.connection.execute(
+            'SELECT objective_values FROM objectives WHERE fingerprint = ?',
+            (self.fingerprint(individual),)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, individual, objective_values):
+        """
+
+        Args:
+
+            individual (Individual): A list of RefactoringOperation
+
+            objective_values (list): The objective values computed for the individual
+
+        """
+
+        sequence = json.dumps([refactoring_operation_key(ro) for ro in individual], default=str)
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO objectives '
+                '(fingerprint, namespace, project_commit, objective_values, sequence) VALUES (?, ?, ?, ?, ?)',
+                (
+                    self.fingerprint(individual),
+                    self.namespace,
+                    self.project_commit,
+                    json.dumps([float(v) for v in objective_values]),
+                    sequence
+                )
+            )
+
+    def log_statistics(self):
+        total = self.hits + self.misses
+        hit_ratio = self.hits / total if total > 0 else 0.
+        logger.info(f'Objective cache hits: {self.hits}, misses: {self.misses}, hit ratio: {hit_ratio:.3f}')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,315 @@
+"""
+
+## Module description
+
+This module implements the parallel evaluation of a population across isolated git worktrees.
+
+Each worker owns a `git worktree` copy of the project and its own Understand database,
+both created once and reused in all generations. The individuals of a generation are sorted by
+their refactoring sequences (such that individuals with shared prefixes fall into the same shard),
+sharded across the workers, and evaluated concurrently. The objective values are returned
+in the population order.
+
+Within a worker, the evaluation is done by `PrefixTrieEvaluator`, either with prefix sharing or by
+evaluating each individual from scratch.
+
+### Classes
+
+WorkerWorkspace: The project copy and Understand database owned by a worker
+
+WorktreePoolEvaluator: The population evaluation engine
+
+## Changelog
+
+### version 0.1.2
+    1. The paths of the worker's project copy and Understand database are passed to the objective function
+    explicitly, the modules which imported the paths from config (or spawned processes) still had the paths of
+    the main project
+
+### version 0.1.1
+    1. Workers write their profiler spans to the trace files of the run
+
+### version 0.1.0
+    1. Add WorktreePoolEvaluator
+
+"""
+
+__version__ = '0.1.2'
+__author__ = 'Morteza Zakeri'
+
+import os
+import copy
+import functools
+import json
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from codart import config
+from codart.config import logger
+from codart.sbse.objective_cache import refactoring_operation_key, get_project_commit
+from codart.sbse.prefix_trie_evaluation import PrefixTrieEvaluator
+from codart.utility.directory_utils import get_git_root, create_understand_database
+from codart.utility.profiling import get_profiler
+
+WORKTREE_POOL_EVALUATORS = dict()
+
+
+class WorkerWorkspace:
+    """
+
+    The project copy (a git worktree) and the Understand database owned by one worker
+
+    """
+
+    def __init__(self, project_dir: str = None, udb_path: str = None, path_map: list = None):
+        """
+
+        Args:
+
+            project_dir (str): The absolute path of the worktree
+
+            udb_path (str): The absolute path of the worker's Understand database
+
+            path_map (list): Pairs of (original path prefix, worker path prefix) used to rebind\
+                the path parameters of refactoring operations
+
+        """
+
+        self.project_dir = project_dir
+        self.udb_path = udb_path
+        self.path_map = path_map if path_map is not None else []
+
+    def rebind_path(self, value):
+        if isinstance(value, str):
+            for original_prefix, worker_prefix in self.path_map:
+                if value.startswith(original_prefix):
+                    return worker_prefix + value[len(original_prefix):]
+            return value
+        if isinstance(value, list):
+            return [self.rebind_path(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.rebind_path(v) for k, v in value.items()}
+        return value
+
+    def rebind_individual(self, individual):
+        """
+
+        Returns a copy of the individual whose refactoring operations work on this workspace
+
+        """
+
+        rebound_individual = []
+        for refactoring_operation in individual:
+            rebound_operation = copy.copy(refactoring_operation)
+            rebound_operation.params = self.rebind_path(refactoring_operation.params)
+            rebound_individual.append(rebound_operation)
+        return rebound_individual
+
+
+def evaluate_shard(workspace: WorkerWorkspace, individuals: dict, objective_function, prefix_trie_evaluation,
+                   profiler_state: dict = None):
+    """
+
+    Evaluates a shard of the population on a worker workspace (executed in a worker process)
+
+    Args:
+
+        workspace (WorkerWorkspace): The workspace of the worker
+
+        individuals (dict): Maps the index of each individual in the population to its refactoring sequence
+
+        objective_function (callable): The `evaluate_objectives` method of the problem, called with the index of
+        an individual and the `udb_path` of the workspace
+
+        prefix_trie_evaluation (bool): Whether the shared prefixes of individuals are applied only once or not
+
+        profiler_state (dict): The state of the profiler of the main process (see `Profiler.state`)
+
+    Returns:
+
+        dict: Maps the index of each individual to its objective values
+
+    """
+
+    get_profiler().restore_state(profiler_state)
+
+    # The paths are passed explicitly to the refactorings (rebound parameters) and the objective function.
+    # Setting them in config only covers the modules reading `config.UDB_PATH` at call time in this process.
+    config.PROJECT_PATH = workspace.project_dir
+    config.UDB_PATH = workspace.udb_path
+    objective_function = functools.partial(objective_function, udb_path=workspace.udb_path)
+
+    individuals = {k: workspace.rebind_individual(individual) for k, individual in individuals.items()}
+    evaluator = PrefixTrieEvaluator(project_dir=workspace.project_dir, udb_path=workspace.udb_path)
+    if prefix_trie_evaluation and len(individuals) > 1:
+        return evaluator.evaluate(individuals, objective_function=objective_function)
+    return evaluator.evaluate_sequentially(individuals, objective_function=objective_function)
+
+
+class WorktreePoolEvaluator:
+    """
+
+    Evaluates a population with a pool of workers, each owning a git worktree and an Understand database
+
+    """
+
+    def __init__(self, project_dir: str = None, udb_path: str = None, n_workers: int = 2, workers_dir: str = None):
+        """
+
+        Args:
+
+            project_dir (str): The absolute path of project's directory
+
+            udb_path (str): The absolute path of project's Understand database
+
+            n_workers (int): The number of workers
+
+            workers_dir (str): The directory to create the worktrees and Understand databases in
+
+        """
+
+        self.project_dir = project_dir
+        self.udb_path = udb_path
+        self.n_workers = n_workers
+        self.workers_dir = workers_dir if workers_dir is not None else f'{project_dir}_CodART_Workers'
+        self.git_root = get_git_root(project_dir)
+        self.workspaces = []
+        self._executor = None
+
+    def setup(self):
+        """
+
+        Creates (or updates) the worktree and the Understand database of each worker
+
+        """
+
+        if self.workspaces:
+            return
+        if self.git_root is None:
+            raise RuntimeError(f"No git repository found for project {self.project_dir}.")
+
+        commit = get_project_commit(self.git_root)
+        udbs_dir = os.path.join(self.workers_dir, 'udbs')
+        os.makedirs(udbs_dir, exist_ok=True)
+
+        for i in range(self.n_workers):
+            worktree_dir = os.path.join(self.workers_dir, f'worker_{i}')
+            if os.path.exists(os.path.join(worktree_dir, '.git')):
+                logger.debug(f"Reusing the worktree {worktree_dir}.")
+                command = ['git', 'checkout', '--detach', '--force', commit]
+                cwd = worktree_dir
+            else:
+                logger.debug(f"Creating the worktree {worktree_dir}.")
+                command = ['git', 'worktree', 'add', '--detach', '--force', worktree_dir, commit]
+                cwd = self.git_root
+            result = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to prepare the worktree {worktree_dir}: {result.stderr}")
+
+            worker_udb_path = os.path.join(udbs_dir, f'worker_{i}.und')
+            if not os.path.exists(worker_udb_path):
+                worker_udb_path = create_understand_database(project_dir=worktree_dir, db_dir=udbs_dir)
+
+            path_map = [(self.udb_path, worker_udb_path), (self.git_root, worktree_dir)]
+            if os.path.normpath(self.project_dir) != os.path.normpath(self.git_root):
+                path_map.append((self.project_dir, worktree_dir))
+            # The longest prefixes are replaced first
+            path_map.sort(key=lambda item: len(item[0]), reverse=True)
+            self.workspaces.append(
+                WorkerWorkspace(project_dir=worktree_dir, udb_path=worker_udb_path, path_map=path_map)
+            )
+        logger.info(f"{self.n_workers} evaluation workers are ready in {self.workers_dir}.")
+
+    def shard(self, individuals: dict) -> list:
+        """
+
+        Splits the individuals into at most `n_workers` contiguous shards of their sorted refactoring sequences
+
+        """
+
+        def sort_key(k):
+            return [json.dumps(refactoring_operation_key(ro), sort_keys=True, default=str) for ro in individuals[k]]
+
+        indices = sorted(individuals, key=sort_key)
+        n_shards = min(self.n_workers, len(indices))
+        shards = []
+        start = 0
+        for i in range(n_shards):
+            size = len(indices) // n_shards + (1 if i < len(indices) % n_shards else 0)
+            shards.append({k: individuals[k] for k in indices[start:start + size]})
+            start += size
+        return shards
+
+    def evaluate(self, individuals: dict, objective_function=None, prefix_trie_evaluation=False) -> dict:
+        """
+
+        Args:
+
+            individuals (dict): Maps the index of each individual in the population to its refactoring sequence
+
+            objective_function (callable): The `evaluate_objectives` method of the problem
+
+            prefix_trie_evaluation (bool): Whether the shared prefixes of individuals are applied only once or not
+
+        Returns:
+
+            dict: Maps the index of each individual to its objective values
+
+        """
+
+        self.setup()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+
+        # Each shard is submitted with a distinct workspace, hence a workspace is never used concurrently
+        futures = [
+            self._executor.submit(
+                evaluate_shard, workspace, shard, objective_function, prefix_trie_evaluation, get_profiler().state()
+            )
+            for workspace, shard in zip(self.workspaces, self.shard(individuals))
+        ]
+        objective_values = dict()
+        for future in futures:
+            objective_values.update(future.result())
+        return objective_values
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def remove_workspaces(self):
+        """
+
+        Removes the worktrees of the workers (the Understand databases are kept for the next executions)
+
+        """
+
+        self.close()
+        for workspace in self.workspaces:
+            subprocess.run(
+                ['git', 'worktree', 'remove', '--force', workspace.project_dir],
+                cwd=self.git_root,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        self.workspaces = []
+
+
+def get_worktree_pool_evaluator(project_dir: str = None, udb_path: str = None, n_workers: int = 2,
+                                workers_dir: str = None) -> WorktreePoolEvaluator:
+    """
+
+    Returns the evaluator of the project, created once and reused in all generations
+
+    """
+
+    key = (project_dir, udb_path, n_workers, workers_dir)
+    if key not in WORKTREE_POOL_EVALUATORS:
+        WORKTREE_POOL_EVALUATORS[key] = WorktreePoolEvaluator(
+            project_dir=project_dir,
+            udb_path=udb_path,
+            n_workers=n_workers,
+            workers_dir=workers_dir
+        )
+    return WORKTREE_POOL_EVALUATORS[key]
@@ -0,0 +1,352 @@
+"""
+
+## Module description
+
+This module implements the prefix-sharing trie evaluation of refactoring sequences.
+
+Individuals produced by the crossover operator often share long prefixes.
+Instead of restoring the project and replaying every refactoring operation for each individual,
+the evaluator builds a trie of the refactoring sequences in the population and traverses it
+in depth-first order. Each shared prefix is applied only once per generation.
+At branch points, the working tree (files changed since the initial commit) and the
+Understand database are snapshotted and restored before applying the next branch.
+
+### Classes
+
+PrefixTrieNode: A node of the refactoring sequences trie
+
+WorkingTreeSnapshot: A snapshot of the project changes and the Understand database
+
+PrefixTrieEvaluator: The population evaluation engine
+
+## Changelog
+
+### version 0.1.1
+    1. Record a profiler span for each evaluated individual
+
+### version 0.1.0
+    1. Add PrefixTrieEvaluator
+
+"""
+
+__version__ = '0.1.1'
+__author__ = 'Morteza Zakeri'
+
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+
+from codart.config import logger
+from codart.sbse.objective_cache import refactoring_operation_key
+from codart.utility.directory_utils import update_understand_database, git_restore, get_git_root
+from codart.utility.profiling import get_profiler
+
+
+class PrefixTrieNode:
+    """
+
+    A node of the trie, which corresponds to a prefix of one or more refactoring sequences
+
+    """
+
+    def __init__(self, refactoring_operation=None, depth=0):
+        """
+
+        Args:
+
+            refactoring_operation (RefactoringOperation): The last refactoring operation of the prefix
+
+            depth (int): The length of the prefix
+
+        """
+
+        self.refactoring_operation = refactoring_operation
+        self.depth = depth
+        self.children = dict()
+        self.individual_indices = list()
+
+    def add_sequence(self, individual, index):
+        node = self
+        for refactoring_operation in individual:
+            key = json.dumps(refactoring_operation_key(refactoring_operation), sort_keys=True, default=str)
+            if key not in node.children:
+                node.children[key] = PrefixTrieNode(refactoring_operation=refactoring_operation, depth=node.depth + 1)
+            node = node.children[key]
+        node.individual_indices.append(index)
+
+    def count_nodes(self):
+        return 1 + sum(child.count_nodes() for child in self.children.values())
+
+
+class WorkingTreeSnapshot:
+    """
+
+    Snapshot of the files changed since the initial commit of the project (kept in memory)
+    and a copy of the Understand database (kept on disk).
+
+    """
+
+    def __init__(self, git_root, udb_path, snapshot_dir):
+        """
+
+        Args:
+
+            git_root (str): The absolute path of the project's git repository
+
+            udb_path (str): The absolute path of Understand database
+
+            snapshot_dir (str): The directory to keep the database copy in
+
+        """
+
+        self.git_root = git_root
+        self.udb_path = udb_path
+        self.snapshot_dir = snapshot_dir
+        self.files = dict()  # Relative path --> (content, modification time)
+        self.deleted_files = set()
+
+        for relative_path, status in get_changed_files(self.git_root).items():
+            absolute_path = os.path.join(self.git_root, relative_path)
+            if status == 'D' or not os.path.isfile(absolute_path):
+                self.deleted_files.add(relative_path)
+            else:
+                with open(absolute_path, mode='rb') as fp:
+                    self.files[relative_path] = (fp.read(), os.stat(absolute_path).st_mtime)
+
+        self.udb_copy_path = os.path.join(self.snapshot_dir, os.path.basename(os.path.normpath(self.udb_path)))
+        copy_path(self.udb_path, self.udb_copy_path)
+
+    def restore(self):
+        """
+
+        Returns the project files and the Understand database to the snapshot state
+        without running git restore and Understand analysis on the whole project
+
+        """
+
+        paths_to_checkout = []
+        for relative_path, status in get_changed_files(self.git_root).items():
+            if relative_path in self.files or relative_path in self.deleted_files:
+                continue
+            if status == '?':  # Created after the snapshot
+                remove_file_and_empty_parents(os.path.join(self.git_root, relative_path), self.git_root)
+            else:
+                paths_to_checkout.append(relative_path)
+
+        # Changed after the snapshot: checkout from the initial commit
+        for i in range(0, len(paths_to_checkout), 100):
+            subprocess.run(
+                ['git', 'checkout', 'HEAD', '--'] + paths_to_checkout[i:i + 100],
+                cwd=self.git_root,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+        for relative_path, (content, modification_time) in self.files.items():
+            absolute_path = os.path.join(self.git_root, relative_path)
+            os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+            with open(absolute_path, mode='wb') as fp:
+                fp.write(content)
+            os.utime(absolute_path, (modification_time, modification_time))
+
+        for relative_path in self.deleted_files:
+            absolute_path = os.path.join(self.git_root, relative_path)
+            if os.path.isfile(absolute_path):
+                os.remove(absolute_path)
+
+        copy_path(self.udb_copy_path, self.udb_path)
+
+    def discard(self):
+        self.files.clear()
+        remove_path(self.udb_copy_path)
+
+
+class PrefixTrieEvaluator:
+    """
+
+    Evaluates a population by applying each shared prefix of refactoring sequences only once
+
+    """
+
+    def __init__(self, project_dir: str = None, udb_path: str = None):
+        """
+
+        Args:
+
+            project_dir (str): The absolute path of project's directory
+
+            udb_path (str): The absolute path of Understand database
+
+        """
+
+        self.project_dir = project_dir
+        self.udb_path = udb_path
+        self.git_root = get_git_root(project_dir)
+        self.applied_refactorings = 0
+        self.total_refactorings = 0
+        self._snapshot_root = None
+
+    def build_trie(self, individuals: dict) -> PrefixTrieNode:
+        root = PrefixTrieNode()
+        for index, individual in individuals.items():
+            root.add_sequence(individual, index)
+            self.total_refactorings += len(individual)
+        return root
+
+    def evaluate(self, individuals: dict, objective_function=None) -> dict:
+        """
+
+        Args:
+
+            individuals (dict): Maps the index of each individual in the population to its refactoring sequence
+
+            objective_function (callable): Computes the objective values of the current version of the program.\
+                It is called with the index of the individual.
+
+        Returns:
+
+            dict: Maps the index of each individual to its objective values
+
+        """
+
+        root = self.build_trie(individuals)
+        logger.info(f"Prefix trie with {root.count_nodes() - 1} nodes was built for "
+                    f"{len(individuals)} individuals and {self.total_refactorings} refactoring operations.")
+
+        # Stage 0: Git restore
+        git_restore(self.project_dir)
+        update_understand_database(self.udb_path)
+
+        if self.git_root is None:
+            # Snapshots require a git repository, evaluate each individual from scratch
+            logger.warning("No git repository found, prefix-sharing trie evaluation is disabled.")
+            return self.evaluate_sequentially(individuals, objective_function)
+
+        objective_values = dict()
+        self._snapshot_root = tempfile.mkdtemp(prefix='codart_trie_snapshots_')
+        try:
+            self._visit(root, objective_function, objective_values)
+        finally:
+            shutil.rmtree(self._snapshot_root, ignore_errors=True)
+            self._snapshot_root = None
+
+        logger.info(f"Prefix-sharing trie evaluation applied {self.applied_refactorings} "
+                    f"out of {self.total_refactorings} refactoring operations.")
+        return objective_values
+
+    def _visit(self, node: PrefixTrieNode, objective_function, objective_values: dict):
+        if node.individual_indices:
+            # Identical individuals are evaluated once, their refactoring operations are in the enclosing spans
+            with get_profiler().span('individual', category='search',
+                                     context={'individual': node.individual_indices[0]},
+                                     refactorings=node.depth, duplicates=len(node.individual_indices) - 1):
+                values = objective_function(node.individual_indices[0])
+            for index in node.individual_indices:
+                objective_values[index] = values
+
+        children = list(node.children.values())
+        snapshot = None
+        if len(children) > 1:
+            snapshot = WorkingTreeSnapshot(
+                git_root=self.git_root,
+                udb_path=self.udb_path,
+                snapshot_dir=tempfile.mkdtemp(dir=self._snapshot_root)
+            )
+        try:
+            for i, child in enumerate(children):
+                if i > 0:
+                    logger.debug(f"Restoring the snapshot of prefix with length {node.depth}.")
+                    snapshot.restore()
+                # Stage 1: Execute the refactoring operation of the child node
+                child.refactoring_operation.do_refactoring()
+                self.applied_refactorings += 1
+                logger.debug(f"Updating understand database after {child.refactoring_operation.name}.")
+                update_understand_database(self.udb_path)
+                self._visit(child, objective_function, objective_values)
+        finally:
+            if snapshot is not None:
+                snapshot.discard()
+
+    def evaluate_sequentially(self, individuals: dict, objective_function=None) -> dict:
+        """
+
+        Evaluates each individual from scratch, i.e., without prefix sharing
+
+        """
+
+        objective_values = dict()
+        for index, individual in individuals.items():
+            with get_profiler().span('individual', category='search', context={'individual': index},
+                                     refactorings=len(individual)):
+                git_restore(self.project_dir)
+                update_understand_database(self.udb_path)
+                for refactoring_operation in individual:
+                    refactoring_operation.do_refactoring()
+                    self.applied_refactorings += 1
+                    update_understand_database(self.udb_path)
+                objective_values[index] = objective_function(index)
+        return objective_values
+
+
+def get_changed_files(git_root: str) -> dict:
+    """
+
+    Lists the files changed since the last commit of a git repository.
+
+    Returns:
+
+        dict: Maps the relative path of each changed file to its status, 'M' (modified), 'D' (deleted),
+        or '?' (untracked)
+
+    """
+
+    result = subprocess.run(
+        ['git', 'status', '--porcelain', '-z', '--untracked-files=all'],
+        cwd=git_root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    changed_files = dict()
+    entries = result.stdout.decode('utf-8', errors='ignore').split('\0')
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if len(entry) < 4:
+            continue
+        status, relative_path = entry[:2], entry[3:]
+        if 'R' in status or 'C' in status:
+            i += 1  # Skip the original path of renamed and copied files
+        if status == '??':
+            changed_files[relative_path] = '?'
+        elif 'D' in status:
+            changed_files[relative_path] = 'D'
+        else:
+            changed_files[relative_path] = 'M'
+    return changed_files
+
+
+def copy_path(source: str, destination: str):
+    remove_path(destination)
+    if os.path.isdir(source):
+        shutil.copytree(source, destination)
+    elif os.path.exists(source):
+        shutil.copy2(source, destination)
+
+
+def remove_path(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def remove_file_and_empty_parents(path: str, root: str):
+    if os.path.isfile(path):
+        os.remove(path)
+    parent = os.path.dirname(path)
+    while os.path.normpath(parent) != os.path.normpath(root) and os.path.isdir(parent) and not os.listdir(parent):
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
@@ -23,6 +23,42 @@ PureRandomInitialization: Population, list of Individual
 
 ## Changelog
 
+### version 0.3.4
+    1. The objective cache is keyed by the evaluation settings (mode, normalization metrics, and versions of the
+    metrics and models), see `create_objective_cache`
+    2. The objective cache is opt-in (USE_OBJECTIVE_CACHE=1) and disabled for projects without a git commit
+
+### version 0.3.3
+    1. The evaluate_objectives methods take the path of the Understand database (config.UDB_PATH by default),
+    which is also passed to the objective processes, e.g., the database of a parallel evaluation worker
+
+### version 0.3.2
+    1. RefactoringSequenceDuplicateElimination compares the canonical keys of the refactoring sequences,
+    such that the plain lists of the crossover offsprings are hashed and compared with the individuals
+
+### version 0.3.1
+    1. Add canonical, cached hash and equality to RefactoringOperation and Individual
+    2. Add RefactoringSequenceDuplicateElimination, which buckets the individuals by hash instead of
+    comparing every pair of individuals
+
+### version 0.3.0
+    1. Add opt-in profiling of the evaluation stages with per-individual and per-generation spans
+
+### version 0.2.9
+    1. Log the statistics of the parse tree cache
+
+### version 0.2.8
+    1. Log the latency statistics of the Understand sessions
+
+### version 0.2.7
+    1. Add parallel population evaluation across isolated git worktrees
+
+### version 0.2.6
+    1. Add prefix-sharing trie evaluation of the population
+
+### version 0.2.5
+    1. Add persistent objective cache to skip the evaluation of already evaluated individuals
+
 ### version 0.2.4
     1. Fix objective parameters of the problem classes
 
@@ -51,7 +87,7 @@ PureRandomInitialization: Population, list of Individual
 
 """
 
-__version__ = '0.2.4'
+__version__ = '0.3.4'
 __author__ = 'Morteza Zakeri'
 
 import os
@@ -67,7 +103,7 @@ import pandas as pd
 
 from pymoo.core.callback import Callback
 from pymoo.core.crossover import Crossover
-from pymoo.core.duplicate import ElementwiseDuplicateElimination
+from pymoo.core.duplicate import DuplicateElimination
 from pymoo.core.mutation import Mutation
 from pymoo.core.problem import Problem
 from pymoo.core.sampling import Sampling
@@ -83,12 +119,20 @@ from pymoo.optimize import minimize
 from pymoo.termination.default import DefaultMultiObjectiveTermination
 
 
+from codart.metrics import modularity, qmood
 from codart.metrics.qmood import DesignQualityAttributes
 from codart.metrics.modularity import main as modularity_main
 from codart.metrics.testability_prediction2 import main as testability_main
+from codart.metrics.testability_prediction2 import model_fingerprint as testability_model_fingerprint
 
 from codart.utility.directory_utils import update_understand_database, git_restore, reset_project
+from codart.utility.understand_session import get_understand_session
+from codart.utility.parse_tree_cache import get_parse_tree_cache
+from codart.utility.profiling import get_profiler
 from codart.sbse.initialize import RandomInitialization, SmellInitialization, Initialization
+from codart.sbse.objective_cache import ObjectiveCache, get_project_commit, refactoring_operation_canonical_form
+from codart.sbse.prefix_trie_evaluation import PrefixTrieEvaluator
+from codart.sbse.parallel_evaluation import get_worktree_pool_evaluator
 from codart import config
 from codart.config import logger
 
@@ -132,6 +176,7 @@ class RefactoringOperation(Gene):
     The class define a data structure (dictionary) to hold a refactoring operation
 
     Each refactoring operation hold as a dictionary contains the required parameters.
+    Two refactoring operations are equal if they have the same name and parameters (see `canonical_key`).
 
         Example:
 
@@ -161,6 +206,35 @@ class RefactoringOperation(Gene):
         """
         super(RefactoringOperation, self).__init__(**kwargs)
 
+    def __setattr__(self, key, value):
+        # The canonical key is computed again after the name or parameters are reassigned.
+        # The parameters must not be modified in place once the key is computed.
+        if key in ('name', 'params'):
+            self.__dict__.pop('_canonical_key', None)
+        super(RefactoringOperation, self).__setattr__(key, value)
+
+    @property
+    def canonical_key(self) -> str:
+        """
+
+        The canonical form of the refactoring operation (name and sorted parameters), computed once
+
+        """
+
+        canonical_key = self.__dict__.get('_canonical_key')
+        if canonical_key is None:
+            canonical_key = refactoring_operation_canonical_form(self)
+            self.__dict__['_canonical_key'] = canonical_key
+        return canonical_key
+
+    def __eq__(self, other):
+        if not isinstance(other, RefactoringOperation):
+            return NotImplemented
+        return self is other or self.canonical_key == other.canonical_key
+
+    def __hash__(self):
+        return hash(self.canonical_key)
+
     def __str__(self):
         return f'{self.name}({self.params})\n'
 
@@ -180,12 +254,16 @@ class RefactoringOperation(Gene):
 
         logger.info(f"Running {self.name}")
         logger.info(f"Parameters {self.params}")
+        profiler = get_profiler()
         try:
-            res = self.main(**self.params)
+            with profiler.span('do_refactoring', category='refactoring', refactoring=self.name):
+                res = self.main(**self.params)
             logger.debug(f"Executed refactoring with result {res}")
+            profiler.count('refactorings_applied' if res else 'refactorings_rejected')
             return res
         except Exception as e:
             logger.error(f"Unexpected error in executing refactoring:\n {e}")
+            profiler.count('refactorings_failed')
             return False
 
 
@@ -196,6 +274,7 @@ class Individual(List):
     Each individual (also called, chromosome or solution in the context of genetic programming)
     is an array of refactoring operations where the order of their execution is accorded by
     their positions in the array.
+    Two individuals are equal if they have equal refactoring operations in the same order.
 
     """
 
@@ -208,6 +287,42 @@ class Individual(List):
         """
         super(Individual, self).__init__()
         self.refactoring_operations = []
+        self._canonical_key = None
+        self._hash = None
+
+    @property
+    def canonical_key(self) -> tuple:
+        """
+
+        The canonical keys of the refactoring operations, computed once until the individual is modified
+
+        """
+
+        if getattr(self, '_canonical_key', None) is None:
+            self._canonical_key = tuple(ro.canonical_key for ro in self.refactoring_operations)
+            self._hash = hash(self._canonical_key)
+        return self._canonical_key
+
+    def _invalidate_canonical_key(self):
+        self._canonical_key = None
+        self._hash = None
+
+    def __eq__(self, other):
+        if not isinstance(other, Individual):
+            return NotImplemented
+        if self is other:
+            return True
+        return hash(self) == hash(other) and self.canonical_key == other.canonical_key
+
+    def __ne__(self, other):
+        # list.__ne__ would compare the (empty) underlying lists
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        if getattr(self, '_hash', None) is None:
+            self._hash = hash(self.canonical_key)
+        return self._hash
 
     def __iter__(self):
         for ref in self.refactoring_operations:
@@ -221,23 +336,27 @@ class Individual(List):
 
     def __delitem__(self, key):
         del self.refactoring_operations[key]
+        self._invalidate_canonical_key()
 
     def __setitem__(self, key, value):
         self.refactoring_operations[key] = value
+        self._invalidate_canonical_key()
 
     def __str__(self):
         return str(self.refactoring_operations)
 
     def insert(self, __index: int, __object: RefactoringOperation) -> None:
         self.refactoring_operations.insert(__index, __object)
+        self._invalidate_canonical_key()
 
     def append(self, __object: RefactoringOperation) -> None:
         self.insert(len(self.refactoring_operations), __object)
 
 
 # ---------------------- Defines objectives calculation functions -----------------------
-def calc_qmood_objectives(arr_):
-    qmood_quality_attributes = DesignQualityAttributes(udb_path=config.UDB_PATH)
+def calc_qmood_objectives(arr_, udb_path=None):
+    # The path is passed by the parent process, config of a spawned process has the default paths
+    qmood_quality_attributes = DesignQualityAttributes(udb_path=config.UDB_PATH if udb_path is None else udb_path)
     arr_[0] = qmood_quality_attributes.reusability
     arr_[1] = qmood_quality_attributes.understandability
     arr_[2] = qmood_quality_attributes.flexibility
@@ -260,6 +379,118 @@ def calc_modularity_objective(path_, arr_):
     )
 
 
+# ---------------------- Defines population evaluation functions -----------------------
+def apply_refactoring_sequence(individual, project_dir=None, udb_path=None):
+    """
+
+    Returns the project to its initial version and executes the refactoring operations of an individual,
+    i.e., Stages 0 and 1 of the evaluation
+
+    Args:
+
+        individual (Individual): A list of RefactoringOperation
+
+        project_dir (str): The absolute path of project's directory, config.PROJECT_PATH by default
+
+        udb_path (str): The absolute path of Understand database, config.UDB_PATH by default
+
+    """
+
+    project_dir = config.PROJECT_PATH if project_dir is None else project_dir
+    udb_path = config.UDB_PATH if udb_path is None else udb_path
+
+    # Stage 0: Git restore
+    logger.debug("Executing git restore.")
+    git_restore(project_dir)
+    logger.debug("Updating understand database after git restore.")
+    update_understand_database(udb_path)
+
+    # Stage 1: Execute all refactoring operations in the sequence x
+    logger.debug(f"Reached an Individual with size {len(individual)}")
+    for refactoring_operation in individual:
+        refactoring_operation.do_refactoring()
+        # Update Understand DB
+        logger.debug(f"Updating understand database after {refactoring_operation.name}.")
+        update_understand_database(udb_path)
+
+
+def evaluate_population(problem, x):
+    """
+
+    This function iterates over a population, executes the refactoring operations in each individual,
+    and computes quality attributes for the refactored version of the program with `problem.evaluate_objectives`.
+    Individuals found in the objective cache of the problem are not evaluated again.
+    The remaining individuals are evaluated sequentially, with the prefix-sharing trie evaluator,
+    or by a pool of workers each owning a git worktree of the project.
+
+    Args:
+
+        problem (Problem): One of the CodART problems
+
+        x (Population): x is a matrix where each row is an individual, and each column a variable.\
+            We have one variable of type list (Individual) ==> x.shape = (len(Population), 1)
+
+    Returns:
+
+        np.array: The objective values matrix in the population order
+
+    """
+
+    # Each call evaluates the population of the next generation
+    profiler = get_profiler()
+    generation = profiler.context.get('generation', config.NGEN) + 1
+    profiler.set_context(generation=generation)
+
+    objective_values = [None] * len(x)
+    pending_individuals = dict()
+    for k, individual_ in enumerate(x):
+        # Stage -1: Skip the evaluation of already evaluated individuals
+        if problem.objective_cache is not None:
+            cached_objective_values = problem.objective_cache.get(individual_[0])
+            if cached_objective_values is not None:
+                objective_values[k] = cached_objective_values
+                logger.info(f"Objective values for individual {k} loaded from cache: {cached_objective_values}")
+                profiler.count('objective_cache_hits')
+                continue
+        pending_individuals[k] = individual_[0]
+
+    with profiler.span('generation', category='search', population=len(x), evaluated=len(pending_individuals)):
+        if problem.n_evaluation_workers > 1 and len(pending_individuals) > 1:
+            evaluator = get_worktree_pool_evaluator(
+                project_dir=config.PROJECT_PATH,
+                udb_path=config.UDB_PATH,
+                n_workers=problem.n_evaluation_workers,
+                workers_dir=config.WORKERS_ROOT_DIR
+            )
+            evaluated_objective_values = evaluator.evaluate(
+                pending_individuals,
+                objective_function=problem.evaluate_objectives,
+                prefix_trie_evaluation=problem.prefix_trie_evaluation
+            )
+        elif problem.prefix_trie_evaluation and len(pending_individuals) > 1:
+            evaluator = PrefixTrieEvaluator(project_dir=config.PROJECT_PATH, udb_path=config.UDB_PATH)
+            evaluated_objective_values = evaluator.evaluate(
+                pending_individuals,
+                objective_function=problem.evaluate_objectives
+            )
+        else:
+            evaluated_objective_values = dict()
+            for k, individual_ in pending_individuals.items():
+                with profiler.span('individual', category='search', context={'individual': k},
+                                   refactorings=len(individual_)):
+                    apply_refactoring_sequence(individual_)
+                    evaluated_objective_values[k] = problem.evaluate_objectives(k)
+        profiler.count('individuals_evaluated', len(evaluated_objective_values))
+
+    for k, values in evaluated_objective_values.items():
+        objective_values[k] = values
+        if problem.objective_cache is not None:
+            problem.objective_cache.put(pending_individuals[k], values)
+
+    # Stage 4: Marshal all objectives into out dictionary
+    return np.array(objective_values, dtype=float)
+
+
 # ---------------------- Defines problems ----------------------------
 class ProblemSingleObjective(Problem):
     """
@@ -273,7 +504,10 @@ class ProblemSingleObjective(Problem):
                  n_refactorings_lowerbound=10,
                  n_refactorings_upperbound=50,
                  evaluate_in_parallel=False,
-                 mode='single'  # 'multi'
+                 mode='single',  # 'multi'
+                 objective_cache: ObjectiveCache = None,
+                 prefix_trie_evaluation=False,
+                 n_evaluation_workers=1,
                  ):
         """
 
@@ -287,6 +521,13 @@ class ProblemSingleObjective(Problem):
 
             mode (str): 'single' or 'multi'
 
+            objective_cache (ObjectiveCache): The cache of already evaluated individuals (optional)
+
+            prefix_trie_evaluation (bool): Whether the shared prefixes of individuals are applied only once or not
+
+            n_evaluation_workers (int): The number of workers evaluating individuals in parallel,\
+                each with its own git worktree and Understand database
+
         """
 
         super(ProblemSingleObjective, self).__init__(n_var=1, n_obj=1, n_constr=0)
@@ -295,6 +536,9 @@ class ProblemSingleObjective(Problem):
         self.evaluate_in_parallel = evaluate_in_parallel
         self.mode = mode
         self.n_obj_virtual = n_objectives
+        self.objective_cache = objective_cache
+        self.prefix_trie_evaluation = prefix_trie_evaluation
+        self.n_evaluation_workers = n_evaluation_workers
 
     def _evaluate(self,
                   x,  #
@@ -313,60 +557,62 @@ class ProblemSingleObjective(Problem):
 
         """
 
-        objective_values = []
-        for k, individual_ in enumerate(x):
-            # Stage 0: Git restore
-            logger.debug("Executing git restore.")
-            git_restore(config.PROJECT_PATH)
-            logger.debug("Updating understand database after git restore.")
-            update_understand_database(config.UDB_PATH)
-
-            # Stage 1: Execute all refactoring operations in the sequence x
-            logger.debug(f"Reached Individual with Size {len(individual_[0])}")
-            for refactoring_operation in individual_[0]:
-                refactoring_operation.do_refactoring()
-                # Update Understand DB
-                logger.debug(f"Updating understand database after {refactoring_operation.name}.")
-                update_understand_database(config.UDB_PATH)
-
-            # Stage 2:
-            if self.mode == 'single':
-                # Stage 2 (Single objective mode): Considering only one quality attribute, e.g., testability
-                score = testability_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
+        out['F'] = evaluate_population(problem=self, x=x)
+
+    def evaluate_objectives(self, k=0, udb_path=None):
+        """
+
+        Computes the objective values of the current version of the program (Stages 2 and 3 of the evaluation)
+
+        Args:
+
+            k (int): The index of the evaluated individual in the population (used for logging)
+
+            udb_path (str): The absolute path of Understand database, config.UDB_PATH by default
+
+        Returns:
+
+            list: The objective values vector
+
+        """
+
+        udb_path = config.UDB_PATH if udb_path is None else udb_path
+
+        # Stage 2:
+        if self.mode == 'single':
+            # Stage 2 (Single objective mode): Considering only one quality attribute, e.g., testability
+            score = testability_main(udb_path, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
+        else:
+            # Stage 2 (Multi-objective mode): Considering one objective based on average of 8 objective
+            arr = Array('d', range(self.n_obj_virtual))
+            if self.evaluate_in_parallel:
+                # Stage 2 (Multi-objective mode, parallel): Computing quality attributes
+                p1 = Process(target=calc_qmood_objectives, args=(arr, udb_path,))
+                if self.n_obj_virtual == 8:
+                    p2 = Process(target=calc_testability_objective, args=(udb_path, arr,))
+                    p3 = Process(target=calc_modularity_objective, args=(udb_path, arr,))
+                    p1.start(), p2.start(), p3.start()
+                    p1.join(), p2.join(), p3.join()
+                else:
+                    p1.start()
+                    p1.join()
+                score = sum([i for i in arr]) / self.n_obj_virtual
             else:
-                # Stage 2 (Multi-objective mode): Considering one objective based on average of 8 objective
-                arr = Array('d', range(self.n_obj_virtual))
-                if self.evaluate_in_parallel:
-                    # Stage 2 (Multi-objective mode, parallel): Computing quality attributes
-                    p1 = Process(target=calc_qmood_objectives, args=(arr,))
-                    if self.n_obj_virtual == 8:
-                        p2 = Process(target=calc_testability_objective, args=(config.UDB_PATH, arr,))
-                        p3 = Process(target=calc_modularity_objective, args=(config.UDB_PATH, arr,))
-                        p1.start(), p2.start(), p3.start()
-                        p1.join(), p2.join(), p3.join()
-                    else:
-                        p1.start()
-                        p1.join()
-                    score = sum([i for i in arr]) / self.n_obj_virtual
+                # Stage 2 (Multi-objective mode, sequential): Computing quality attributes
+                qmood_quality_attributes = DesignQualityAttributes(udb_path=udb_path)
+                o1 = qmood_quality_attributes.average_sum
+                if self.n_obj_virtual == 8:
+                    o2 = testability_main(udb_path, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
+                    o3 = modularity_main(udb_path, initial_value=config.CURRENT_METRICS.get("MODULE", 1.0))
                 else:
-                    # Stage 2 (Multi-objective mode, sequential): Computing quality attributes
-                    qmood_quality_attributes = DesignQualityAttributes(udb_path=config.UDB_PATH)
-                    o1 = qmood_quality_attributes.average_sum
-                    if self.n_obj_virtual == 8:
-                        o2 = testability_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
-                        o3 = modularity_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("MODULE", 1.0))
-                    else:
-                        o2 = 0
-                        o3 = 0
-                    del qmood_quality_attributes
-                    score = (o1 * 6. + o2 + o3) / self.n_obj_virtual
-
-            # Stage 3: Marshal objectives into vector
-            objective_values.append([-1 * score])
-            logger.info(f"Objective values for individual {k} in mode {self.mode}: {[-1 * score]}")
-
-        # Stage 4: Marshal all objectives into out dictionary
-        out['F'] = np.array(objective_values, dtype=float)
+                    o2 = 0
+                    o3 = 0
+                del qmood_quality_attributes
+                score = (o1 * 6. + o2 + o3) / self.n_obj_virtual
+
+        # Stage 3: Marshal objectives into vector
+        logger.info(f"Objective values for individual {k} in mode {self.mode}: {[-1 * score]}")
+        return [-1 * score]
 
 
 class ProblemMultiObjective(Problem):
@@ -385,7 +631,10 @@ class ProblemMultiObjective(Problem):
     def __init__(self, n_objectives=8,
                  n_refactorings_lowerbound=10,
                  n_refactorings_upperbound=50,
-                 evaluate_in_parallel=False
+                 evaluate_in_parallel=False,
+                 objective_cache: ObjectiveCache = None,
+                 prefix_trie_evaluation=False,
+                 n_evaluation_workers=1,
                  ):
         """
         Args:
@@ -398,12 +647,22 @@ class ProblemMultiObjective(Problem):
 
             evaluate_in_parallel (bool): Whether the objectives evaluate in parallel
 
+            objective_cache (ObjectiveCache): The cache of already evaluated individuals (optional)
+
+            prefix_trie_evaluation (bool): Whether the shared prefixes of individuals are applied only once or not
+
+            n_evaluation_workers (int): The number of workers evaluating individuals in parallel,\
+                each with its own git worktree and Understand database
+
         """
         super(ProblemMultiObjective, self).__init__(n_var=1, n_obj=3, n_constr=0)
         self.n_refactorings_lowerbound = n_refactorings_lowerbound
         self.n_refactorings_upperbound = n_refactorings_upperbound
         self.evaluate_in_parallel = evaluate_in_parallel
         self.n_obj_virtual = n_objectives
+        self.objective_cache = objective_cache
+        self.prefix_trie_evaluation = prefix_trie_evaluation
+        self.n_evaluation_workers = n_evaluation_workers
 
     def _evaluate(self,
                   x,  #
@@ -422,48 +681,50 @@ class ProblemMultiObjective(Problem):
 
 
         """
-        objective_values = []
-        for k, individual_ in enumerate(x):
-            # Stage 0: Git restore
-            logger.debug("Executing git restore.")
-            git_restore(config.PROJECT_PATH)
-            logger.debug("Updating understand database after git restore.")
-            update_understand_database(config.UDB_PATH)
-
-            # Stage 1: Execute all refactoring operations in the sequence x
-            logger.debug(f"Reached Individual with Size {len(individual_[0])}")
-            for refactoring_operation in individual_[0]:
-                refactoring_operation.do_refactoring()
-                # Update Understand DB
-                logger.debug(f"Updating understand database after {refactoring_operation.name}.")
-                update_understand_database(config.UDB_PATH)
-
-            # Stage 2:
-            arr = Array('d', range(self.n_obj_virtual))
-            if self.evaluate_in_parallel:
-                # Stage 2 (parallel mood): Computing quality attributes
-                p1 = Process(target=calc_qmood_objectives, args=(arr,))
-                p2 = Process(target=calc_testability_objective, args=(config.UDB_PATH, arr,))
-                p3 = Process(target=calc_modularity_objective, args=(config.UDB_PATH, arr,))
-                p1.start(), p2.start(), p3.start()
-                p1.join(), p2.join(), p3.join()
-                o1 = sum([i for i in arr[:6]]) / 6.
-                o2 = arr[6]
-                o3 = arr[7]
-            else:
-                # Stage 2 (sequential mood): Computing quality attributes
-                qmood_quality_attributes = DesignQualityAttributes(udb_path=config.UDB_PATH)
-                o1 = qmood_quality_attributes.average_sum
-                o2 = testability_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
-                o3 = modularity_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("MODULE", 1.0))
-                del qmood_quality_attributes
+        out['F'] = evaluate_population(problem=self, x=x)
+
+    def evaluate_objectives(self, k=0, udb_path=None):
+        """
+
+        Computes the objective values of the current version of the program (Stages 2 and 3 of the evaluation)
+
+        Args:
+
+            k (int): The index of the evaluated individual in the population (used for logging)
+
+            udb_path (str): The absolute path of Understand database, config.UDB_PATH by default
+
+        Returns:
 
-            # Stage 3: Marshal objectives into vector
-            objective_values.append([-1 * o1, -1 * o2, -1 * o3])
-            logger.info(f"Objective values for individual {k}: {[-1 * o1, -1 * o2, -1 * o3]}")
+            list: The objective values vector
 
-        # Stage 4: Marshal all objectives into out dictionary
-        out['F'] = np.array(objective_values, dtype=float)
+        """
+
+        udb_path = config.UDB_PATH if udb_path is None else udb_path
+
+        # Stage 2:
+        arr = Array('d', range(self.n_obj_virtual))
+        if self.evaluate_in_parallel:
+            # Stage 2 (parallel mood): Computing quality attributes
+            p1 = Process(target=calc_qmood_objectives, args=(arr, udb_path,))
+            p2 = Process(target=calc_testability_objective, args=(udb_path, arr,))
+            p3 = Process(target=calc_modularity_objective, args=(udb_path, arr,))
+            p1.start(), p2.start(), p3.start()
+            p1.join(), p2.join(), p3.join()
+            o1 = sum([i for i in arr[:6]]) / 6.
+            o2 = arr[6]
+            o3 = arr[7]
+        else:
+            # Stage 2 (sequential mood): Computing quality attributes
+            qmood_quality_attributes = DesignQualityAttributes(udb_path=udb_path)
+            o1 = qmood_quality_attributes.average_sum
+            o2 = testability_main(udb_path, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
+            o3 = modularity_main(udb_path, initial_value=config.CURRENT_METRICS.get("MODULE", 1.0))
+            del qmood_quality_attributes
+
+        # Stage 3: Marshal objectives into vector
+        logger.info(f"Objective values for individual {k}: {[-1 * o1, -1 * o2, -1 * o3]}")
+        return [-1 * o1, -1 * o2, -1 * o3]
 
 
 class ProblemManyObjective(Problem):
@@ -481,6 +742,9 @@ class ProblemManyObjective(Problem):
 
     def __init__(self, n_objectives=8, n_refactorings_lowerbound=10, n_refactorings_upperbound=50,
                  evaluate_in_parallel=False, verbose_design_metrics=False,
+                 objective_cache: ObjectiveCache = None,
+                 prefix_trie_evaluation=False,
+                 n_evaluation_workers=1,
                  ):
         """
 
@@ -496,12 +760,22 @@ class ProblemManyObjective(Problem):
 
             verbose_design_metrics (bool): Whether log the design metrics for each refactoring sequences or not
 
+            objective_cache (ObjectiveCache): The cache of already evaluated individuals (optional)
+
+            prefix_trie_evaluation (bool): Whether the shared prefixes of individuals are applied only once or not
+
+            n_evaluation_workers (int): The number of workers evaluating individuals in parallel,\
+                each with its own git worktree and Understand database
+
         """
         super(ProblemManyObjective, self).__init__(n_var=1, n_obj=n_objectives, n_constr=0, )
         self.n_refactorings_lowerbound = n_refactorings_lowerbound
         self.n_refactorings_upperbound = n_refactorings_upperbound
         self.evaluate_in_parallel = evaluate_in_parallel
         self.verbose_design_metrics = verbose_design_metrics
+        self.objective_cache = objective_cache
+        self.prefix_trie_evaluation = prefix_trie_evaluation
+        self.n_evaluation_workers = n_evaluation_workers
 
     def _evaluate(self, x, out, *args, **kwargs):
         """
@@ -518,73 +792,75 @@ class ProblemManyObjective(Problem):
 
         """
 
-        objective_values = []
-        for k, individual_ in enumerate(x):
-            # Stage 0: Git restore
-            logger.debug("Executing git restore.")
-            git_restore(config.PROJECT_PATH)
-            logger.debug("Updating understand database after git restore.")
-            update_understand_database(config.UDB_PATH)
-
-            # Stage 1: Execute all refactoring operations in the sequence x
-            logger.debug(f"Reached an Individual with size {len(individual_[0])}")
-            for refactoring_operation in individual_[0]:
-                res = refactoring_operation.do_refactoring()
-                # Update Understand DB
-                logger.debug(f"Updating understand database after {refactoring_operation.name}.")
-                update_understand_database(config.UDB_PATH)
-
-            # Stage 2:
-            arr = Array('d', range(self.n_obj))
-            if self.evaluate_in_parallel:
-                # Stage 2 (parallel mood): Computing quality attributes
-                p1 = Process(target=calc_qmood_objectives, args=(arr,))
-                if self.n_obj == 8:
-                    p2 = Process(target=calc_testability_objective, args=(config.UDB_PATH, arr,))
-                    p3 = Process(target=calc_modularity_objective, args=(config.UDB_PATH, arr,))
-                    p1.start(), p2.start(), p3.start()
-                    p1.join(), p2.join(), p3.join()
-                else:
-                    p1.start()
-                    p1.join()
-            else:
-                # Stage 2 (sequential mood): Computing quality attributes
-                qmood_quality_attributes = DesignQualityAttributes(udb_path=config.UDB_PATH)
-                arr[0] = qmood_quality_attributes.reusability
-                arr[1] = qmood_quality_attributes.understandability
-                arr[2] = qmood_quality_attributes.flexibility
-                arr[3] = qmood_quality_attributes.functionality
-                arr[4] = qmood_quality_attributes.effectiveness
-                arr[5] = qmood_quality_attributes.extendability
-                if self.n_obj == 8:
-                    arr[6] = testability_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
-                    arr[7] = modularity_main(config.UDB_PATH, initial_value=config.CURRENT_METRICS.get("MODULE", 1.0))
-
-                if self.verbose_design_metrics:
-                    design_metrics = {
-                        "DSC": [qmood_quality_attributes.DSC],
-                        "NOH": [qmood_quality_attributes.NOH],
-                        "ANA": [qmood_quality_attributes.ANA],
-                        "MOA": [qmood_quality_attributes.MOA],
-                        "DAM": [qmood_quality_attributes.DAM],
-                        "CAMC": [qmood_quality_attributes.CAMC],
-                        "CIS": [qmood_quality_attributes.CIS],
-                        "NOM": [qmood_quality_attributes.NOM],
-                        "DCC": [qmood_quality_attributes.DCC],
-                        "MFA": [qmood_quality_attributes.MFA],
-                        "NOP": [qmood_quality_attributes.NOP]
-                    }
-                    self.log_design_metrics(design_metrics)
+        out['F'] = evaluate_population(problem=self, x=x)
+        # print('OUT', out['F'])
 
-                del qmood_quality_attributes
+    def evaluate_objectives(self, k=0, udb_path=None):
+        """
 
-            # Stage 3: Marshal objectives into vector
-            objective_values.append([-1 * i for i in arr])
-            logger.info(f"Objective values for individual {k}: {[i for i in arr]}")
+        Computes the objective values of the current version of the program (Stages 2 and 3 of the evaluation)
 
-        # Stage 4: Marshal all objectives into out dictionary
-        out['F'] = np.array(objective_values, dtype=float)
-        # print('OUT', out['F'])
+        Args:
+
+            k (int): The index of the evaluated individual in the population (used for logging)
+
+            udb_path (str): The absolute path of Understand database, config.UDB_PATH by default
+
+        Returns:
+
+            list: The objective values vector
+
+        """
+
+        udb_path = config.UDB_PATH if udb_path is None else udb_path
+
+        # Stage 2:
+        arr = Array('d', range(self.n_obj))
+        if self.evaluate_in_parallel:
+            # Stage 2 (parallel mood): Computing quality attributes
+            p1 = Process(target=calc_qmood_objectives, args=(arr, udb_path,))
+            if self.n_obj == 8:
+                p2 = Process(target=calc_testability_objective, args=(udb_path, arr,))
+                p3 = Process(target=calc_modularity_objective, args=(udb_path, arr,))
+                p1.start(), p2.start(), p3.start()
+                p1.join(), p2.join(), p3.join()
+            else:
+                p1.start()
+                p1.join()
+        else:
+            # Stage 2 (sequential mood): Computing quality attributes
+            qmood_quality_attributes = DesignQualityAttributes(udb_path=udb_path)
+            arr[0] = qmood_quality_attributes.reusability
+            arr[1] = qmood_quality_attributes.understandability
+            arr[2] = qmood_quality_attributes.flexibility
+            arr[3] = qmood_quality_attributes.functionality
+            arr[4] = qmood_quality_attributes.effectiveness
+            arr[5] = qmood_quality_attributes.extendability
+            if self.n_obj == 8:
+                arr[6] = testability_main(udb_path, initial_value=config.CURRENT_METRICS.get("TEST", 1.0))
+                arr[7] = modularity_main(udb_path, initial_value=config.CURRENT_METRICS.get("MODULE", 1.0))
+
+            if self.verbose_design_metrics:
+                design_metrics = {
+                    "DSC": [qmood_quality_attributes.DSC],
+                    "NOH": [qmood_quality_attributes.NOH],
+                    "ANA": [qmood_quality_attributes.ANA],
+                    "MOA": [qmood_quality_attributes.MOA],
+                    "DAM": [qmood_quality_attributes.DAM],
+                    "CAMC": [qmood_quality_attributes.CAMC],
+                    "CIS": [qmood_quality_attributes.CIS],
+                    "NOM": [qmood_quality_attributes.NOM],
+                    "DCC": [qmood_quality_attributes.DCC],
+                    "MFA": [qmood_quality_attributes.MFA],
+                    "NOP": [qmood_quality_attributes.NOP]
+                }
+                self.log_design_metrics(design_metrics)
+
+            del qmood_quality_attributes
+
+        # Stage 3: Marshal objectives into vector
+        logger.info(f"Objective values for individual {k}: {[i for i in arr]}")
+        return [-1 * i for i in arr]
 
     def log_design_metrics(self, design_metrics):
         design_metrics_path = os.path.join(
@@ -917,6 +1193,19 @@ class LogCallback(Callback):
         # quit()
 
 
+def refactoring_sequence_key(sequence) -> tuple:
+    """
+
+    Returns the canonical key of a refactoring sequence, either an Individual or a plain list of
+    refactoring operations (e.g., the offsprings of `AdaptiveSinglePointCrossover`)
+
+    """
+
+    if isinstance(sequence, Individual):
+        return sequence.canonical_key
+    return tuple(ro.canonical_key for ro in sequence)
+
+
 # Calling the equal method of individual class
 def is_equal_2_refactorings_list(a, b):
     """
@@ -928,14 +1217,34 @@ def is_equal_2_refactorings_list(a, b):
 
     """
 
-    if len(a.X[0]) != len(b.X[0]):
-        return False
-    for i, ro in enumerate(a.X[0]):
-        if ro.name != b.X[0][i].name:
-            return False
-        if ro.params != b.X[0][i].params:
-            return False
-    return True
+    return refactoring_sequence_key(a.X[0]) == refactoring_sequence_key(b.X[0])
+
+
+class RefactoringSequenceDuplicateElimination(DuplicateElimination):
+    """
+
+    Removes the duplicate individuals from the population at each generation.
+    The individuals are compared by the canonical keys of their refactoring sequences (`refactoring_sequence_key`),
+    which are hashed once, i.e., O(P · L) instead of the O(P² · L) pairwise comparisons of
+    `ElementwiseDuplicateElimination` with `is_equal_2_refactorings_list`.
+    The keys of Individual objects and plain lists of refactoring operations are equal for equal sequences.
+
+    """
+
+    def _do(self, pop, other, is_duplicate):
+        keys = set()  # Canonical keys of the distinct individuals
+        if other is not None:
+            for ind in other:
+                keys.add(refactoring_sequence_key(ind.X[0]))
+
+        # The first occurrence of each individual is kept
+        for i, ind in enumerate(pop):
+            key = refactoring_sequence_key(ind.X[0])
+            if key in keys:
+                is_duplicate[i] = True
+            else:
+                keys.add(key)
+        return is_duplicate
 
 
 def binary_tournament(pop, P, **kwargs):
@@ -1047,6 +1356,41 @@ def log_project_info(reset_=True, design_metrics_path=None, quality_attributes_p
         df_design_metrics.to_csv(design_metrics_path, index=False)
 
 
+def create_objective_cache(namespace: str = '', mode: str = None):
+    """
+
+    Creates the persistent objective cache of the project if it is enabled in the configuration
+
+    Args:
+
+        namespace (str): The namespace of the problem, e.g., its class and number of objectives
+
+        mode (str): The mode of the problem, if any (e.g., 'single' or 'multi' for ProblemSingleObjective)
+
+    """
+
+    if not config.USE_OBJECTIVE_CACHE:
+        return None
+    if get_project_commit(config.PROJECT_PATH) == 'unknown':
+        # The cached values of other versions of the sources would be returned
+        logger.warning(f"The objective cache is disabled, {config.PROJECT_PATH} is not a git repository.")
+        return None
+    # The objective values depend on the normalization metrics and the metric and model versions
+    settings = {
+        'mode': mode,
+        'current_metrics': config.CURRENT_METRICS,
+        'qmood': qmood.__version__,
+        'modularity': modularity.__version__,
+        'testability': testability_model_fingerprint(),
+    }
+    return ObjectiveCache(
+        cache_path=config.OBJECTIVE_CACHE_PATH,
+        project_dir=config.PROJECT_PATH,
+        namespace=namespace,
+        settings=settings
+    )
+
+
 def main():
     """
 
@@ -1054,6 +1398,9 @@ def main():
 
     """
 
+    if config.PROFILING:
+        get_profiler().start(config.PROJECT_LOG_DIR, trace_format=config.PROFILING_FORMAT)
+
     # Define initialization objects
     initializer_class = SmellInitialization if config.WARM_START else RandomInitialization
     initializer_object = initializer_class(
@@ -1072,6 +1419,10 @@ def main():
             n_refactorings_lowerbound=config.LOWER_BAND,
             n_refactorings_upperbound=config.UPPER_BAND,
             evaluate_in_parallel=False,
+            mode='single',
+            objective_cache=create_objective_cache(f'single:{config.NUMBER_OBJECTIVES}', mode='single'),
+            prefix_trie_evaluation=config.PREFIX_TRIE_EVALUATION,
+            n_evaluation_workers=config.N_EVALUATION_WORKERS,
         )
     )
     problems.append(
@@ -1080,6 +1431,9 @@ def main():
             n_refactorings_lowerbound=config.LOWER_BAND,
             n_refactorings_upperbound=config.UPPER_BAND,
             evaluate_in_parallel=False,
+            objective_cache=create_objective_cache(f'multi:{config.NUMBER_OBJECTIVES}'),
+            prefix_trie_evaluation=config.PREFIX_TRIE_EVALUATION,
+            n_evaluation_workers=config.N_EVALUATION_WORKERS,
         )
     )
     problems.append(
@@ -1089,6 +1443,9 @@ def main():
             n_refactorings_upperbound=config.UPPER_BAND,
             evaluate_in_parallel=False,
             verbose_design_metrics=True,
+            objective_cache=create_objective_cache(f'many:{config.NUMBER_OBJECTIVES}'),
+            prefix_trie_evaluation=config.PREFIX_TRIE_EVALUATION,
+            n_evaluation_workers=config.N_EVALUATION_WORKERS,
         )
     )
 
@@ -1101,7 +1458,7 @@ def main():
         crossover=AdaptiveSinglePointCrossover(prob=config.CROSSOVER_PROBABILITY),
         # crossover=get_crossover("real_k_point", n_points=2),
         mutation=BitStringMutation(prob=config.MUTATION_PROBABILITY, initializer=initializer_object),
-        eliminate_duplicates=ElementwiseDuplicateElimination(cmp_func=is_equal_2_refactorings_list),
+        eliminate_duplicates=RefactoringSequenceDuplicateElimination(),
         n_gen=config.NGEN,
     )
     algorithms.append(alg1)
@@ -1113,7 +1470,7 @@ def main():
         crossover=AdaptiveSinglePointCrossover(prob=config.CROSSOVER_PROBABILITY),
         # crossover=get_crossover("real_k_point", n_points=2),
         mutation=BitStringMutation(prob=config.MUTATION_PROBABILITY, initializer=initializer_object),
-        eliminate_duplicates=ElementwiseDuplicateElimination(cmp_func=is_equal_2_refactorings_list),
+        eliminate_duplicates=RefactoringSequenceDuplicateElimination(),
         n_gen=config.NGEN,
     )
     algorithms.append(alg2)
@@ -1135,7 +1492,7 @@ def main():
         crossover=AdaptiveSinglePointCrossover(prob=config.CROSSOVER_PROBABILITY, ),
         # crossover=get_crossover("real_k_point", n_points=2),
         mutation=BitStringMutation(prob=config.MUTATION_PROBABILITY, initializer=initializer_object),
-        eliminate_duplicates=ElementwiseDuplicateElimination(cmp_func=is_equal_2_refactorings_list),
+        eliminate_duplicates=RefactoringSequenceDuplicateElimination(),
         n_gen=config.NGEN,
     )
     algorithms.append(alg3)
@@ -1173,6 +1530,11 @@ def main():
     logger.info(f"Execution time in seconds: {res.exec_time}")
     logger.info(f"Execution time in minutes: {res.exec_time / 60}")
     logger.info(f"Execution time in hours: {res.exec_time / (60 * 60)}")
+    if problems[config.PROBLEM].objective_cache is not None:
+        problems[config.PROBLEM].objective_cache.log_statistics()
+    get_understand_session(config.UDB_PATH).log_statistics()
+    if get_parse_tree_cache() is not None:
+        get_parse_tree_cache().log_statistics()
     # logger.info(f"Number of generations: {res.algorithm.n_gen}")
     # logger.info(f"Number of generations", res.algorithm.termination)
 
@@ -1294,6 +1656,10 @@ def main():
     except:
         logger.error("No multi-optimal solutions (error in computing high tradeoff points)!")
 
+    if config.PROFILING:
+        get_profiler().log_summary()
+        get_profiler().stop()
+
 
 # CodART search-based refactoring module main driver
 if __name__ == '__main__':
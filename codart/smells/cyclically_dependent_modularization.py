@@ -2,13 +2,13 @@
 
 
 """
-from codart.symbol_table import get_program, get_filenames_in_dir
+from codart.symbol_table import get_program_summary, get_filenames_in_dir
 
 
 class CyclicDependentModularization(object):
     def __init__(self, source_filenames: list):
         self.source_filenames = source_filenames
-        self.program = get_program(self.source_filenames)
+        self.program = get_program_summary(self.source_filenames)
 
     def check(self):
         super_classes = []
@@ -26,12 +26,8 @@ class CyclicDependentModularization(object):
                         class_item_dic = super_class
 
     def find_super_type(self, class_name):
-        for package_item in self.program.packages:
-            package_item_dic = self.program.packages[package_item]
-            for classes_item in package_item_dic.classes:
-                class_item_dic = package_item_dic.classes[classes_item]
-                if class_item_dic.name == class_name:
-                    return class_item_dic
+        classes = self.program.classes_named(class_name)
+        return classes[0] if classes else None
 
 
 
@@ -4,13 +4,42 @@ An implementation of simple symbol table for the following refactorings:
 2. `pullup_method`
 3.
 
+The symbols of each Java file are extracted once per file content by the process-wide `ProgramModel`
+(see `get_program_model`), and `get_program` and `get_objects` assemble the `Program` of a project snapshot
+from the cached symbols of its files. Only the files written since the previous call (e.g., by `Rewriter.apply`,
+a refactoring, or `git_restore`) are walked again. The symbols of a file version are cached as long as
+its parse tree is kept by the parse tree cache (`parse_tree_cache`). `Program` indexes its classes by name, long name,
+and supertype, such that the classes are looked up without iterating over all packages.
+
+The programs and their symbols are shared and must not be modified.
+
+Changelog:
+    version 0.3.4
+        1. ProgramModel keeps the symbols of a file version only while the parse tree cache keeps its parse tree,
+        which the symbols refer to (by their parser contexts), hence both share the memory budget of the cache.
+    version 0.3.3
+        1. parse_and_walk stages the rewritten text in a `RewriteTransaction` instead of writing the file,
+        if a transaction is given (`rewrite_transaction`).
+    version 0.3.2
+        1. parse_and_walk parses by the C++ parser if it is installed, or by the given backend (`parse_backend`).
+    version 0.3.1
+        1. Add summarize_file_symbols and get_program_summary, which parse the files in parallel and assemble
+        a program without parser contexts (`parallel_parsing`).
+    version 0.3.0
+        1. Add ProgramModel, which keeps the symbols of each file by content hash and the last assembled program.
+        2. Add the class name, long name, and supertype indices of Program.
+
 """
 
-__version__ = '0.2.0'
+__version__ = '0.3.4'
 __author__ = 'Morteza Zakeri'
 
+import copy
+import hashlib
 import os
 import re  # regular expressions
+import threading
+from collections import OrderedDict
 from typing import Dict, Any
 
 import antlr4
@@ -20,19 +49,83 @@ from antlr4.tree import Tree
 from antlr4 import FileStream, ParseTreeWalker, CommonTokenStream
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 
+from codart.learner.sbr_initializer.utils.utility import get_config_value
 from codart.utility.directory_utils import create_project_parse_tree
+from codart.utility.parse_tree_cache import parse_java_file, get_parse_tree_cache
+from codart.utility.parallel_parsing import parse_files
 from codart.gen.JavaParserLabeled import JavaParserLabeled as JavaParser
 from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener as JavaParserListener
 from codart.gen.JavaLexer import JavaLexer
 
 
+_program_model = None
+_program_model_lock = threading.Lock()
+
+
 class Program:
     def __init__(self):
         self.packages = {}
+        self._classes_by_name = None  # Simple name --> classes
+        self._classes_by_longname = None  # Long name (package.name) --> class
+        self._classes_by_supertype = None  # Superclass or superinterface name, as written --> classes
 
     def __str__(self):
         return str(self.packages)
 
+    def build_indices(self):
+        """
+        Indexes the classes of the program, in the order of `packages` and their `classes`.
+        The indices are built on first use, hence the packages must be complete before any lookup.
+        """
+        self._classes_by_name = {}
+        self._classes_by_longname = {}
+        self._classes_by_supertype = {}
+        for package_name, package in self.packages.items():
+            for class_name, _class in package.classes.items():
+                self._classes_by_name.setdefault(class_name, []).append(_class)
+                longname = f'{package_name}.{class_name}' if package_name else class_name
+                self._classes_by_longname[longname] = _class
+                supertypes = [_class.superclass_name] if _class.superclass_name is not None else []
+                for supertype in dict.fromkeys(supertypes + _class.superinterface_names):
+                    self._classes_by_supertype.setdefault(supertype, []).append(_class)
+
+    def classes_named(self, class_name: str) -> list:
+        """
+        Returns the classes with a simple name, in the program order
+        """
+        if self._classes_by_name is None:
+            self.build_indices()
+        return self._classes_by_name.get(class_name, [])
+
+    def get_class(self, class_longname: str):
+        """
+        Returns the class with a long name (package.name), or None
+        """
+        if self._classes_by_longname is None:
+            self.build_indices()
+        return self._classes_by_longname.get(class_longname)
+
+    def subtypes_of(self, *supertype_names: str) -> list:
+        """
+        Returns the classes extending or implementing any of the given types, in the program order.
+        The type names are matched as written in the extends and implements clauses (e.g., 'A' or 'p.A').
+        """
+        if self._classes_by_supertype is None:
+            self.build_indices()
+        if len(supertype_names) == 1:
+            return self._classes_by_supertype.get(supertype_names[0], [])
+        matched = set()
+        for supertype_name in supertype_names:
+            matched.update(id(_class) for _class in self._classes_by_supertype.get(supertype_name, []))
+        return [_class for package in self.packages.values() for _class in package.classes.values()
+                if id(_class) in matched]
+
+    def subclasses_of(self, *superclass_names: str) -> list:
+        """
+        Returns the classes extending any of the given classes, in the program order
+        """
+        return [_class for _class in self.subtypes_of(*superclass_names) if _class.superclass_name in superclass_names]
+
 
 class Package:
     def __init__(self):
@@ -95,6 +188,7 @@ class SingleFileElement:
         self.parser_context = parser_context
         self.filename = filename
         self.file_info = _file_info
+        self.offsets = None  # Token and character offsets of the elements of `program_from_summaries`
 
     def get_token_stream(self) -> CommonTokenStream:
         return self.parser_context.parser.getTokenStream()
@@ -117,6 +211,8 @@ class SingleFileElement:
         return last_terminal.getSymbol()
 
     def get_file_position_range(self) -> tuple:
+        if self.parser_context is None and self.offsets is not None:
+            return self.offsets[2], self.offsets[3]
         return self.get_first_symbol().start, self.get_last_symbol().stop
 
     def get_text_from_file(self, filename=None) -> str:
@@ -969,49 +1065,302 @@ class PreConditionListener(UtilsListener):
             self.can_convert = False
 
 
-def get_program(source_files: list, print_status=False) -> Program:
-    program = Program()
-    for filename in source_files:
+class FileSymbols:
+    """
+    The symbols of one version of a Java file, i.e., the package and objects declarations found by `UtilsListener`
+    """
+
+    def __init__(self, filename: str, digest: str, listener: UtilsListener):
+        self.filename = filename
+        self.digest = digest
+        self.package = listener.package
+        self.objects_declaration = listener.objects_declaration
+
+
+class ProgramModel:
+    """
+    Process-wide cache of the symbols of Java files keyed by file name and content hash,
+    and of the last program assembled from them.
+
+    The symbols refer to the parser contexts of their file, i.e., each cached file version pins a parse tree and
+    token stream. Therefore, the symbols of a file version are cached only while its parse tree is kept by the
+    parse tree cache, and are dropped when the parse tree is evicted (see `ParseTreeCache.add_eviction_listener`).
+    The symbols are not cached if the parse tree cache is disabled.
+    """
+
+    def __init__(self, max_files: int = 10000):
+        """
+        Args:
+            max_files (int): The maximum number of cached file versions (least recently used are evicted)
+        """
+        self.max_files = max_files
+        self.entries = OrderedDict()  # (file name, content hash) --> FileSymbols
+        self._keys_by_digest = dict()  # Content hash --> set of the keys of the entries
+        self.last_program_key = None
+        self.last_program = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    def file_symbols(self, filename: str, print_status=False) -> FileSymbols:
+        """
+        Returns the symbols of the current content of a file, walking its parse tree only if the content is new
+        """
+        with open(filename, mode='rb') as fp:
+            digest = hashlib.sha1(fp.read()).hexdigest()
+        key = (filename, digest)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
         if print_status:
             print("Parsing " + filename)
-        stream = FileStream(filename, encoding='utf8', errors='ignore')
-        lexer = JavaLexer(stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = JavaParser(token_stream)
-        tree = parser.compilationUnit()
+        token_stream, tree = parse_java_file(filename)
         listener = UtilsListener(filename)
-        walker = ParseTreeWalker()
-        walker.walk(listener, tree)
+        ParseTreeWalker().walk(listener, tree)
+        entry = FileSymbols(filename, digest, listener)
+        cache = get_parse_tree_cache()
+        if cache is None or not cache.contains(digest):
+            # The parse tree is not kept by the cache (disabled, or larger than its budget)
+            return entry
+        with self._lock:
+            self.entries[key] = entry
+            self._keys_by_digest.setdefault(digest, set()).add(key)
+            while len(self.entries) > self.max_files:
+                evicted_key, _ = self.entries.popitem(last=False)
+                self._discard_key(evicted_key)
+        if not cache.contains(digest):
+            # The parse tree was evicted meanwhile
+            self.evict_digest(digest)
+        return entry
+
+    def _discard_key(self, key):
+        keys = self._keys_by_digest.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_digest[key[1]]
+
+    def evict_digest(self, digest: str):
+        """
+        Drops the symbols of the file versions with a content hash, called when the parse tree cache evicts it
+        """
+        with self._lock:
+            for key in self._keys_by_digest.pop(digest, ()):
+                self.entries.pop(key, None)
 
-        listener_package_name = listener.package.name or ""
+    def get_program(self, source_files: list, print_status=False) -> Program:
+        """
+        Returns the program of the current version of the source files.
+        The same program (and indices) is returned as long as the source files and their contents do not change.
+        """
+        symbols = [self.file_symbols(filename, print_status=print_status) for filename in source_files]
+        program_key = tuple((entry.filename, entry.digest) for entry in symbols)
+        with self._lock:
+            if program_key == self.last_program_key:
+                return self.last_program
+
+        program = Program()
+        for entry in symbols:
+            package_name = entry.package.name or ""
+            if package_name not in program.packages:
+                # The package of the first file is copied, such that the cached symbols are not modified
+                package = copy.copy(entry.package)
+                package.classes = dict(entry.package.classes)
+                program.packages[package_name] = package
+            else:
+                program.packages[package_name].classes.update(entry.package.classes)
+
+        with self._lock:
+            self.last_program_key = program_key
+            self.last_program = program
+        return program
+
+    def get_objects(self, source_files: list) -> Dict[Any, Any]:
+        objects = {}
+        for filename in source_files:
+            entry = self.file_symbols(filename)
+            if entry.package.name not in objects:
+                objects[entry.package.name] = dict(entry.objects_declaration)
+            else:
+                objects[entry.package.name].update(entry.objects_declaration)
+        return objects
 
-        if not (listener_package_name in program.packages):
-            program.packages[listener_package_name] = listener.package
-        else:
-            for classes_name in listener.package.classes:
-                program.packages[listener_package_name].classes[classes_name] = listener.package.classes[classes_name]
-    return program
+    def invalidate(self, filenames: list):
+        """
+        Drops the last program if it contains any of the files, e.g., the files written by a refactoring.
+        The symbols of the previous contents of the files are kept, since `git_restore` writes them back.
+        """
+        filenames = set(filenames)
+        with self._lock:
+            if self.last_program_key is not None and any(key[0] in filenames for key in self.last_program_key):
+                self.last_program_key = None
+                self.last_program = None
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._keys_by_digest.clear()
+            self.last_program_key = None
+            self.last_program = None
+
+
+def get_program_model() -> ProgramModel:
+    """
+    Returns the program model of the current process
+    """
+    global _program_model
+    with _program_model_lock:
+        if _program_model is None:
+            max_files = get_config_value('Config', 'program_model_max_files', fallback=10000, value_type=int)
+            _program_model = ProgramModel(max_files=max_files)
+            cache = get_parse_tree_cache()
+            if cache is not None:
+                cache.add_eviction_listener(_program_model.evict_digest)
+        return _program_model
+
+
+def get_program(source_files: list, print_status=False) -> Program:
+    return get_program_model().get_program(source_files, print_status=print_status)
 
 
 def get_objects(source_files: str) -> Dict[Any, Any]:
-    objects = {}
-    for filename in source_files:
-        stream = FileStream(filename, encoding='utf8', errors='ignore')
-        lexer = JavaLexer(stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = JavaParser(token_stream)
-        tree = parser.compilationUnit()
-        listener = UtilsListener(filename)
-        walker = ParseTreeWalker()
-        walker.walk(listener, tree)
+    return get_program_model().get_objects(source_files)
+
+
+def _context_offsets(parser_context) -> tuple:
+    """
+    (first token index, last token index, first character index, last character index) of a parser context
+    """
+    stop = parser_context.stop if parser_context.stop is not None else parser_context.start
+    return parser_context.start.tokenIndex, stop.tokenIndex, parser_context.start.start, stop.stop
+
+
+def summarize_file_symbols(filename: str, token_stream: CommonTokenStream, tree) -> dict:
+    """
+    Extracts the symbols of a parsed Java file as plain (picklable) data, to be sent by the workers of
+    `parallel_parsing.parse_files`. The parser contexts are replaced by their token and character offsets.
+    """
+    listener = UtilsListener(filename)
+    ParseTreeWalker().walk(listener, tree)
+    package = listener.package
+    summary = {
+        'filename': filename,
+        'package': package.name,
+        'imports': [],
+        'classes': [],
+        'objects_declaration': listener.objects_declaration,
+    }
+    for _import in listener.file_info.all_imports:
+        summary['imports'].append({
+            'kind': 'package' if isinstance(_import, PackageImport) else 'class',
+            'package_name': _import.package_name,
+            'class_name': getattr(_import, 'class_name', None),
+            'offsets': _context_offsets(_import.parser_context),
+        })
+    for class_name, _class in package.classes.items():
+        class_summary = {
+            'name': class_name,
+            'modifiers': _class.modifiers,
+            'superclass_name': _class.superclass_name,
+            'superinterface_names': _class.superinterface_names,
+            'offsets': _context_offsets(_class.parser_context),
+            'fields': [],
+            'methods': [],
+        }
+        for field_name, field in _class.fields.items():
+            class_summary['fields'].append({
+                'name': field_name,
+                'datatype': field.datatype,
+                'initializer': field.initializer,
+                'modifiers': field.modifiers,
+                'neighbor_names': field.neighbor_names,
+                'index_in_variable_declarators': field.index_in_variable_declarators,
+                'offsets': _context_offsets(field.parser_context),
+            })
+        for method_key, method in _class.methods.items():
+            class_summary['methods'].append({
+                'key': method_key,
+                'name': method.name,
+                'returntype': method.returntype,
+                'parameters': method.parameters,
+                'modifiers': method.modifiers,
+                'body_text': method.body_text,
+                'is_constructor': method.is_constructor,
+                'offsets': _context_offsets(method.parser_context),
+            })
+        summary['classes'].append(class_summary)
+    return summary
+
+
+def program_from_summaries(summaries: list) -> Program:
+    """
+    Assembles a program from the summaries of its files (see `summarize_file_symbols`).
+    The elements of the program have no parser context, but the `offsets` of their declarations,
+    hence the program can be analyzed but not rewritten (use `get_program` for refactorings).
+    """
+    program = Program()
+    for summary in summaries:
+        filename = summary['filename']
+        package_name = summary['package']
+        file_info = FileInfo(filename=filename, package_name=package_name)
+        for import_summary in summary['imports']:
+            if import_summary['kind'] == 'package':
+                _import = PackageImport(package_name=import_summary['package_name'], filename=filename,
+                                        file_info=file_info)
+                file_info.package_imports.append(_import)
+            else:
+                _import = ClassImport(package_name=import_summary['package_name'],
+                                      class_name=import_summary['class_name'], filename=filename,
+                                      file_info=file_info)
+                file_info.class_imports.append(_import)
+            _import.offsets = import_summary['offsets']
+            file_info.all_imports.append(_import)
+
+        package = program.packages.get(package_name or "")
+        if package is None:
+            package = Package()
+            package.name = package_name
+            program.packages[package_name or ""] = package
+        for class_summary in summary['classes']:
+            _class = Class(name=class_summary['name'], package_name=package_name, filename=filename,
+                           file_info=file_info)
+            _class.modifiers = class_summary['modifiers']
+            _class.superclass_name = class_summary['superclass_name']
+            _class.superinterface_names = class_summary['superinterface_names']
+            _class.offsets = class_summary['offsets']
+            for field_summary in class_summary['fields']:
+                field = Field(datatype=field_summary['datatype'], name=field_summary['name'],
+                              initializer=field_summary['initializer'], package_name=package_name,
+                              class_name=_class.name, filename=filename, file_info=file_info)
+                field.modifiers = field_summary['modifiers']
+                field.neighbor_names = field_summary['neighbor_names']
+                field.index_in_variable_declarators = field_summary['index_in_variable_declarators']
+                field.offsets = field_summary['offsets']
+                _class.fields[field.name] = field
+            for method_summary in class_summary['methods']:
+                method = Method(returntype=method_summary['returntype'], name=method_summary['name'],
+                                body_text=method_summary['body_text'], package_name=package_name,
+                                class_name=_class.name, filename=filename, file_info=file_info)
+                method.modifiers = method_summary['modifiers']
+                method.parameters = method_summary['parameters']
+                method.is_constructor = method_summary['is_constructor']
+                method.offsets = method_summary['offsets']
+                _class.methods[method_summary['key']] = method
+            package.classes[_class.name] = _class
+    return program
 
-        if not (listener.package.name in objects):
-            objects[listener.package.name] = listener.objects_declaration
-        else:
-            for class_name in listener.objects_declaration:
-                objects[listener.package.name][class_name] = listener.objects_declaration[class_name]
 
-    return objects
+def get_program_summary(source_files: list, n_jobs: int = None) -> Program:
+    """
+    Returns the program of the source files, parsed in parallel (see `program_from_summaries`)
+    """
+    summaries = parse_files(source_files, summarize_file_symbols, n_jobs=n_jobs)
+    return program_from_summaries([summary for summary in summaries.values() if summary is not None])
 
 
 class Rewriter:
@@ -1051,6 +1400,7 @@ class Rewriter:
         self.get_token_stream_rewriter(tokens_info.token_stream).insertAfter(tokens_info.start, text)
 
     def apply(self):
+        written_filenames = []
         for token_stream in self.token_streams:
             (old_filename, token_stream_rewriter, new_filename) = self.token_streams[token_stream]
             new_filename = new_filename.replace("\\", "/")
@@ -1059,6 +1409,8 @@ class Rewriter:
                 os.makedirs(path)
             with open(new_filename, mode='w', encoding='utf-8', newline='') as file:
                 file.write(token_stream_rewriter.getDefaultText())
+            written_filenames.extend([old_filename, new_filename])
+        get_program_model().invalidate(written_filenames)
 
 
 def get_program_with_field_usage(source_files: list, field_name: str, source_class: str, print_status=False) -> Program:
@@ -1066,11 +1418,7 @@ def get_program_with_field_usage(source_files: list, field_name: str, source_cla
     for filename in source_files:
         if print_status:
             print("Parsing " + filename)
-        stream = FileStream(filename, encoding='utf8', errors='ignore')
-        lexer = JavaLexer(stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = JavaParser(token_stream)
-        tree = parser.compilationUnit()
+        token_stream, tree = parse_java_file(filename)
         listener = StaticFieldUsageListener(filename, field_name, source_class)
         walker = ParseTreeWalker()
         walker.walk(listener, tree)
@@ -1083,8 +1431,15 @@ def get_program_with_field_usage(source_files: list, field_name: str, source_cla
     return program
 
 
-def parse_and_walk(file_path: str, listener_class, has_write=False, debug=False, **kwargs):
-    tree, rewriter = create_project_parse_tree(file_path)
+def parse_and_walk(file_path: str, listener_class, has_write=False, debug=False, backend=None, transaction=None,
+                   **kwargs):
+    # The file is parsed by the C++ parser if it is installed, unless a backend is given (see `parse_backend`)
+    if transaction is not None:
+        # The staged text of the file is walked, and the rewritten text is staged until the transaction commits
+        token_stream, tree = transaction.parse(file_path)
+        rewriter = TokenStreamRewriter(token_stream)
+    else:
+        tree, rewriter = create_project_parse_tree(file_path, backend=backend)
     if has_write:
         if rewriter is None:
             raise Exception("Failed to create rewriter.")
@@ -1096,7 +1451,9 @@ def parse_and_walk(file_path: str, listener_class, has_write=False, debug=False,
     )
 
     if has_write:
-        if not debug:
+        if transaction is not None:
+            transaction.stage(file_path, listener.rewriter.getDefaultText())
+        elif not debug:
             with open(file_path, mode='w', encoding='utf-8', errors='ignore', newline='') as f:
                 f.write(listener.rewriter.getDefaultText())
         else:
@@ -1,27 +1,46 @@
 """
 Utilities related to project directory with memory monitoring and optimization.
+
+Changelog:
+    version 0.10.0
+        1. create_project_parse_tree parses by the C++ parser of java8speedy if it is installed (`parse_backend`).
+    version 0.9.0
+        1. The parallel_parsing attempts are replaced by `parallel_parsing`, which parses the files in worker
+        processes and returns the picklable results of an extractor instead of parse trees (`parallel_parsing`).
+    version 0.8.0
+        1. git_restore and update_understand_database are timed by the profiler when it is enabled (`profiling`).
+    version 0.7.0
+        1. git_restore restores only the files touched since the previous restore from an in-memory
+        pristine snapshot (`pristine_snapshot.PristineSnapshot`) and falls back to git if the tracking is lost.
+        2. The git safe directory is configured once per process and directory.
+        3. create_project_parse_tree reuses the parse trees cached by content hash (`parse_tree_cache`).
 """
 
 __author__ = 'Morteza Zakeri'
-__version__ = '0.5.2'
+__version__ = '0.10.0'
 
-import datetime
 import os
 import subprocess
 import psutil
 import gc
 import time
-from multiprocessing.dummy import Pool, Process, Manager
-from codart.learner.sbr_initializer.utils.utility import logger, config
+from codart.learner.sbr_initializer.utils.utility import logger, config, get_config_value
 from antlr4 import FileStream
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
-from joblib import Parallel, delayed
 
 import understand as und
 from antlr4 import FileStream, CommonTokenStream
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 from codart.gen.JavaLexer import JavaLexer
 from codart.gen.JavaParserLabeled import JavaParserLabeled
+from codart.utility.understand_session import get_understand_session, UNDERSTAND_SESSIONS
+from codart.utility.pristine_snapshot import get_pristine_snapshot, start_pristine_snapshot
+from codart.utility.parse_tree_cache import parse_java_file, parse_java_source
+from codart.utility.parallel_parsing import parse_files
+from codart.utility.profiling import profiled
+
+# Directories added to the git safe directories by the current process
+SAFE_DIRECTORIES = set()
 
 
 def log_memory_usage(stage_name, pid=None):
@@ -181,20 +200,22 @@ def run_subprocess_with_monitoring(cmd, cwd=None, timeout=3600, stage_name="subp
         force_cleanup()
 
 
+@profiled('git_restore', category='restore')
 def git_restore(project_dir: str = ""):
     """
     This function returns a git supported project back to the initial commit
     with comprehensive memory monitoring and error handling.
 
+    After the first restore with git, the files touched by the current process are tracked, and the next
+    restores only write back those files from memory (see `pristine_snapshot`). Set `fast_git_restore`
+    to False in the `Config` section of the configuration to always run git.
+
     Args:
         project_dir (str): The absolute path of project's directory.
 
     Returns:
         bool: True if successful, False otherwise
     """
-    logger.info(f"[GIT_RESTORE] Starting git restore for: {project_dir}")
-    log_memory_usage("Git restore start")
-
     # Validate input
     if not project_dir:
         logger.error("[GIT_RESTORE] No project directory provided")
@@ -204,13 +225,24 @@ def git_restore(project_dir: str = ""):
         logger.error(f"[GIT_RESTORE] Project directory does not exist: {project_dir}")
         return False
 
+    fast_git_restore = get_config_value('Config', 'fast_git_restore', fallback=True, value_type=bool)
+    if fast_git_restore:
+        git_root = get_git_root(project_dir)
+        snapshot = get_pristine_snapshot(git_root) if git_root is not None else None
+        if snapshot is not None and snapshot.restore():
+            return True
+
+    logger.info(f"[GIT_RESTORE] Starting git restore for: {project_dir}")
+    log_memory_usage("Git restore start")
+
     # Find actual git repository
     actual_project_dir = project_dir
     git_dir = os.path.join(project_dir, '.git')
 
     logger.debug(f"[GIT_RESTORE] Checking for git repository in: {project_dir}")
 
-    if not os.path.isdir(git_dir):
+    # '.git' is a file in git worktrees
+    if not os.path.exists(git_dir):
         logger.debug("[GIT_RESTORE] No .git directory found, checking subdirectories...")
 
         try:
@@ -228,7 +260,7 @@ def git_restore(project_dir: str = ""):
                 subdir_path = os.path.join(project_dir, subdir)
                 subdir_git = os.path.join(subdir_path, '.git')
 
-                if os.path.isdir(subdir_git):
+                if os.path.exists(subdir_git):
                     actual_project_dir = subdir_path
                     git_dir = subdir_git
                     git_found = True
@@ -282,6 +314,10 @@ def git_restore(project_dir: str = ""):
         logger.info(f"[GIT_RESTORE] Git restore completed successfully for {actual_project_dir}")
         log_memory_usage("Git restore completion")
 
+        if fast_git_restore:
+            # The project is at its baseline, so the next restores only need the touched files
+            start_pristine_snapshot(actual_project_dir)
+
         return True
 
     except Exception as e:
@@ -293,6 +329,29 @@ def git_restore(project_dir: str = ""):
         force_cleanup()
 
 
+def get_git_root(project_dir: str = ""):
+    """
+    Find the git repository of a project, either the project directory itself
+    or one of its direct subdirectories (the same lookup used by git_restore).
+
+    Args:
+        project_dir (str): The absolute path of project's directory.
+
+    Returns:
+        str: The repository directory or None if no repository is found
+    """
+    if not project_dir or not os.path.isdir(project_dir):
+        return None
+    # '.git' is a file in git worktrees
+    if os.path.exists(os.path.join(project_dir, '.git')):
+        return project_dir
+    for item in sorted(os.listdir(project_dir)):
+        item_path = os.path.join(project_dir, item)
+        if not item.startswith('.') and os.path.exists(os.path.join(item_path, '.git')):
+            return item_path
+    return None
+
+
 def configure_safe_directory(project_dir):
     """
     Configure git safe directory to avoid dubious ownership errors.
@@ -300,13 +359,25 @@ def configure_safe_directory(project_dir):
     Args:
         project_dir (str): Project directory to configure
     """
+    project_dir = os.path.abspath(project_dir)
+    if project_dir in SAFE_DIRECTORIES:
+        return
     try:
+        result = subprocess.run(
+            ["git", "config", "--global", "--get-all", "safe.directory"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        if project_dir in result.stdout.splitlines() or '*' in result.stdout.splitlines():
+            SAFE_DIRECTORIES.add(project_dir)
+            return
+
         success, result = run_subprocess_with_monitoring(
             ["git", "config", "--global", "--add", "safe.directory", project_dir],
             stage_name="git config safe directory"
         )
 
         if success:
+            SAFE_DIRECTORIES.add(project_dir)
             logger.debug(f"[GIT_RESTORE] Configured safe directory: {project_dir}")
         else:
             logger.debug(f"[GIT_RESTORE] Could not configure safe directory: {project_dir}")
@@ -374,10 +445,12 @@ def initialize_git_repository(project_dir):
 
 # Keep the rest of your existing functions but add memory monitoring to critical ones
 
+@profiled('update_understand_database', category='understand')
 def update_understand_database(udb_path):
     """
     This function updates database due to file changes with memory monitoring.
-    If any error, such as database is locked or read only, occurred it tries again.
+    The analysis is done by the Understand session of the database, which serializes the analyze requests,
+    retries on errors (such as database is locked or read only), and reports the latency of each call.
 
     Args:
         udb_path (str): The absolute path of understand database.
@@ -387,97 +460,19 @@ def update_understand_database(udb_path):
     """
     logger.info(f"[UDB_UPDATE] Starting database update: {udb_path}")
     log_memory_usage("UDB update start")
-
-    if not os.path.exists(udb_path):
-        logger.error(f"[UDB_UPDATE] Database file does not exist: {udb_path}")
-        return False
-
-    understand_6_cmd = ['und', 'analyze', '-changed', udb_path]
-    max_trials = 5
-    trials = 0
-
-    while trials < max_trials:
-        logger.debug(f"[UDB_UPDATE] Attempt {trials + 1}/{max_trials}")
-
-        success, result = run_subprocess_with_monitoring(
-            understand_6_cmd,
-            stage_name=f"und analyze (attempt {trials + 1})"
-        )
-
-        if success:
-            logger.info(f"[UDB_UPDATE] Database updated successfully after {trials + 1} attempts")
-            cleanup_understand_processes()
-            log_memory_usage("UDB update completion")
-            return True
-
-        trials += 1
-
-        if trials < max_trials:
-            logger.warning(f"[UDB_UPDATE] Attempt {trials} failed, retrying...")
-
-            # Try to close and reopen database
-            try:
-                db = und.open(udb_path)
-                db.close()
-                logger.debug("[UDB_UPDATE] Reopened database connection")
-            except Exception as e:
-                logger.debug(f"[UDB_UPDATE] Could not reopen database: {e}")
-
-            # Wait before retry
-            time.sleep(2)
-            force_cleanup()
-
-    logger.error(f"[UDB_UPDATE] Failed to update database after {max_trials} attempts")
-    cleanup_understand_processes()
-    return False
+    success = get_understand_session(udb_path).analyze(changed=True)
+    log_memory_usage("UDB update completion")
+    return success
 
 
 def cleanup_understand_processes():
     """
-    Clean up any lingering Understand processes to prevent memory leaks.
+    Clean up the lingering Understand processes started by this process to prevent memory leaks.
+    Understand processes of other jobs are not touched.
     """
     logger.debug("[CLEANUP] Cleaning up Understand processes")
-
-    commands_to_try = [
-        {
-            'check': ['which', 'pkill'],
-            'execute': ['pkill', '-f', 'und'],
-            'success_msg': 'Understand processes killed with pkill'
-        },
-        {
-            'check': ['which', 'killall'],
-            'execute': ['killall', 'und'],
-            'success_msg': 'Understand processes killed with killall'
-        }
-    ]
-
-    for cmd_info in commands_to_try:
-        try:
-            # Check if command exists
-            check_result = subprocess.run(
-                cmd_info['check'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-
-            if check_result.returncode == 0:
-                # Execute kill command
-                kill_result = subprocess.run(
-                    cmd_info['execute'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-
-                if kill_result.returncode == 0:
-                    logger.debug(f"[CLEANUP] {cmd_info['success_msg']}")
-                    break
-                else:
-                    logger.debug("[CLEANUP] No Understand processes found to kill")
-
-        except (subprocess.SubprocessError, FileNotFoundError, OSError) as e:
-            logger.debug(f"[CLEANUP] Kill command failed: {e}")
-            continue
-
+    for session in list(UNDERSTAND_SESSIONS.values()):
+        session.terminate()
     force_cleanup()
 
 
@@ -616,13 +611,9 @@ def update_understand_database2(udb_path):
         None
 
     """
-    understand_5_cmd = ['und', 'analyze', '-rescan', '-changed', udb_path]
-    understand_6_cmd = ['und', 'analyze', '-changed', udb_path]  # -rescan option is not required for understand >= 6.0
-
-    subprocess.Popen(
-        understand_6_cmd,
-        stdout=open(os.devnull, 'wb')
-    ).wait()
+    # understand_5_cmd = ['und', 'analyze', '-rescan', '-changed', udb_path]
+    # -rescan option is not required for understand >= 6.0
+    get_understand_session(udb_path).analyze(changed=True)
 
 
 def export_understand_dependencies_csv2(csv_path: str, db_path: str):
@@ -645,27 +636,15 @@ def export_understand_dependencies_csv(csv_path: str, db_path: str):
     """
     Exports understand dependencies into a csv file.
 
+    The export runs in the Understand session of the database, which terminates only its own `und` process
+    (on timeout), not the `und` processes of other jobs.
+
     :param csv_path: The absolute address of csv file to generate.
     :param db_path: The absolute address of project path.
     :return: None
     """
-    command = ['und', 'export', '-format', 'long', '-dependencies', 'class', 'csv', csv_path, db_path]
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    trials = 0
-    while result.returncode != 0:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        error_ = result.stderr.decode('utf-8')
-        logger.debug(f'return code: {result.returncode} msg: {error_}')
-        trials += 1
-        if trials > 5:
-            break
-    logger.debug("Modular dependency graph (MDG.csv) was exported.")
-    # Try to close und.exe process if it has not been killed automatically
-    result = subprocess.run(['taskkill', '/f', '/im', 'und.exe'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode != 0:
-        logger.debug('The und.exe process is not running')
-    else:
-        logger.debug('The und.exe process killed manually')
+    if get_understand_session(db_path).export_dependencies(csv_path):
+        logger.debug("Modular dependency graph (MDG.csv) was exported.")
 
 # -----------------------------------------------
 # trees = []
@@ -683,33 +662,31 @@ def get_java_files(directory):
                 # yield FileStream(os.path.join(root, file), encoding="utf8")
 
 
-def create_project_parse_tree(java_file_path):
+def create_project_parse_tree(java_file_path, backend=None):
     """
-    Creates a parse tree for a Java file using ANTLR4.
+    Creates a parse tree for a Java file using ANTLR4, by the C++ parser if it is installed (see `parse_backend`).
+    The token stream and parse tree are shared with the parse tree cache and must not be modified,
+    while the returned rewriter is created for each call.
 
     Args:
         java_file_path (str): Path to the Java file to parse
 
+        backend (str): 'cpp' or 'python' to parse the file by the given backend (without the cache),
+        the backend of the current process by default
+
     Returns:
         tuple: (parse_tree, token_stream_rewriter)
     """
     tree = None
     rewriter = None
     try:
-        # Create a file stream to read the Java file
-        file_stream = FileStream(java_file_path, encoding='utf-8', errors='ignore')
-
-        # Create a lexer that feeds off of the file stream
-        lexer = JavaLexer(file_stream)
-
-        # Create a token stream from the lexer
-        token_stream = CommonTokenStream(lexer)
-
-        # Create a parser that feeds off of the token stream
-        parser = JavaParserLabeled(token_stream)
-
-        # Begin parsing at the compilationUnit rule
-        tree = parser.compilationUnit()
+        # Lex and parse the Java file from the compilationUnit rule (unless its content is cached)
+        if backend is None:
+            token_stream, tree = parse_java_file(java_file_path)
+        else:
+            with open(java_file_path, mode='rb') as fp:
+                source = fp.read().decode('utf-8', errors='ignore')
+            token_stream, tree = parse_java_source(source, name=java_file_path, backend=backend)
 
         # Create a token stream rewriter for modifying the source code
         rewriter = TokenStreamRewriter(token_stream)
@@ -721,83 +698,30 @@ def create_project_parse_tree(java_file_path):
     return tree, rewriter
 
 
-# def create_project_parse_tree(java_file_path):
-#     tree = None
-#     rewriter = None
-#     try:
-#         file_stream = FileStream(java_file_path, encoding='utf-8', errors='ignore')
-#         # sa_javalabeled.USE_CPP_IMPLEMENTATION = config.USE_CPP_BACKEND
-#         # sa_javalabeled.USE_CPP_IMPLEMENTATION = 0
-#         tree = sa_javalabeled.parse(file_stream, 'compilationUnit')
-#         tokens = tree.parser.getInputStream()
-#         rewriter = TokenStreamRewriter(tokens)
-#     except Exception as e:
-#         print(f'Encounter a parsing error on file {java_file_path}')
-#         print(e)
-#     return tree, rewriter
-
-
-def parallel_parsing(directory):
-    trees = list()
-    input_files = [java_file for java_file in get_java_files(directory)]
-    # pool = Pool(processes=8)
-    # x = pool.apply_async(create_project_parse_tree, args=(input_files[0], trees))
-
-    # for java_file in get_java_files(directory):
-    #     res = pool.apply_async(create_project_parse_tree, (java_file,))  # runs in *only* one process
-    #     print(type(res.get(timeout=1)))  #
-
-    # num = Value('d', 0.0)
-    # arr = Array('i', range(500))
-    with Manager() as manager:
-        d = manager.dict()
-        q = manager.Queue(10)
-        p = Process(target=create_project_parse_tree, args=(input_files[0], q))
-        p.start()
-        p.join()
-        print(q)
-
-    # x.ready()
-    # print(len(x.get()))
-    # print(arr[0])
-
-
-def parallel_parsing2(directory):
-    for java_file in get_java_files(directory):
-        print(java_file)
-        p = Process(target=create_project_parse_tree, args=(java_file,))
-        p.start()
-        # p.join()
-
-
-def parallel_parsing3(directory):
-    d1 = datetime.datetime.now()
-    pool = Pool()
-    x = pool.map(create_project_parse_tree, get_java_files(directory))
-    d2 = datetime.datetime.now()
-    print(d2 - d1, len(x))
-    return x
+def parallel_parsing(directory, extractor, n_jobs=None):
+    """
+    Parses the Java files of a directory in parallel (see `parallel_parsing.parse_files`)
 
+    Args:
+        directory (str): Path to the project directory
 
-# @wrap_non_picklable_objects
-def parallel_parsing4(directory):
-    d1 = datetime.datetime.now()
-    res = Parallel(n_jobs=8, )(
-        delayed(create_project_parse_tree)(java_file) for java_file in get_java_files(directory)
-    )
-    print(res)
-    d2 = datetime.datetime.now()
-    print(d2 - d1)
-    return []
+        extractor (callable): A picklable callable, called with the path, token stream, and parse tree of each file,
+        which returns the picklable result of the file
+
+        n_jobs (int): The number of worker processes, `parsing_n_jobs` of the configuration by default
+
+    Returns:
+        dict: Maps each Java file to the result of the extractor (None if the file could not be parsed)
+    """
+    return parse_files(get_java_files(directory), extractor, n_jobs=n_jobs)
 
 
 def typical_parsing(directory):
-    d1 = datetime.datetime.now()
+    start_time = time.time()
     x = []
     for java_file in get_java_files(directory):
         x.append(create_project_parse_tree(java_file))
-    d2 = datetime.datetime.now()
-    print(d2 - d1, len(x))
+    print(time.time() - start_time, len(x))
     return x
 
 
@@ -812,11 +736,11 @@ def test_typyical_and_parallel_parsing():
     # directory = r'D:/IdeaProjects/104_vuze/'
     # directory = r'D:/IdeaProjects/Zarebin/'
 
-    # trees = parallel_parsing4(directory)
-    # trees = parallel_parsing3(directory)
+    from codart.symbol_table import summarize_file_symbols
+    start_time = time.time()
+    summaries = parallel_parsing(directory, summarize_file_symbols)
+    print(time.time() - start_time, len(summaries))
     trees = typical_parsing(directory)
-
-    # trees = typical_parsing(directory)
     print(f'parse successfully {len(trees)} trees')
 
 
@@ -0,0 +1,123 @@
+"""
+Parallel front end for parsing many Java files.
+
+ANTLR parse trees cannot be returned by worker processes, since they are not picklable (each context refers to
+its parser, token stream, and parent), which is why the former `parallel_parsing` attempts failed.
+Instead, each worker parses a chunk of the files and runs an extractor on the token stream and parse tree of
+each file, and only the results of the extractor are sent back. The result of an extractor must be picklable
+and should be compact, e.g., the names and token offsets of the classes, methods, and fields of a file
+(see `symbol_table.summarize_file_symbols`). The extractor itself must be picklable, i.e., a module-level
+function (or a `functools.partial` of one) called as `extractor(java_file_path, token_stream, parse_tree)`.
+
+The files are sorted by size and dealt to the chunks in turn, such that the chunks have similar parsing times.
+The number of workers is set by `parsing_n_jobs` in the `Config` section of the configuration
+(0, the default, uses all cores). The files are parsed in the current process (with the parse tree cache)
+if a single worker is used.
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.1.0'
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from codart.learner.sbr_initializer.utils.utility import logger, get_config_value
+from codart.utility.parse_tree_cache import parse_java_file, parse_java_source
+
+# Number of chunks per worker, more chunks balance the load better but send more messages
+CHUNKS_PER_WORKER = 4
+
+
+def get_parsing_n_jobs() -> int:
+    n_jobs = get_config_value('Config', 'parsing_n_jobs', fallback=0, value_type=int)
+    return n_jobs if n_jobs > 0 else (os.cpu_count() or 1)
+
+
+def extract_file(java_file_path: str, extractor, use_cache: bool = True):
+    """
+    Parses a Java file and returns the result of the extractor on its token stream and parse tree
+
+    Args:
+        java_file_path (str): Path to the Java file to parse
+
+        extractor (callable): Called with the path, token stream, and parse tree of the file
+
+        use_cache (bool): Whether the parse tree cache of the current process is used (not in workers)
+    """
+    if use_cache:
+        token_stream, tree = parse_java_file(java_file_path)
+    else:
+        with open(java_file_path, mode='rb') as fp:
+            source = fp.read().decode('utf-8', errors='ignore')
+        token_stream, tree = parse_java_source(source, name=java_file_path)
+    return extractor(java_file_path, token_stream, tree)
+
+
+def extract_chunk(java_file_paths: list, extractor, use_cache: bool = False) -> list:
+    """
+    Extracts the results of a chunk of files (executed in a worker process)
+
+    Returns:
+        list: (path, result, error) tuples, where the result is None and error is the message of the exception
+        if the file could not be parsed or extracted
+    """
+    rows = []
+    for java_file_path in java_file_paths:
+        try:
+            rows.append((java_file_path, extract_file(java_file_path, extractor, use_cache=use_cache), None))
+        except Exception as e:
+            rows.append((java_file_path, None, f'{type(e).__name__}: {e}'))
+    return rows
+
+
+def split_into_chunks(java_file_paths: list, n_chunks: int) -> list:
+    """
+    Deals the files, from the largest to the smallest, to `n_chunks` chunks in turn
+    """
+    def file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    chunks = [[] for _ in range(max(1, min(n_chunks, len(java_file_paths))))]
+    for i, path in enumerate(sorted(java_file_paths, key=file_size, reverse=True)):
+        chunks[i % len(chunks)].append(path)
+    return chunks
+
+
+def parse_files(java_file_paths, extractor, n_jobs: int = None) -> dict:
+    """
+    Parses Java files in parallel and returns the result of the extractor for each file
+
+    Args:
+        java_file_paths (iterable): Paths to the Java files
+
+        extractor (callable): A picklable callable, called with the path, token stream, and parse tree of each file
+
+        n_jobs (int): The number of worker processes, `parsing_n_jobs` of the configuration by default
+
+    Returns:
+        dict: Maps each path to the result of the extractor (None if the file could not be parsed),
+        in the order of the paths
+    """
+    java_file_paths = list(dict.fromkeys(java_file_paths))
+    n_jobs = min(n_jobs or get_parsing_n_jobs(), len(java_file_paths))
+    if n_jobs <= 1:
+        rows = extract_chunk(java_file_paths, extractor, use_cache=True)
+    else:
+        chunks = split_into_chunks(java_file_paths, n_jobs * CHUNKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            rows = list(itertools.chain.from_iterable(
+                executor.map(extract_chunk, chunks, itertools.repeat(extractor))
+            ))
+
+    results = dict.fromkeys(java_file_paths)
+    for java_file_path, result, error in rows:
+        if error is not None:
+            logger.error(f"[PARALLEL_PARSING] Cannot parse {java_file_path}: {error}")
+        results[java_file_path] = result
+    logger.debug(f"[PARALLEL_PARSING] Parsed {len(java_file_paths)} files with {max(n_jobs, 1)} workers")
+    return results
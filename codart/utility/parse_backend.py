@@ -0,0 +1,339 @@
+"""
+Selectable backend of the ANTLR parser of Java files.
+
+Both backends parse from the compilationUnit rule of the `JavaParserLabeled` grammar:
+
+1. `cpp`: the C++ parser of `java8speedy` (`speedy/src/java8speedy`, installed with `pip install ./speedy`),
+generated by speedy-antlr-tool from the same grammar.
+
+2. `python`: `JavaParserLabeled` on the ANTLR Python runtime.
+
+The C++ parser builds its parse tree from the context classes of `codart.gen.JavaParserLabeled`, hence the
+listeners, visitors, and context type checks of codart work on both trees. However, it does not translate its
+token stream (the whitespace and comment tokens are missing and `ctx.parser` is None). Therefore, the token
+stream is rebuilt from the tokens of the tree and the hidden tokens between them (split as `JavaLexer` does),
+such that the token indices are those of the C++ lexer, and the contexts are bound to a Python parser on the
+token stream. `TokenStreamRewriter` works unchanged on the rebuilt token stream. The file is lexed and parsed
+by the Python backend if the tokens of the C++ parse tree and the rebuilt token stream do not agree.
+
+The Python modules of `java8speedy` are generated for an older ANTLR runtime and are not imported,
+only its compiled extension (`sa_javalabeled_cpp_parser`) is loaded.
+
+The backend is set by `parse_backend` in the `Config` section of the configuration: `auto` (the default,
+`cpp` if the C++ parser is installed and `python` otherwise), `cpp`, or `python`. The `USE_CPP_BACKEND`
+environment variable of the search-based refactoring (see `codart.config`), if it is set, overrides it
+(1: `cpp`, 0: `python`).
+
+Changelog:
+    version 0.2.1
+        1. `parse_compilation_unit` collects the syntax errors of both backends, such that a validated text is
+        parsed once (and its parse tree is cached, see `parse_tree_cache.parse_java_content`).
+    version 0.2.0
+        1. Add `find_syntax_errors`, e.g., to validate the rewritten texts of a refactoring before they are written.
+        2. Files whose C++ parse tree cannot be translated (some files with syntax errors) are parsed by Python.
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.2.1'
+
+import bisect
+import importlib.machinery
+import importlib.util
+import os
+import re
+import sys
+import threading
+
+from antlr4 import InputStream, CommonTokenStream, Token
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.Token import CommonToken
+from antlr4.tree.Tree import TerminalNode
+
+from codart.gen.JavaLexer import JavaLexer
+from codart.gen.JavaParserLabeled import JavaParserLabeled
+from codart.learner.sbr_initializer.utils.utility import logger, get_config_value
+
+PARSE_BACKENDS = ('auto', 'cpp', 'python')
+CPP_PARSER_MODULE = 'java8speedy.parser.sa_javalabeled_cpp_parser'
+
+# The hidden tokens of JavaLexer (WS, COMMENT, and LINE_COMMENT), which are not in the C++ parse tree
+HIDDEN_TOKEN_PATTERN = re.compile(r'(?P<WS>[ \t\r\n\u000C]+)|(?P<COMMENT>/\*.*?\*/)|(?P<LINE_COMMENT>//[^\r\n]*)', re.S)
+HIDDEN_TOKEN_TYPES = {'WS': JavaLexer.WS, 'COMMENT': JavaLexer.COMMENT, 'LINE_COMMENT': JavaLexer.LINE_COMMENT}
+
+_cpp_parser = None  # The extension module, False if it is not installed
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class BackendMismatchError(Exception):
+    """
+    The tokens of the C++ parse tree do not agree with the Python token stream
+    """
+    pass
+
+
+class SyntaxErrorCollector(ErrorListener):
+    """
+    Collects the syntax errors of the Python lexer and parser
+    """
+
+    def __init__(self, errors: list = None):
+        self.errors = errors if errors is not None else []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append(f'line {line}:{column} {msg}')
+
+
+class CppSyntaxErrorCollector:
+    """
+    Collects the syntax errors of the C++ lexer and parser (the callback of `SA_ErrorListener` of speedy-antlr-tool)
+    """
+
+    def __init__(self, errors: list = None):
+        self.errors = errors if errors is not None else []
+
+    def syntaxError(self, input_stream, offendingSymbol, char_index, line, column, msg):
+        self.errors.append(f'line {line}:{column} {msg}')
+
+
+def load_cpp_parser():
+    """
+    Returns the extension module of the C++ parser, or None if `java8speedy` is not installed
+    """
+    global _cpp_parser
+    if _cpp_parser is not None:
+        return _cpp_parser or None
+    module = sys.modules.get(CPP_PARSER_MODULE)
+    if module is None:
+        try:
+            spec = importlib.util.find_spec('java8speedy')
+        except (ImportError, ValueError):
+            spec = None
+        locations = spec.submodule_search_locations if spec is not None else None
+        for location in locations or []:
+            for suffix in importlib.machinery.EXTENSION_SUFFIXES:
+                path = os.path.join(location, 'parser', 'sa_javalabeled_cpp_parser' + suffix)
+                if not os.path.isfile(path):
+                    continue
+                try:
+                    loader = importlib.machinery.ExtensionFileLoader(CPP_PARSER_MODULE, path)
+                    module_spec = importlib.util.spec_from_file_location(CPP_PARSER_MODULE, path, loader=loader)
+                    module = importlib.util.module_from_spec(module_spec)
+                    loader.exec_module(module)
+                except ImportError as e:
+                    logger.warning(f"[PARSE_BACKEND] Cannot load the C++ parser {path}: {e}")
+                    module = None
+                    continue
+                sys.modules[CPP_PARSER_MODULE] = module
+                break
+            if module is not None:
+                break
+    _cpp_parser = module if module is not None else False
+    return module
+
+
+def get_parse_backend() -> str:
+    """
+    Returns the backend of the current process, 'cpp' or 'python' (see the module documentation)
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend = get_config_value('Config', 'parse_backend', fallback='auto').strip().lower()
+            use_cpp_backend = os.environ.get('USE_CPP_BACKEND', '').strip()
+            if use_cpp_backend:
+                backend = 'cpp' if use_cpp_backend != '0' else 'python'
+            if backend not in PARSE_BACKENDS:
+                logger.warning(f"[PARSE_BACKEND] Unknown parse backend {backend}, expected one of {PARSE_BACKENDS}")
+                backend = 'auto'
+            if backend != 'python' and load_cpp_parser() is None:
+                if backend == 'cpp':
+                    logger.warning("[PARSE_BACKEND] The C++ parser (java8speedy) is not installed, "
+                                   "the Python parser is used")
+                backend = 'python'
+            _backend = 'cpp' if backend != 'python' else 'python'
+            logger.debug(f"[PARSE_BACKEND] Java files are parsed by the {_backend} backend")
+        return _backend
+
+
+def set_parse_backend(backend: str):
+    """
+    Sets the backend of the current process, e.g., to compare the backends ('auto', 'cpp', or 'python')
+    """
+    global _backend
+    if backend not in PARSE_BACKENDS:
+        raise ValueError(f"Unknown parse backend {backend}, expected one of {PARSE_BACKENDS}")
+    if backend != 'python' and load_cpp_parser() is None:
+        if backend == 'cpp':
+            raise ImportError("The C++ parser (java8speedy) is not installed")
+        backend = 'python'
+    with _backend_lock:
+        _backend = 'cpp' if backend != 'python' else 'python'
+
+
+def parse_compilation_unit(token_stream, backend: str = None, syntax_errors: list = None):
+    """
+    Parses the compilationUnit rule from the token stream of a `JavaLexer`
+
+    Args:
+        token_stream (CommonTokenStream): The (unfilled) token stream, which is filled by both backends
+
+        backend (str): 'cpp' or 'python', the backend of the current process by default
+
+        syntax_errors (list): If given, the messages of the syntax errors ('line <line>:<column> <message>')
+        are appended to it instead of being printed
+
+    Returns:
+        JavaParserLabeled.CompilationUnitContext: The parse tree, whose parser is on the token stream
+    """
+    if (backend or get_parse_backend()) == 'cpp' and not token_stream.tokens:
+        try:
+            return parse_compilation_unit_cpp(token_stream, syntax_errors=syntax_errors)
+        except (BackendMismatchError, RuntimeError) as e:
+            # The C++ parser fails to translate the error nodes of some files with syntax errors
+            logger.warning(f"[PARSE_BACKEND] {e}, the file is parsed by the Python parser")
+            token_stream.setTokenSource(token_stream.tokenSource)
+            if syntax_errors is not None:
+                del syntax_errors[:]  # Reported again by the Python parser
+
+    parser = JavaParserLabeled(token_stream)
+    if syntax_errors is not None:
+        collector = SyntaxErrorCollector(syntax_errors)
+        for recognizer in (token_stream.tokenSource, parser):
+            recognizer.removeErrorListeners()
+            recognizer.addErrorListener(collector)
+    return parser.compilationUnit()
+
+
+def find_syntax_errors(source: str, name: str = '<string>', backend: str = None) -> list:
+    """
+    Parses Java source code from the compilationUnit rule and returns its syntax errors
+
+    Args:
+        source (str): The Java source code
+
+        name (str): The name of the source, e.g., the path of the file
+
+        backend (str): 'cpp' or 'python', the backend of the current process by default
+
+    Returns:
+        list: The messages of the syntax errors ('line <line>:<column> <message>'), empty if the source parses
+    """
+    input_stream = InputStream(source)
+    input_stream.name = name
+    if (backend or get_parse_backend()) == 'cpp':
+        collector = CppSyntaxErrorCollector()
+        try:
+            load_cpp_parser().do_parse(JavaParserLabeled, input_stream, 'compilationUnit', collector)
+        except RuntimeError:
+            # The parse tree of a source with syntax errors may not be translated (the errors are reported before)
+            if not collector.errors:
+                raise
+        return collector.errors
+
+    collector = SyntaxErrorCollector()
+    lexer = JavaLexer(input_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(collector)
+    parser = JavaParserLabeled(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(collector)
+    parser.compilationUnit()
+    return collector.errors
+
+
+def parse_compilation_unit_cpp(token_stream, syntax_errors: list = None):
+    """
+    Parses the input of a token stream by the C++ parser, and fills the token stream with the tokens of the
+    parse tree and the hidden tokens between them (the syntax errors are appended to `syntax_errors`, if given)
+    """
+    cpp_parser = load_cpp_parser()
+    if cpp_parser is None:
+        raise ImportError("The C++ parser (java8speedy) is not installed")
+    lexer = token_stream.tokenSource
+    collector = CppSyntaxErrorCollector(syntax_errors) if syntax_errors is not None else None
+    tree = cpp_parser.do_parse(JavaParserLabeled, lexer.inputStream, 'compilationUnit', collector)
+    token_stream.tokens = bind_tree(tree, lexer, JavaParserLabeled(token_stream))
+    token_stream.fetchedEOF = True
+    return tree
+
+
+def bind_tree(tree, lexer, parser) -> list:
+    """
+    Binds a parse tree translated from C++ to the Python lexer and parser:
+    the tokens get the source of the lexer, the contexts get the parser, and the empty contexts get the
+    start and stop tokens of the Python parser (the tokens after and before the context, respectively).
+
+    Returns:
+        list: All tokens of the input, i.e., the tokens of the tree and the hidden tokens between them,
+        in the order of the token indices of the C++ lexer
+    """
+    source_pair = lexer._tokenFactorySourcePair
+    text = lexer.inputStream.strdata
+    newlines = [i for i, c in enumerate(text) if c == '\n']
+    tokens = []
+    last_token = None  # The last (non-EOF) token of the visited terminals
+    pending_starts = []  # The empty contexts before the next terminal
+    stack = [(tree, False)]
+    while stack:
+        node, is_exit = stack.pop()
+        if is_exit:
+            if node.stop is None:
+                node.stop = last_token
+            continue
+
+        if isinstance(node, TerminalNode):
+            token = node.symbol
+            if token.tokenIndex != len(tokens):
+                # The token is either conjured by the error recovery (with index -1) or preceded by hidden tokens
+                if token.tokenIndex < 0:
+                    continue
+                previous_stop = tokens[-1].stop if tokens else -1
+                _append_hidden_tokens(tokens, text, previous_stop + 1, token.start, source_pair, newlines)
+                if token.tokenIndex != len(tokens):
+                    raise BackendMismatchError(f"The token {token.tokenIndex} of the C++ parser does not follow "
+                                               f"{len(tokens)} tokens in {lexer.inputStream.name}")
+            token.source = source_pair
+            tokens.append(token)
+            for context in pending_starts:
+                context.start = token
+            pending_starts.clear()
+            if token.type != Token.EOF:
+                last_token = token
+            continue
+
+        node.parser = parser
+        if node.start is None:
+            pending_starts.append(node)
+        stack.append((node, True))
+        if node.children:
+            stack.extend((child, False) for child in reversed(node.children))
+
+    if not tokens or tokens[-1].type != Token.EOF:
+        raise BackendMismatchError(f"The C++ parse tree of {lexer.inputStream.name} does not end with EOF")
+    return tokens
+
+
+def _append_hidden_tokens(tokens: list, text: str, start: int, stop: int, source_pair: tuple, newlines: list):
+    """
+    Splits text[start:stop] to whitespace and comment tokens (the hidden tokens of JavaLexer)
+    """
+    while start < stop:
+        match = HIDDEN_TOKEN_PATTERN.match(text, start, stop)
+        if match is None:
+            raise BackendMismatchError(f"Unexpected characters {text[start:min(stop, start + 20)]!r} "
+                                       f"between the tokens of the C++ parser")
+        token = CommonToken.__new__(CommonToken)
+        token.source = source_pair
+        token.type = HIDDEN_TOKEN_TYPES[match.lastgroup]
+        token.channel = Token.HIDDEN_CHANNEL
+        token.start = start
+        token.stop = match.end() - 1
+        token.tokenIndex = len(tokens)
+        line_index = bisect.bisect_left(newlines, start)
+        token.line = line_index + 1
+        token.column = start - newlines[line_index - 1] - 1 if line_index > 0 else start
+        token._text = None
+        tokens.append(token)
+        start = match.end()
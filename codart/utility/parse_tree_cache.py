@@ -0,0 +1,240 @@
+"""
+Project-wide cache of the token streams and parse trees of Java files.
+
+Each refactoring lexes and parses the Java files it visits with the ANTLR `JavaParserLabeled`, often several
+times per refactoring operation and again for each individual of the search. The cache keeps the token
+stream and parse tree of each parsed file, keyed by the hash of the file content:
+
+1. A file rewritten by a refactoring has a new content hash, therefore a stale parse tree is never returned.
+The parse trees of the previous contents stay in the cache, such that files restored to the initial commit
+(`git_restore`) are not parsed again.
+
+2. The least recently used entries are evicted once the estimated size of the cached parse trees
+exceeds the memory budget (`parse_cache_memory_mb` in the `Config` section of the configuration,
+0 disables the cache).
+
+The cached token streams and parse trees are shared and must not be modified. Each caller creates its own
+`TokenStreamRewriter` on the cached token stream (see `create_project_parse_tree`).
+
+Each parse (cache miss) is timed by the profiler when it is enabled (see `profiling`).
+
+The files are parsed by the C++ parser of `java8speedy` if it is installed, otherwise by the Python parser
+(see `parse_backend`).
+
+Changelog:
+    version 0.3.2
+        1. The syntax errors of each parsed content are cached with its parse tree, such that the rewritten texts
+        of a `RewriteTransaction` are validated and then reused by the same (single) parse.
+    version 0.3.1
+        1. Add eviction listeners, which drop the data pinning the evicted parse trees (e.g., the symbols of
+        `symbol_table.ProgramModel`), such that they share the memory budget of the cache.
+    version 0.3.0
+        1. The contents of files which are not written yet (e.g., staged by a `RewriteTransaction`) are cached,
+        see `parse_java_content`.
+    version 0.2.0
+        1. parse_java_source parses by the backend of `parse_backend` (C++ if java8speedy is installed).
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.3.2'
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from antlr4 import InputStream, CommonTokenStream
+
+from codart.gen.JavaLexer import JavaLexer
+from codart.learner.sbr_initializer.utils.utility import logger, get_config_value
+from codart.utility.parse_backend import parse_compilation_unit
+from codart.utility.profiling import profiled
+
+# Estimated memory of the token stream and parse tree per byte of Java source (measured on JSON)
+PARSE_TREE_BYTES_PER_SOURCE_BYTE = 100
+
+_parse_tree_cache = None
+_parse_tree_cache_lock = threading.Lock()
+
+
+class ParseTreeCache:
+    """
+    LRU cache of (token stream, parse tree) pairs keyed by the content hash of Java files
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): The memory budget of the cached parse trees (estimated)
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # Content hash --> (token stream, parse tree, estimated size, syntax errors)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.eviction_listeners = []  # Called with the content hash of each evicted entry
+        self._lock = threading.RLock()
+
+    def add_eviction_listener(self, listener):
+        """
+        Registers a callable, called with the content hash of each entry evicted from (or cleared in) the cache
+        """
+        with self._lock:
+            if listener not in self.eviction_listeners:
+                self.eviction_listeners.append(listener)
+
+    def contains(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self.entries
+
+    def _notify_evictions(self, digests: list):
+        for listener in list(self.eviction_listeners):
+            for digest in digests:
+                listener(digest)
+
+    def parse(self, java_file_path: str):
+        """
+        Returns the token stream and parse tree of a Java file, parsing the file only if its content is not cached
+
+        Args:
+            java_file_path (str): Path to the Java file to parse
+
+        Returns:
+            tuple: (common_token_stream, parse_tree)
+        """
+        with open(java_file_path, mode='rb') as fp:
+            content = fp.read()
+        return self.parse_content(content, name=java_file_path)
+
+    def parse_content(self, content: bytes, name: str = '<string>', syntax_errors: list = None):
+        """
+        Returns the token stream and parse tree of the content of a Java file, parsing it only if it is not cached
+
+        Args:
+            content (bytes): The content of the Java file (UTF-8)
+
+            name (str): The name of the content, e.g., the path of the file
+
+            syntax_errors (list): If given, the messages of the syntax errors of the content are appended to it
+
+        Returns:
+            tuple: (common_token_stream, parse_tree)
+        """
+        digest = hashlib.sha1(content).hexdigest()
+
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                if syntax_errors is not None:
+                    syntax_errors.extend(entry[3])
+                return entry[0], entry[1]
+            self.misses += 1
+
+        errors = []
+        token_stream, tree = parse_java_source(content.decode('utf-8', errors='ignore'), name=name,
+                                               syntax_errors=errors)
+        if syntax_errors is not None:
+            syntax_errors.extend(errors)
+        estimated_size = len(content) * PARSE_TREE_BYTES_PER_SOURCE_BYTE
+        if estimated_size > self.max_bytes:
+            return token_stream, tree
+
+        evicted_digests = []
+        with self._lock:
+            if digest not in self.entries:
+                self.entries[digest] = (token_stream, tree, estimated_size, errors)
+                self.size += estimated_size
+                while self.size > self.max_bytes:
+                    evicted_digest, (_, _, evicted_size, _) = self.entries.popitem(last=False)
+                    evicted_digests.append(evicted_digest)
+                    self.size -= evicted_size
+                    self.evictions += 1
+        self._notify_evictions(evicted_digests)
+        return token_stream, tree
+
+    def clear(self):
+        with self._lock:
+            evicted_digests = list(self.entries)
+            self.entries.clear()
+            self.size = 0
+        self._notify_evictions(evicted_digests)
+
+    def log_statistics(self):
+        total = self.hits + self.misses
+        hit_ratio = self.hits / total if total > 0 else 0.
+        logger.info(f"[PARSE_CACHE] Parse tree cache hits: {self.hits}, misses: {self.misses}, "
+                    f"hit ratio: {hit_ratio:.3f}, evictions: {self.evictions}, "
+                    f"entries: {len(self.entries)} (~{self.size / (1024 * 1024):.1f} MB)")
+
+
+@profiled('antlr_parse', category='parsing')
+def parse_java_source(source: str, name: str = '<string>', backend: str = None, syntax_errors: list = None):
+    """
+    Lexes and parses Java source code from the compilationUnit rule
+
+    Args:
+        source (str): The Java source code
+
+        name (str): The name of the source, e.g., the path of the file
+
+        backend (str): 'cpp' or 'python', the parse backend of the current process by default
+
+        syntax_errors (list): If given, the messages of the syntax errors are appended to it
+
+    Returns:
+        tuple: (common_token_stream, parse_tree)
+    """
+    input_stream = InputStream(source)
+    input_stream.name = name
+    token_stream = CommonTokenStream(JavaLexer(input_stream))
+    tree = parse_compilation_unit(token_stream, backend=backend, syntax_errors=syntax_errors)
+    return token_stream, tree
+
+
+def get_parse_tree_cache():
+    """
+    Returns the parse tree cache of the current process, or None if the cache is disabled
+    """
+    global _parse_tree_cache
+    with _parse_tree_cache_lock:
+        if _parse_tree_cache is None:
+            memory_mb = get_config_value('Config', 'parse_cache_memory_mb', fallback=1024, value_type=int)
+            if memory_mb <= 0:
+                return None
+            _parse_tree_cache = ParseTreeCache(max_bytes=memory_mb * 1024 * 1024)
+        return _parse_tree_cache
+
+
+def parse_java_file(java_file_path: str):
+    """
+    Returns the (shared) token stream and parse tree of a Java file, from the cache if possible
+
+    Returns:
+        tuple: (common_token_stream, parse_tree)
+    """
+    cache = get_parse_tree_cache()
+    if cache is not None:
+        return cache.parse(java_file_path)
+    with open(java_file_path, mode='rb') as fp:
+        source = fp.read().decode('utf-8', errors='ignore')
+    return parse_java_source(source, name=java_file_path)
+
+
+def parse_java_content(content: bytes, name: str = '<string>', syntax_errors: list = None):
+    """
+    Returns the (shared) token stream and parse tree of the content of a Java file, from the cache if possible
+
+    Args:
+        syntax_errors (list): If given, the messages of the syntax errors of the content are appended to it
+
+    Returns:
+        tuple: (common_token_stream, parse_tree)
+    """
+    cache = get_parse_tree_cache()
+    if cache is not None:
+        return cache.parse_content(content, name=name, syntax_errors=syntax_errors)
+    return parse_java_source(content.decode('utf-8', errors='ignore'), name=name, syntax_errors=syntax_errors)
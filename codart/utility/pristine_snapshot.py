@@ -0,0 +1,250 @@
+"""
+In-memory pristine snapshot of a project, used by `git_restore` to restore the touched files without git.
+
+After the project is restored to its baseline (initial commit) once, the snapshot tracks every file touched
+by the current process below the repository directory. Refactoring writers, `TokenStreamRewriter` outputs
+written to files, file removals and renames, and new directories are recorded with a Python audit hook
+(`sys.addaudithook`), so no refactoring module needs to be changed. The baseline content of each file is
+copied to memory just before its first modification (copy-on-write), and restoring the project writes back
+only the touched files and removes the files and directories created since the baseline.
+
+The tracking is lost, and `git_restore` falls back to git, if recording a touched file fails, the
+pristine contents exceed the memory budget, or `invalidate` is called.
+
+The audit hook only sees the writes of the current process, not those of subprocesses (e.g., a formatter or
+build tool run by a refactoring). Therefore, each restore is verified with `git status --porcelain`, and the
+tracking is lost (`git_restore` falls back to git) if the working tree still differs from the baseline.
+
+Changelog:
+    version 0.1.1
+        1. Verify each restore with `git status --porcelain`, such that the files changed by other processes
+        are restored by git.
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.1.1'
+
+import os
+import subprocess
+import sys
+import threading
+
+from codart.learner.sbr_initializer.utils.utility import logger
+
+# Normalized repository directory --> PristineSnapshot
+PRISTINE_SNAPSHOTS = dict()
+
+_WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+_WATCHED_EVENTS = {'open', 'os.remove', 'os.rename', 'os.mkdir', 'os.truncate', 'shutil.rmtree'}
+_hook_state = threading.local()
+_hook_installed = False
+
+
+def _audit_hook(event, args):
+    if event not in _WATCHED_EVENTS or not PRISTINE_SNAPSHOTS or getattr(_hook_state, 'suspended', False):
+        return
+    if event == 'open':
+        path, mode, flags = args
+        if mode is not None:
+            if not any(c in mode for c in 'wax+'):
+                return
+        elif not (flags or 0) & _WRITE_FLAGS:
+            return
+        paths = [path]
+    elif event == 'os.rename':
+        paths = [args[0], args[1]]
+        if not isinstance(args[0], int) and os.path.isdir(args[0]):
+            # The files below the destination of a renamed directory are not known individually
+            event = 'os.rename.dir'
+    else:
+        paths = [args[0]]
+
+    _hook_state.suspended = True
+    try:
+        for path in paths:
+            if isinstance(path, int):  # File descriptor
+                continue
+            path = os.path.abspath(os.fsdecode(path))
+            for snapshot in list(PRISTINE_SNAPSHOTS.values()):
+                if snapshot.contains(path):
+                    if event == 'os.rename.dir':
+                        snapshot.invalidate(f"({path} is a renamed directory)")
+                    else:
+                        snapshot.touch(path, event)
+    finally:
+        _hook_state.suspended = False
+
+
+def _install_audit_hook():
+    global _hook_installed
+    if not _hook_installed:
+        sys.addaudithook(_audit_hook)
+        _hook_installed = True
+
+
+class PristineSnapshot:
+    """
+    The baseline content of the files touched in a repository directory
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            root_dir (str): The absolute path of the repository directory, which must be at its baseline
+            max_bytes (int): The memory budget of the pristine contents
+        """
+        self.root_dir = os.path.normpath(os.path.abspath(root_dir))
+        self.max_bytes = max_bytes
+        self.pristine_contents = dict()  # Absolute path --> baseline content (None if the file did not exist)
+        self.pristine_bytes = 0
+        self.touched_files = set()
+        self.created_dirs = set()
+        self.lost = False
+        self.restores = 0
+        self._lock = threading.RLock()
+
+    def contains(self, path):
+        if not path.startswith(self.root_dir + os.sep):
+            return False
+        relative_path = path[len(self.root_dir) + 1:]
+        return relative_path != '.git' and not relative_path.startswith('.git' + os.sep)
+
+    def touch(self, path, event='open'):
+        """
+        Records a file or directory which is about to be changed
+        """
+        with self._lock:
+            if self.lost:
+                return
+            try:
+                if event == 'os.mkdir':
+                    if not os.path.exists(path):
+                        self.created_dirs.add(path)
+                elif event == 'shutil.rmtree' or os.path.isdir(path):
+                    for dir_path, _, file_names in os.walk(path):
+                        for file_name in file_names:
+                            self._record_file(os.path.join(dir_path, file_name))
+                else:
+                    self._record_file(path)
+            except Exception as e:
+                self.invalidate(f"(cannot record {path}: {e})")
+
+    def _record_file(self, path):
+        self.touched_files.add(path)
+        if path in self.pristine_contents:
+            return
+        if os.path.isfile(path):
+            with open(path, mode='rb') as fp:
+                content = fp.read()
+            self.pristine_bytes += len(content)
+            if self.pristine_bytes > self.max_bytes:
+                raise MemoryError(f"pristine contents exceed {self.max_bytes} bytes")
+        else:
+            content = None
+        self.pristine_contents[path] = content
+
+    def invalidate(self, reason=''):
+        """
+        Marks the tracking as lost, such that the next restore falls back to git
+        """
+        with self._lock:
+            if not self.lost:
+                logger.warning(f"[GIT_RESTORE] Tracking of touched files in {self.root_dir} was lost {reason}")
+            self.lost = True
+            self.pristine_contents.clear()
+            self.pristine_bytes = 0
+            self.touched_files.clear()
+            self.created_dirs.clear()
+
+    def find_changes(self) -> list:
+        """
+        Returns the changes of the working tree reported by `git status --porcelain` (empty at the baseline)
+
+        Raises:
+            OSError: If git cannot be run
+
+            subprocess.CalledProcessError: If git fails
+        """
+        result = subprocess.run(['git', 'status', '--porcelain'], cwd=self.root_dir, check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        return result.stdout.splitlines()
+
+    def restore(self):
+        """
+        Restores the touched files to their baseline content and removes the created files and directories,
+        then verifies that the working tree is at its baseline
+
+        Returns:
+            bool: True if successful, False if the tracking is lost or changes remain after the restore
+        """
+        with self._lock:
+            if self.lost:
+                return False
+            _hook_state.suspended = True
+            try:
+                for path in self.touched_files:
+                    content = self.pristine_contents[path]
+                    if content is None:
+                        if os.path.isfile(path) or os.path.islink(path):
+                            os.remove(path)
+                    else:
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        with open(path, mode='wb') as fp:
+                            fp.write(content)
+                # Deepest directories first
+                for dir_path in sorted(self.created_dirs, key=len, reverse=True):
+                    if os.path.isdir(dir_path) and not os.listdir(dir_path):
+                        os.rmdir(dir_path)
+            except Exception as e:
+                self.invalidate(f"(while restoring: {e})")
+                return False
+            finally:
+                _hook_state.suspended = False
+
+            try:
+                changes = self.find_changes()
+            except (OSError, subprocess.CalledProcessError) as e:
+                self.invalidate(f"(cannot verify the restore: {e})")
+                return False
+            if changes:
+                # E.g., files written by a subprocess, which the audit hook does not see
+                self.invalidate(f"({len(changes)} changes remain after the restore, e.g., {changes[0].strip()})")
+                return False
+
+            logger.debug(f"[GIT_RESTORE] Restored {len(self.touched_files)} touched files in {self.root_dir}")
+            self.touched_files.clear()
+            self.created_dirs.clear()
+            self.restores += 1
+            return True
+
+    def rearm(self):
+        """
+        Restarts the tracking after the repository is restored to its baseline by git
+        """
+        with self._lock:
+            self.lost = False
+            self.touched_files.clear()
+            self.created_dirs.clear()
+
+
+def get_pristine_snapshot(root_dir: str) -> PristineSnapshot:
+    """
+    Returns the pristine snapshot of a repository directory, or None if it is not tracked yet
+    """
+    return PRISTINE_SNAPSHOTS.get(os.path.normpath(os.path.abspath(root_dir)))
+
+
+def start_pristine_snapshot(root_dir: str) -> PristineSnapshot:
+    """
+    Starts (or restarts) tracking the touched files of a repository directory which is at its baseline
+    """
+    _install_audit_hook()
+    snapshot = get_pristine_snapshot(root_dir)
+    if snapshot is None:
+        snapshot = PristineSnapshot(root_dir)
+        PRISTINE_SNAPSHOTS[snapshot.root_dir] = snapshot
+        logger.debug(f"[GIT_RESTORE] Tracking touched files in {snapshot.root_dir}")
+    else:
+        snapshot.rearm()
+    return snapshot
@@ -0,0 +1,336 @@
+"""
+Opt-in instrumentation of the search-based refactoring.
+
+Timers (spans) and counters are recorded around the expensive stages of the evaluation of individuals,
+i.e., `git_restore`, `RefactoringOperation.do_refactoring`, `update_understand_database`, the objective
+calculators (QMOOD, testability, and modularity), and the ANTLR parsing of Java files.
+Each span is tagged with the current context of the search (generation and individual), and the spans of
+individuals and generations enclose the spans of the stages they execute.
+
+The events are written one per line to a trace file under the log directory of the execution:
+
+1. `jsonl`: one JSON object per event.
+
+2. `chrome`: the JSON array format of the Chrome trace events, to be opened in chrome://tracing or
+https://ui.perfetto.dev (the closing bracket of the array is optional in this format).
+
+In both formats, a span is a complete event (`"ph": "X"`, with `ts` and `dur` in microseconds), and
+a counter update is a counter event (`"ph": "C"`, with the running total of the counter in `args`).
+Each process writes its own trace file (`<run name>_<pid>.<extension>`), and `Profiler.summary`
+aggregates the trace files of all processes of the run (e.g., the worktree pool workers).
+
+The profiler is disabled by default, in which case a span costs one attribute lookup.
+It is enabled for the search-based refactoring with the `PROFILING` environment variable (see `codart.config`),
+or by calling `get_profiler().start(trace_dir)`.
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.1.0'
+
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from codart.learner.sbr_initializer.utils.utility import logger
+
+TRACE_FORMATS = {'jsonl': 'jsonl', 'chrome': 'json'}  # Trace format --> file extension
+
+
+class _DisabledSpan:
+    """
+    The span returned by a disabled profiler, which does nothing
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+DISABLED_SPAN = _DisabledSpan()
+
+
+class Profiler:
+    """
+    Records spans and counters to a per-process trace file
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_dir = None
+        self.trace_format = 'jsonl'
+        self.run_name = None
+        self.context = dict()  # Attached to the args of each span, e.g., generation and individual
+        self.counters = defaultdict(int)
+        self._pid = None
+        self._fp = None
+        self._lock = threading.RLock()
+
+    def start(self, trace_dir: str, trace_format: str = 'jsonl', run_name: str = None):
+        """
+        Enables the profiler
+
+        Args:
+            trace_dir (str): The directory of the trace files, e.g., `config.PROJECT_LOG_DIR`
+
+            trace_format (str): 'jsonl' or 'chrome'
+
+            run_name (str): The prefix of the trace files of the run, `profile_<current time>` by default
+        """
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {trace_format}, expected one of {list(TRACE_FORMATS)}")
+        with self._lock:
+            self.close()
+            os.makedirs(trace_dir, exist_ok=True)
+            self.trace_dir = trace_dir
+            self.trace_format = trace_format
+            self.run_name = run_name or time.strftime('profile_%Y%m%d_%H%M%S')
+            self.counters = defaultdict(int)
+            self.enabled = True
+        logger.info(f"[PROFILING] Writing {trace_format} traces to {self.trace_path()}")
+
+    def stop(self):
+        with self._lock:
+            self.enabled = False
+            self.close()
+
+    def state(self) -> dict:
+        """
+        The settings and context of the profiler, to enable the same profiling in another process
+        """
+        return {
+            'enabled': self.enabled,
+            'trace_dir': self.trace_dir,
+            'trace_format': self.trace_format,
+            'run_name': self.run_name,
+            'context': dict(self.context),
+        }
+
+    def restore_state(self, state: dict):
+        """
+        Restores the state of the profiler of another process (see `state`)
+        """
+        if state is None:
+            return
+        if state['enabled'] and (not self.enabled or self.run_name != state['run_name']):
+            self.start(state['trace_dir'], trace_format=state['trace_format'], run_name=state['run_name'])
+        elif not state['enabled'] and self.enabled:
+            self.stop()
+        self.context = dict(state['context'])
+
+    def trace_path(self, pid: int = None) -> str:
+        pid = os.getpid() if pid is None else pid
+        return os.path.join(self.trace_dir, f'{self.run_name}_{pid}.{TRACE_FORMATS[self.trace_format]}')
+
+    def set_context(self, **context):
+        """
+        Sets the context attached to the next spans, a None value removes the key
+        """
+        for key, value in context.items():
+            if value is None:
+                self.context.pop(key, None)
+            else:
+                self.context[key] = value
+
+    def span(self, name: str, category: str = 'codart', context: dict = None, **args):
+        """
+        Measures the wall time of a block
+
+        Args:
+            name (str): The name of the span, e.g., 'git_restore'
+
+            category (str): The category of the span, e.g., 'objective'
+
+            context (dict): Context set for the spans nested in this span, e.g., {'individual': 3}
+
+            **args: Attached to the span
+
+        Returns:
+            A context manager
+        """
+        if not self.enabled:
+            return DISABLED_SPAN
+        return self._span(name, category, context, args)
+
+    @contextmanager
+    def _span(self, name, category, context, args):
+        previous_context = self.context
+        if context:
+            self.context = {**previous_context, **context}
+        start_time = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_counter
+            self.context = previous_context
+            self._write({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int(start_time * 1e6),
+                'dur': int(duration * 1e6),
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': {**previous_context, **(context or {}), **args},
+            })
+
+    def count(self, name: str, value: int = 1):
+        """
+        Increments a counter
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._check_process()
+            self.counters[name] += value
+            total = self.counters[name]
+        self._write({
+            'name': name,
+            'cat': 'counter',
+            'ph': 'C',
+            'ts': int(time.time() * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': {name: total},
+        })
+
+    def _check_process(self):
+        # A forked process writes its own trace file and counts from zero
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._fp = None
+            self.counters = defaultdict(int)
+
+    def _write(self, event: dict):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._check_process()
+            try:
+                if self._fp is None:
+                    path = self.trace_path()
+                    is_new_file = not os.path.exists(path)
+                    self._fp = open(path, mode='a', encoding='utf-8', buffering=1)
+                    if self.trace_format == 'chrome' and is_new_file:
+                        self._fp.write('[\n')
+                self._fp.write(line + (',\n' if self.trace_format == 'chrome' else '\n'))
+            except OSError as e:
+                logger.error(f"[PROFILING] Cannot write the trace file, the profiler is disabled: {e}")
+                self.enabled = False
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None and self._pid == os.getpid():
+                self._fp.close()
+            self._fp = None
+
+    def read_events(self):
+        """
+        Yields the events of the trace files of all processes of the run
+        """
+        pattern = os.path.join(self.trace_dir, f'{glob.escape(self.run_name)}_*.{TRACE_FORMATS[self.trace_format]}')
+        for path in sorted(glob.glob(pattern)):
+            with open(path, mode='r', encoding='utf-8') as fp:
+                for line in fp:
+                    line = line.strip().rstrip(',')
+                    if line in ('', '[', ']'):
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # The last line of a killed process may be incomplete
+                        continue
+
+    def summary(self) -> dict:
+        """
+        Aggregates the spans and counters of the run
+
+        Returns:
+            dict: 'spans' maps each span name to its count, total, mean, and max duration (in seconds),
+            sorted by the total duration, and 'counters' maps each counter to its total over all processes
+        """
+        if self.run_name is None:
+            return {'spans': {}, 'counters': {}}
+        with self._lock:
+            if self._fp is not None:
+                self._fp.flush()
+        spans = defaultdict(lambda: {'count': 0, 'total': 0., 'max': 0.})
+        counters = dict()  # (pid, counter name) --> last running total
+        for event in self.read_events():
+            if event.get('ph') == 'X':
+                stats = spans[event['name']]
+                duration = event['dur'] / 1e6
+                stats['count'] += 1
+                stats['total'] += duration
+                stats['max'] = max(stats['max'], duration)
+            elif event.get('ph') == 'C':
+                for name, total in event['args'].items():
+                    counters[(event['pid'], name)] = total
+
+        for stats in spans.values():
+            stats['mean'] = stats['total'] / stats['count']
+        counter_totals = defaultdict(int)
+        for (_, name), total in counters.items():
+            counter_totals[name] += total
+        return {
+            'spans': dict(sorted(spans.items(), key=lambda item: item[1]['total'], reverse=True)),
+            'counters': dict(sorted(counter_totals.items())),
+        }
+
+    def log_summary(self):
+        if self.run_name is None:
+            return
+        summary = self.summary()
+        logger.info("============ Profiling summary ============")
+        logger.info(f"Trace files: {os.path.join(self.trace_dir, self.run_name)}_*."
+                    f"{TRACE_FORMATS[self.trace_format]}")
+        logger.info(f"{'Span':<32} {'Count':>8} {'Total (s)':>12} {'Mean (s)':>10} {'Max (s)':>10}")
+        for name, stats in summary['spans'].items():
+            logger.info(f"{name:<32} {stats['count']:>8} {stats['total']:>12.3f} "
+                        f"{stats['mean']:>10.4f} {stats['max']:>10.4f}")
+        for name, total in summary['counters'].items():
+            logger.info(f"Counter {name}: {total}")
+        logger.info("============ End of profiling summary ============")
+
+
+_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+    """
+    Returns the profiler of the current process (disabled until started)
+    """
+    return _profiler
+
+
+def profiled(name: str = None, category: str = 'codart'):
+    """
+    Decorator recording a span for each call of a function when the profiler is enabled
+
+    Args:
+        name (str): The name of the span, the qualified name of the function by default
+
+        category (str): The category of the span
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = get_profiler()
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.span(span_name, category=category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,300 @@
+"""
+Reference index of the classes, methods, and fields of a project snapshot.
+
+The move, pull-up, and push-down refactorings look up a method or field and the files referring to it.
+Iterating over all entities of the Understand database (`db.ents("Java Method")`) for each refactoring is
+the biggest cost of these refactorings on large projects. The reference index is built from the Understand
+database once per project snapshot and maps:
+
+1. Each class and interface to its defining file, superclasses, and subclasses.
+
+2. Each method and field to its defining file, line, and column, and its declaring class.
+
+3. Each method to its callers (`Callby`), and each field to its users (`Useby`, `Setby`, and `Modifyby`),
+with the file, line, and column of each reference and the entity (and class) containing the reference.
+
+The refactorings then open only the files which they change, i.e., the files of the reference sites.
+
+A snapshot is identified by the content hashes of the Java files of the database, hence the index of a
+snapshot seen before (e.g., the initial version of the project, which is restored for each individual) is not
+built again, while the index of a changed project is never returned. The indices of the last snapshots are
+kept in memory (`reference_index_max_snapshots` in the `Config` section of the configuration).
+The index reflects the last analysis of the database, which must be up to date with the files
+(see `update_understand_database`).
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.1.0'
+
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+
+from codart.learner.sbr_initializer.utils.utility import logger, get_config_value
+from codart.utility.profiling import profiled
+
+CLASS_KINDS = "Java Class ~Unknown ~Unresolved ~Anonymous, Java Interface ~Unknown ~Unresolved"
+METHOD_KINDS = "Java Method ~Unknown ~Unresolved"
+FIELD_KINDS = "Java Variable Member ~Unknown ~Unresolved"
+METHOD_REFERENCE_KINDS = "Java Callby"
+FIELD_REFERENCE_KINDS = "Java Useby, Java Setby, Java Modifyby"
+
+_reference_indices = None
+_reference_indices_lock = threading.Lock()
+
+
+class IndexedReference:
+    __slots__ = ('kind', 'file', 'line', 'column', 'scope', 'scope_class')
+
+    def __init__(self, kind, file, line, column, scope, scope_class):
+        self.kind = kind  # e.g., 'Callby'
+        self.file = file  # The absolute path of the file of the reference
+        self.line = line
+        self.column = column
+        self.scope = scope  # The long name of the entity containing the reference, e.g., the calling method
+        self.scope_class = scope_class  # The long name of the class of the scope (None if unknown)
+
+    @property
+    def scope_class_name(self):
+        return self.scope_class.split('.')[-1] if self.scope_class else None
+
+    def __repr__(self):
+        return f'IndexedReference({self.kind}, {self.file}:{self.line}:{self.column}, {self.scope})'
+
+
+class IndexedMember:
+    __slots__ = ('longname', 'name', 'kind', 'type', 'parameters', 'file', 'line', 'column', 'class_longname',
+                 'references')
+
+    def __init__(self, longname, name, kind, type_, parameters, file, line, column, class_longname):
+        self.longname = longname
+        self.name = name
+        self.kind = kind  # The kind name, e.g., 'Public Static Method'
+        self.type = type_
+        self.parameters = parameters  # None for the fields
+        self.file = file  # The absolute path of the defining file
+        self.line = line
+        self.column = column
+        self.class_longname = class_longname  # The long name of the declaring class
+        self.references = []  # IndexedReference
+
+    @property
+    def class_name(self):
+        return self.class_longname.split('.')[-1] if self.class_longname else None
+
+    @property
+    def is_method(self):
+        return self.parameters is not None
+
+    def __repr__(self):
+        return f'IndexedMember({self.kind} {self.longname}, {self.file}:{self.line})'
+
+
+class IndexedClass:
+    __slots__ = ('longname', 'name', 'kind', 'file', 'superclasses', 'subclasses')
+
+    def __init__(self, longname, name, kind, file):
+        self.longname = longname
+        self.name = name
+        self.kind = kind
+        self.file = file  # The absolute path of the defining file
+        self.superclasses = []  # Long names of the extended classes
+        self.subclasses = []  # Long names of the extending classes
+
+    def __repr__(self):
+        return f'IndexedClass({self.kind} {self.longname}, {self.file})'
+
+
+def _defining_location(ent):
+    define = ent.ref("Definein")
+    if define is None:
+        return None, None, None
+    return define.file().longname(), define.line(), define.column()
+
+
+class ReferenceIndex:
+    """
+    The classes, methods, and fields of a project snapshot, and the references to the methods and fields
+    """
+
+    def __init__(self, snapshot_key=None):
+        self.snapshot_key = snapshot_key
+        self.classes = dict()  # Long name --> IndexedClass
+        self.members = defaultdict(list)  # Long name --> IndexedMember (the overloads of a method)
+        self._classes_by_name = defaultdict(list)  # Simple name --> IndexedClass
+        self._members_by_short_name = defaultdict(list)  # 'Class.member' --> IndexedMember
+
+    @classmethod
+    @profiled('build_reference_index', category='refactoring')
+    def from_understand(cls, db, snapshot_key=None):
+        """
+        Builds the index from an open Understand database
+        """
+        index = cls(snapshot_key=snapshot_key)
+        for ent in db.ents(CLASS_KINDS):
+            file, _, _ = _defining_location(ent)
+            indexed_class = IndexedClass(ent.longname(), ent.simplename(), ent.kindname(), file)
+            indexed_class.superclasses = [ref.ent().longname() for ref in ent.refs("Java Extend Couple")]
+            indexed_class.subclasses = [ref.ent().longname() for ref in ent.refs("Java Extendby Couple")]
+            index.add_class(indexed_class)
+
+        for kinds, reference_kinds in ((METHOD_KINDS, METHOD_REFERENCE_KINDS), (FIELD_KINDS, FIELD_REFERENCE_KINDS)):
+            is_method = kinds == METHOD_KINDS
+            for ent in db.ents(kinds):
+                parent = ent.parent()
+                file, line, column = _defining_location(ent)
+                member = IndexedMember(
+                    ent.longname(), ent.simplename(), ent.kindname(), ent.type(),
+                    (ent.parameters() or '') if is_method else None,
+                    file, line, column, parent.longname() if parent is not None else None
+                )
+                for ref in ent.refs(reference_kinds):
+                    scope = ref.ent()
+                    scope_parent = scope.parent()
+                    member.references.append(IndexedReference(
+                        ref.kindname(), ref.file().longname(), ref.line(), ref.column(), scope.longname(),
+                        scope_parent.longname() if scope_parent is not None else None
+                    ))
+                index.add_member(member)
+
+        logger.debug(f"[REFERENCE_INDEX] Indexed {len(index.classes)} classes and {len(index.members)} members")
+        return index
+
+    def add_class(self, indexed_class: IndexedClass):
+        self.classes[indexed_class.longname] = indexed_class
+        self._classes_by_name[indexed_class.name].append(indexed_class)
+
+    def add_member(self, member: IndexedMember):
+        self.members[member.longname].append(member)
+        self._members_by_short_name[f'{member.class_name}.{member.name}'].append(member)
+
+    def find_classes(self, name: str, package_name: str = None) -> list:
+        """
+        Returns the classes with a simple name (in a package, if given)
+        """
+        classes = self._classes_by_name.get(name, [])
+        if package_name:
+            classes = [c for c in classes if c.longname == f'{package_name}.{name}']
+        return list(classes)
+
+    def methods(self, longname: str) -> list:
+        """
+        Returns the overloads of a method, e.g., `methods('org.json.JSONObject.get')`
+        """
+        return [m for m in self.members.get(longname, []) if m.is_method]
+
+    def fields(self, longname: str) -> list:
+        return [m for m in self.members.get(longname, []) if not m.is_method]
+
+    def find_members(self, qualified_name: str, methods: bool = True, ignore_case: bool = False) -> list:
+        """
+        Returns the members whose long names end with a qualified name, e.g., 'JSONObject.get' or
+        'org.json.JSONObject.get' (the last two components must be the class and member names)
+
+        Args:
+            qualified_name (str): The class and member names, optionally qualified by a package
+
+            methods (bool): Whether to return the methods (True) or fields (False)
+
+            ignore_case (bool): Whether the class and member names are compared regardless of case
+        """
+        if ignore_case:
+            short_name = '.'.join(qualified_name.split('.')[-2:]).lower()
+            candidates = [m for key, members in self._members_by_short_name.items() if key.lower() == short_name
+                          for m in members]
+            suffix = qualified_name.lower()
+            return [m for m in candidates
+                    if m.is_method == methods and ('.' + m.longname.lower()).endswith('.' + suffix)]
+        candidates = self._members_by_short_name.get('.'.join(qualified_name.split('.')[-2:]), [])
+        return [m for m in candidates if m.is_method == methods and ('.' + m.longname).endswith('.' + qualified_name)]
+
+    def references(self, longname: str, parameters: str = None) -> list:
+        """
+        Returns the references to a method or field (to all overloads of a method unless parameters are given)
+        """
+        return [ref for m in self.members.get(longname, [])
+                if parameters is None or m.parameters == parameters for ref in m.references]
+
+    def referencing_files(self, longname: str, parameters: str = None) -> dict:
+        """
+        Maps each file referring to a method or field to the lines of the references, in the order of the files
+        """
+        files = OrderedDict()
+        for ref in self.references(longname, parameters=parameters):
+            files.setdefault(ref.file, []).append(ref.line)
+        return files
+
+
+def _snapshot_key(db) -> tuple:
+    """
+    The content hashes of the Java files of an Understand database
+    """
+    key = []
+    for file_ent in sorted(db.ents("Java File ~Unknown ~Unresolved"), key=lambda ent: ent.longname()):
+        path = file_ent.longname()
+        try:
+            with open(path, mode='rb') as fp:
+                digest = hashlib.sha1(fp.read()).hexdigest()
+        except OSError:
+            digest = None
+        key.append((path, digest))
+    return tuple(key)
+
+
+class ReferenceIndexCache:
+    """
+    LRU cache of the reference indices of the last project snapshots
+    """
+
+    def __init__(self, max_snapshots: int = 8):
+        self.max_snapshots = max_snapshots
+        self.entries = OrderedDict()  # Snapshot key --> ReferenceIndex
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    def get(self, db) -> ReferenceIndex:
+        key = _snapshot_key(db)
+        with self._lock:
+            index = self.entries.get(key)
+            if index is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        index = ReferenceIndex.from_understand(db, snapshot_key=key)
+        with self._lock:
+            self.entries[key] = index
+            while len(self.entries) > self.max_snapshots:
+                self.entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def log_statistics(self):
+        logger.info(f"[REFERENCE_INDEX] Reference index hits: {self.hits}, misses: {self.misses}, "
+                    f"cached snapshots: {len(self.entries)}")
+
+
+def get_reference_index(db) -> ReferenceIndex:
+    """
+    Returns the reference index of the project snapshot of an open Understand database, built once per snapshot
+
+    Args:
+        db (und.Db): The open Understand database, analyzed after the last change of the project
+
+    Returns:
+        ReferenceIndex: The shared index, which must not be modified
+    """
+    global _reference_indices
+    with _reference_indices_lock:
+        if _reference_indices is None:
+            max_snapshots = get_config_value('Config', 'reference_index_max_snapshots', fallback=8, value_type=int)
+            if max_snapshots <= 0:
+                return ReferenceIndex.from_understand(db)
+            _reference_indices = ReferenceIndexCache(max_snapshots=max_snapshots)
+    return _reference_indices.get(db)
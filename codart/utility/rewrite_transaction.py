@@ -0,0 +1,232 @@
+"""
+Multi-file rewrite transaction of a refactoring.
+
+A refactoring rewrites several files, e.g., Move Method rewrites the source class, the target class, and the
+files calling the method. When these files are written one by one (`parse_and_walk(has_write=True)`), a failure
+midway leaves the project half refactored, and the whole project must be restored (`git_restore`).
+
+A `RewriteTransaction` buffers the `TokenStreamRewriter` outputs of the refactoring in memory instead:
+
+1. The next listeners of the refactoring read the staged text of a file (`read` and `parse`), hence a file can
+be rewritten several times within the transaction. The staged texts are parsed with the parse tree cache.
+
+2. `commit` validates the staged texts (they must parse without syntax errors), writes each of them to a
+temporary file next to the original file, and then replaces the original files by renaming (`os.replace`).
+Either all files are replaced or, if a write or rename fails, the replaced files are written back and none is
+changed. A file which already had syntax errors before the transaction (e.g., a construct the grammar does not
+support) is not validated, since its rewritten text cannot parse either.
+
+3. `rollback` (or leaving the `with` block without a commit) discards the staged texts, and the project is
+left untouched, hence a failed refactoring needs no restore.
+
+The staged texts are validated by the parse tree cache (`parse_java_content`), which records the syntax errors
+of each parse, hence a text parsed by the next listeners is not parsed again, and the parse tree of a validated
+text is reused after the commit (the new content of the file has the same content hash).
+
+The renames are recorded by the pristine snapshot of `git_restore` (see `pristine_snapshot`).
+
+Changelog:
+    version 0.1.2
+        1. The staged texts of files which did not parse before the transaction are not rejected.
+    version 0.1.1
+        1. The staged texts are validated through the parse tree cache instead of a separate, uncached parse.
+
+Usage:
+
+    with RewriteTransaction() as transaction:
+        parse_and_walk(file_path, SomeListener, has_write=True, transaction=transaction, ...)
+        ...
+        transaction.commit()
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.1.2'
+
+import os
+import shutil
+from collections import OrderedDict
+
+from codart.learner.sbr_initializer.utils.utility import logger, get_config_value
+from codart.utility.parse_tree_cache import parse_java_file, parse_java_content
+from codart.utility.profiling import profiled
+
+TEMPORARY_FILE_SUFFIX = '.codart-tmp'
+
+
+class RewriteValidationError(Exception):
+    """
+    A staged text of a rewrite transaction does not parse
+    """
+
+    def __init__(self, errors: dict):
+        """
+        Args:
+            errors (dict): Maps each invalid file to the messages of its syntax errors
+        """
+        self.errors = errors
+        file_path, messages = next(iter(errors.items()))
+        super().__init__(f"{len(errors)} rewritten file(s) do not parse, e.g., {file_path}: {messages[0]}")
+
+
+class RewriteTransaction:
+    """
+    Buffers the rewritten texts of the files of a refactoring, and writes all or none of them
+    """
+
+    def __init__(self, validate: bool = None):
+        """
+        Args:
+            validate (bool): Whether the staged texts must parse to be committed,
+            `validate_rewrites` in the `Config` section of the configuration by default (True)
+        """
+        if validate is None:
+            validate = get_config_value('Config', 'validate_rewrites', fallback=True, value_type=bool)
+        self.validate = validate
+        self.staged = OrderedDict()  # Absolute path --> rewritten text
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.committed:
+            self.rollback()
+        return False
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normpath(os.path.abspath(file_path))
+
+    def is_staged(self, file_path: str) -> bool:
+        return self._key(file_path) in self.staged
+
+    def read(self, file_path: str) -> str:
+        """
+        Returns the staged text of a file, or its content if it is not staged
+        """
+        text = self.staged.get(self._key(file_path))
+        if text is not None:
+            return text
+        with open(file_path, mode='rb') as fp:
+            return fp.read().decode('utf-8', errors='ignore')
+
+    def parse(self, file_path: str):
+        """
+        Returns the (shared) token stream and parse tree of the staged text of a file, or of its content
+
+        Returns:
+            tuple: (common_token_stream, parse_tree)
+        """
+        text = self.staged.get(self._key(file_path))
+        if text is None:
+            return parse_java_file(file_path)
+        return parse_java_content(text.encode('utf-8', errors='ignore'), name=file_path)
+
+    def stage(self, file_path: str, text: str):
+        """
+        Buffers the rewritten text of a file until the transaction is committed
+        """
+        if self.committed:
+            raise RuntimeError("The rewrite transaction is already committed")
+        self.staged[self._key(file_path)] = text
+
+    def find_errors(self) -> dict:
+        """
+        Returns the syntax errors introduced by the staged texts (an empty dict if all of them parse).
+        The errors of a file which did not parse before the transaction are ignored.
+        """
+        errors = dict()
+        for file_path, text in self.staged.items():
+            messages = []
+            parse_java_content(text.encode('utf-8', errors='ignore'), name=file_path, syntax_errors=messages)
+            if messages and not self._has_original_errors(file_path):
+                errors[file_path] = messages
+        return errors
+
+    @staticmethod
+    def _has_original_errors(file_path: str) -> bool:
+        """
+        Whether the file had syntax errors before the transaction (False for a new file)
+        """
+        if not os.path.isfile(file_path):
+            return False
+        with open(file_path, mode='rb') as fp:
+            content = fp.read()
+        original_messages = []
+        parse_java_content(content, name=file_path, syntax_errors=original_messages)
+        if original_messages:
+            logger.debug(f"[REWRITE_TRANSACTION] {file_path} does not parse before the rewrite, it is not validated: "
+                         f"{original_messages[0]}")
+        return bool(original_messages)
+
+    @profiled('rewrite_commit', category='refactoring')
+    def commit(self):
+        """
+        Validates the staged texts and replaces all of the files, or none of them
+
+        Raises:
+            RewriteValidationError: If a staged text does not parse (the transaction is rolled back)
+
+            OSError: If a file cannot be written (the transaction is rolled back and the files are unchanged)
+        """
+        if self.committed:
+            return
+        if self.validate:
+            errors = self.find_errors()
+            if errors:
+                self.rollback()
+                raise RewriteValidationError(errors)
+
+        temporary_files = OrderedDict()  # Path --> temporary file with the staged text
+        original_contents = dict()  # Path --> content before the transaction (None if the file did not exist)
+        try:
+            for file_path, text in self.staged.items():
+                temporary_path = f'{file_path}.{os.getpid()}{TEMPORARY_FILE_SUFFIX}'
+                with open(temporary_path, mode='w', encoding='utf-8', errors='ignore', newline='') as f:
+                    f.write(text)
+                temporary_files[file_path] = temporary_path
+                if os.path.isfile(file_path):
+                    shutil.copymode(file_path, temporary_path)
+                    with open(file_path, mode='rb') as fp:
+                        original_contents[file_path] = fp.read()
+                else:
+                    original_contents[file_path] = None
+
+            replaced_files = []
+            try:
+                for file_path, temporary_path in temporary_files.items():
+                    os.replace(temporary_path, file_path)
+                    replaced_files.append(file_path)
+            except OSError:
+                self._write_back(replaced_files, original_contents)
+                raise
+        except OSError as e:
+            logger.error(f"[REWRITE_TRANSACTION] Cannot write the rewritten files, no file is changed: {e}")
+            self.rollback()
+            raise
+        finally:
+            for temporary_path in temporary_files.values():
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+
+        logger.debug(f"[REWRITE_TRANSACTION] Committed {len(self.staged)} rewritten files")
+        self.committed = True
+
+    @staticmethod
+    def _write_back(file_paths: list, original_contents: dict):
+        for file_path in file_paths:
+            content = original_contents[file_path]
+            if content is None:
+                os.remove(file_path)
+            else:
+                with open(file_path, mode='wb') as fp:
+                    fp.write(content)
+
+    def rollback(self):
+        """
+        Discards the staged texts, the files are not changed
+        """
+        if self.staged:
+            logger.debug(f"[REWRITE_TRANSACTION] Discarded {len(self.staged)} rewritten files")
+        self.staged.clear()
@@ -0,0 +1,222 @@
+"""
+Long-lived sessions on Understand databases.
+
+A session owns the `und` processes (analyze and export) of one Understand database:
+
+1. Analyze and export requests are serialized, within the process with a lock and across processes with a lock
+file next to the database, such that two analyses never run on the same database.
+
+2. Only the `und` processes started by the session are terminated (on timeout or cleanup).
+Processes of other jobs running on the same machine are never killed.
+
+3. The latency of each analysis is recorded and reported.
+
+The metrics and refactorings open (and close) their own database handles with `und.open`.
+
+Changelog:
+    version 0.2.0
+        1. Add `export_dependencies`, which replaces killing all `und.exe` processes after an export on Windows.
+        2. Remove the unused database handle of the session.
+
+"""
+
+__author__ = 'Morteza Zakeri'
+__version__ = '0.2.0'
+
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from codart.learner.sbr_initializer.utils.utility import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Normalized database path --> UnderstandSession
+UNDERSTAND_SESSIONS = dict()
+_sessions_lock = threading.Lock()
+
+
+class UnderstandSession:
+    """
+    The analyzer and export processes of one Understand database
+    """
+
+    def __init__(self, udb_path: str, max_trials: int = 5, retry_delay: float = 2., timeout: float = 3600):
+        """
+        Args:
+            udb_path (str): The absolute path of understand database.
+            max_trials (int): The number of analysis attempts before giving up
+            retry_delay (float): The delay between attempts in seconds
+            timeout (float): The maximum duration of an analysis in seconds
+        """
+        self.udb_path = udb_path
+        self.max_trials = max_trials
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.latencies = []  # Duration of each analyze request in seconds
+        self.failures = 0
+        self._process = None  # The running `und` process started by this session
+        self._lock = threading.RLock()
+
+    def analyze(self, changed: bool = True) -> bool:
+        """
+        Analyzes the database (only the changed files by default).
+
+        Args:
+            changed (bool): Whether to analyze only the changed files (`-changed`) or all files (`-all`)
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not os.path.exists(self.udb_path):
+            logger.error(f"[UND_SESSION] Database file does not exist: {self.udb_path}")
+            return False
+
+        command = ['und', 'analyze', '-changed' if changed else '-all', self.udb_path]
+        start_time = time.time()
+        with self._lock, self._database_file_lock():
+            success = False
+            for trial in range(1, self.max_trials + 1):
+                success, error = self._run_command(command)
+                if success:
+                    break
+                logger.warning(f"[UND_SESSION] Analysis attempt {trial}/{self.max_trials} of {self.udb_path} "
+                               f"failed: {error}")
+                if trial < self.max_trials:
+                    time.sleep(self.retry_delay)
+
+        latency = time.time() - start_time
+        self.latencies.append(latency)
+        if success:
+            logger.info(f"[UND_SESSION] Database {self.udb_path} analyzed in {latency:.2f}s")
+        else:
+            self.failures += 1
+            logger.error(f"[UND_SESSION] Failed to analyze {self.udb_path} after {self.max_trials} attempts")
+        return success
+
+    def export_dependencies(self, csv_path: str) -> bool:
+        """
+        Exports the class dependencies of the database to a csv file (`und export -dependencies class csv`)
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        command = ['und', 'export', '-format', 'long', '-dependencies', 'class', 'csv', csv_path, self.udb_path]
+        with self._lock, self._database_file_lock():
+            for trial in range(1, self.max_trials + 1):
+                success, error = self._run_command(command)
+                if success:
+                    return True
+                logger.debug(f"[UND_SESSION] Export attempt {trial}/{self.max_trials} of {self.udb_path} "
+                             f"failed: {error}")
+                if trial < self.max_trials:
+                    time.sleep(self.retry_delay)
+        logger.error(f"[UND_SESSION] Failed to export the dependencies of {self.udb_path} "
+                     f"after {self.max_trials} attempts")
+        return False
+
+    def _run_command(self, command):
+        # The process runs in its own process group, such that terminating it never touches other processes
+        self._process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=(os.name != 'nt')
+        )
+        try:
+            stdout, stderr = self._process.communicate(timeout=self.timeout)
+            return self._process.returncode == 0, stderr
+        except subprocess.TimeoutExpired:
+            self.terminate()
+            return False, f"timed out after {self.timeout}s"
+        finally:
+            self._process = None
+
+    def _database_file_lock(self):
+        return _FileLock(f"{os.path.normpath(self.udb_path)}.lock")
+
+    def terminate(self):
+        """
+        Terminates the `und` process started by this session (if any) and its children
+        """
+        process = self._process
+        if process is None or process.poll() is not None:
+            return
+        logger.debug(f"[UND_SESSION] Terminating und process {process.pid} of {self.udb_path}")
+        try:
+            if os.name == 'nt':
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+        except (ProcessLookupError, OSError) as e:
+            logger.debug(f"[UND_SESSION] Und process {process.pid} already exited: {e}")
+
+    def statistics(self) -> dict:
+        count = len(self.latencies)
+        return {
+            'analyses': count,
+            'failures': self.failures,
+            'total_latency': sum(self.latencies),
+            'mean_latency': sum(self.latencies) / count if count > 0 else 0.,
+            'max_latency': max(self.latencies) if count > 0 else 0.,
+        }
+
+    def log_statistics(self):
+        stats = self.statistics()
+        logger.info(f"[UND_SESSION] {self.udb_path}: {stats['analyses']} analyses ({stats['failures']} failed), "
+                    f"mean latency {stats['mean_latency']:.2f}s, max latency {stats['max_latency']:.2f}s, "
+                    f"total {stats['total_latency']:.2f}s")
+
+    def close(self):
+        with self._lock:
+            self.terminate()
+
+
+class _FileLock:
+    """
+    Exclusive lock on a file, used to serialize the analyses of a database across processes (POSIX only)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fp = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fp = open(self.path, mode='a')
+            fcntl.flock(self._fp.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._fp is not None:
+            fcntl.flock(self._fp.fileno(), fcntl.LOCK_UN)
+            self._fp.close()
+            self._fp = None
+
+
+def get_understand_session(udb_path: str) -> UnderstandSession:
+    """
+    Returns the session of an Understand database in the current process, created once
+    """
+    key = os.path.normcase(os.path.abspath(udb_path))
+    with _sessions_lock:
+        if key not in UNDERSTAND_SESSIONS:
+            UNDERSTAND_SESSIONS[key] = UnderstandSession(udb_path)
+        return UNDERSTAND_SESSIONS[key]
+
+
+def close_understand_sessions():
+    """
+    Terminates the `und` processes started by the sessions of the current process
+    """
+    with _sessions_lock:
+        for session in UNDERSTAND_SESSIONS.values():
+            session.log_statistics()
+            session.close()
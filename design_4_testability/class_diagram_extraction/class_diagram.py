@@ -2,6 +2,8 @@ from codart.gen.JavaParserLabeled import JavaParserLabeled
 from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
 from antlr4 import *
 
+import functools
+
 import networkx as nx
 import matplotlib.pyplot as plt
 import queue
@@ -9,6 +11,7 @@ import json
 
 from design_4_testability.utils.utils import File, Path, get_parser
 from design_4_testability import config
+from codart.utility.parallel_parsing import parse_files
 
 
 class ClassDiagramListener(JavaParserLabeledListener):
@@ -509,6 +512,18 @@ class StereotypeListener(JavaParserLabeledListener):
         return current_type
 
 
+def extract_class_dependencies(base_dirs, index_dic, file, token_stream, tree):
+    """
+    Walks ClassDiagramListener on the parse tree of a file (see `parallel_parsing.parse_files`)
+
+    Returns:
+        tuple: (the dependencies of the classes of the file, the number of constructor parameters)
+    """
+    listener = ClassDiagramListener(base_dirs, index_dic, Path.get_file_name_from_path(file), file)
+    ParseTreeWalker().walk(listener=listener, t=tree)
+    return listener.class_dic, listener.number_of_constructor_params
+
+
 class ClassDiagram:
     def __init__(self, java_project_address, base_dirs, files=None, index_dic=None):
         if files:
@@ -540,19 +555,15 @@ class ClassDiagram:
             self.class_diagram_graph.nodes[index]['name'] = c
 
         print('Start making class diagram . . .')
+        # The files are parsed in parallel, and the dependencies of each file are added in the order of the files
+        dependencies = parse_files(
+            self.files, functools.partial(extract_class_dependencies, self.base_dirs, self.index_dic)
+        )
         for f in self.files:
-            file_name = Path.get_file_name_from_path(f)
-            parser = get_parser(f)
-            tree = parser.compilationUnit()
-            listener = ClassDiagramListener(self.base_dirs, self.index_dic, file_name, f)
-            walker = ParseTreeWalker()
-
-            walker.walk(
-                listener=listener,
-                t=tree
-            )
-            total_number_of_constructor_params += listener.number_of_constructor_params
-            graph = listener.class_dic
+            if dependencies[f] is None:
+                continue
+            graph, number_of_constructor_params = dependencies[f]
+            total_number_of_constructor_params += number_of_constructor_params
             # print('graph:', graph)
             # add edges to class_diagram
             for c in graph:
@@ -560,7 +571,7 @@ class ClassDiagram:
                     if i in self.index_dic.keys():
                         n1 = self.index_dic[c]['index']
                         n2 = self.index_dic[i]['index']
-                        relation_type = listener.class_dic[c][i]
+                        relation_type = graph[c][i]
                         self.class_diagram_graph.add_edge(n1, n2)
                         self.class_diagram_graph[n1][n2]['relation_type'] = relation_type
         print('total_number_of_constructor_params: ', total_number_of_constructor_params)
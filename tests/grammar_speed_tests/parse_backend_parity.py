@@ -0,0 +1,197 @@
+"""
+Parity tests of the C++ (java8speedy) and Python parse backends (see `codart.utility.parse_backend`),
+and the startup-time report of both backends.
+
+For each Java file of the benchmark projects, the backends must produce:
+
+1. The same parse tree: the context classes, the start and stop tokens of each context, the token labels,
+and the tokens of the terminals (both trees are bound to the same Python token stream).
+
+2. The same symbols (`symbol_table.summarize_file_symbols`).
+
+3. The same text after the same `TokenStreamRewriter` edits.
+
+Usage:
+    python tests/grammar_speed_tests/parse_backend_parity.py [directories of Java files]
+
+The Java files of `benchmark_projects` and `tests/*/benchmark_projects_test` are checked by default.
+The C++ parser is installed with `pip install ./speedy`.
+
+"""
+
+__version__ = '0.1.0'
+__author__ = 'Morteza Zakeri'
+
+import glob
+import os
+import subprocess
+import sys
+import time
+
+from antlr4 import ParseTreeWalker, Token
+from antlr4.TokenStreamRewriter import TokenStreamRewriter
+from antlr4.tree.Tree import TerminalNode
+
+from codart.gen.JavaParserLabeled import JavaParserLabeled
+from codart.gen.JavaParserLabeledListener import JavaParserLabeledListener
+from codart.symbol_table import summarize_file_symbols
+from codart.utility.parse_backend import load_cpp_parser
+from codart.utility.parse_tree_cache import parse_java_source
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DIRECTORIES = [os.path.join(REPO_DIR, 'benchmark_projects')] + \
+                      sorted(glob.glob(os.path.join(REPO_DIR, 'tests', '*', 'benchmark_projects_test')))
+
+# Parses a file in a new interpreter: import, first parse, and the mean of the next parses (in seconds)
+STARTUP_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+from codart.utility.parse_tree_cache import parse_java_source
+from codart.utility.parse_backend import set_parse_backend
+set_parse_backend(sys.argv[2])
+import_time = time.perf_counter() - start
+source = open(sys.argv[1], encoding='utf-8', errors='ignore').read()
+start = time.perf_counter()
+parse_java_source(source)
+first_parse_time = time.perf_counter() - start
+start = time.perf_counter()
+for _ in range(int(sys.argv[3])):
+    parse_java_source(source)
+print(import_time, first_parse_time, (time.perf_counter() - start) / int(sys.argv[3]))
+'''
+
+
+class DeclarationCollector(JavaParserLabeledListener):
+    def __init__(self):
+        self.classes = []
+        self.methods = []
+
+    def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
+        self.classes.append(ctx)
+
+    def enterMethodDeclaration(self, ctx: JavaParserLabeled.MethodDeclarationContext):
+        self.methods.append(ctx)
+
+
+def tree_signature(tree) -> list:
+    """
+    The nodes of a parse tree in pre-order, with the token indices of their start, stop, and labels
+    """
+    def index(token):
+        return token.tokenIndex if token is not None else None
+
+    signature = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, TerminalNode):
+            signature.append(('terminal', index(node.symbol), node.symbol.text))
+            continue
+        labels = tuple(sorted((name, index(value)) for name, value in vars(node).items()
+                              if isinstance(value, Token) and name not in ('start', 'stop')))
+        signature.append((type(node).__name__, index(node.start), index(node.stop), labels,
+                          node.parser.getTokenStream() is not None))
+        stack.extend(reversed(node.children or []))
+    return signature
+
+
+def rewritten_text(token_stream, tree) -> str:
+    """
+    Renames each class and adds a comment before each method, similar to the refactorings
+    """
+    collector = DeclarationCollector()
+    ParseTreeWalker().walk(collector, tree)
+    rewriter = TokenStreamRewriter(token_stream)
+    for class_ctx in collector.classes:
+        identifier = class_ctx.IDENTIFIER().getSymbol()
+        rewriter.replaceRange(identifier.tokenIndex, identifier.tokenIndex, identifier.text + 'Refactored')
+    for method_ctx in collector.methods:
+        rewriter.insertBeforeIndex(method_ctx.parentCtx.parentCtx.start.tokenIndex, '/* moved */ ')
+    return rewriter.getDefaultText()
+
+
+def check_file(java_file_path: str) -> list:
+    """
+    Returns the differences of the backends on a Java file (empty if they agree)
+    """
+    with open(java_file_path, mode='rb') as fp:
+        source = fp.read().decode('utf-8', errors='ignore')
+    results = {}
+    for backend in ('python', 'cpp'):
+        token_stream, tree = parse_java_source(source, name=java_file_path, backend=backend)
+        results[backend] = (token_stream, tree)
+
+    differences = []
+    (py_tokens, py_tree), (cpp_tokens, cpp_tree) = results['python'], results['cpp']
+    py_signature, cpp_signature = tree_signature(py_tree), tree_signature(cpp_tree)
+    if py_signature != cpp_signature:
+        for i, (py_node, cpp_node) in enumerate(zip(py_signature, cpp_signature)):
+            if py_node != cpp_node:
+                differences.append(f'parse tree node {i}: python {py_node}, cpp {cpp_node}')
+                break
+        else:
+            differences.append(f'parse tree size: python {len(py_signature)}, cpp {len(cpp_signature)}')
+    if summarize_file_symbols(java_file_path, py_tokens, py_tree) != \
+            summarize_file_symbols(java_file_path, cpp_tokens, cpp_tree):
+        differences.append('symbols')
+    if TokenStreamRewriter(cpp_tokens).getDefaultText() != source:
+        differences.append('unmodified text')
+    if rewritten_text(py_tokens, py_tree) != rewritten_text(cpp_tokens, cpp_tree):
+        differences.append('rewritten text')
+    return differences
+
+
+def check_parity(directories: list) -> bool:
+    java_files = sorted({os.path.abspath(path) for directory in directories
+                         for path in glob.glob(os.path.join(directory, '**', '*.java'), recursive=True)})
+    print(f'Checking {len(java_files)} Java files')
+    failed = 0
+    for java_file_path in java_files:
+        try:
+            differences = check_file(java_file_path)
+        except Exception as e:
+            differences = [f'{type(e).__name__}: {e}']
+        if differences:
+            failed += 1
+            print(f'FAIL {java_file_path}: {"; ".join(differences)}')
+    print(f'{len(java_files) - failed} of {len(java_files)} files have the same results on both backends')
+    return failed == 0
+
+
+def startup_report(java_file_path: str, repeats: int = 3):
+    """
+    Prints the import time, the first parse time, and the mean time of the next parses of each backend,
+    each measured in a new interpreter
+    """
+    print(f'Startup times of {java_file_path} ({os.path.getsize(java_file_path)} bytes):')
+    print(f"{'Backend':<8} {'Import (s)':>11} {'First parse (s)':>16} {'Next parses (s)':>16}")
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_DIR, os.environ.get('PYTHONPATH', '')]))
+    for backend in ('python', 'cpp'):
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, java_file_path, backend, str(repeats)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, env=environment, cwd=REPO_DIR
+        )
+        if result.returncode != 0:
+            print(f'{backend:<8} failed: {result.stderr.strip().splitlines()[-1]}')
+            continue
+        import_time, first_parse_time, next_parse_time = map(float, result.stdout.split()[-3:])
+        print(f'{backend:<8} {import_time:>11.3f} {first_parse_time:>16.3f} {next_parse_time:>16.3f}')
+
+
+def main():
+    if load_cpp_parser() is None:
+        print('The C++ parser (java8speedy) is not installed, install it with: pip install ./speedy')
+        sys.exit(1)
+    directories = sys.argv[1:] or DEFAULT_DIRECTORIES
+    start_time = time.perf_counter()
+    passed = check_parity(directories)
+    print(f'Parity checked in {time.perf_counter() - start_time:.1f} s')
+    java_files = [path for directory in directories
+                  for path in glob.glob(os.path.join(directory, '**', '*.java'), recursive=True)]
+    if java_files:
+        startup_report(max(java_files, key=os.path.getsize))
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Tests of the duplicate elimination of the search-based refactoring (`search_based_refactoring2`):
+the offsprings of one mating step (plain lists of refactoring operations) are deduplicated together with
+their parents (Individual objects).
+
+"""
+
+__version__ = '0.1.0'
+__author__ = 'Morteza Zakeri'
+
+import random
+import unittest
+
+import numpy as np
+from pymoo.core.population import Population
+
+from codart.sbse.search_based_refactoring2 import (
+    AdaptiveSinglePointCrossover, Individual, RefactoringOperation, RefactoringSequenceDuplicateElimination,
+    is_equal_2_refactorings_list, refactoring_sequence_key
+)
+
+
+def make_refactoring(i):
+    return RefactoringOperation(
+        name='Make Field Static', params={'source_class': f'C{i}', 'field_name': f'f{i}'}, main=print
+    )
+
+
+def make_individual(genes):
+    individual = Individual()
+    for i in genes:
+        individual.append(make_refactoring(i))
+    return individual
+
+
+class DuplicateEliminationTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(7)
+        self.parent_a = make_individual(range(0, 10))
+        self.parent_b = make_individual(range(10, 20))
+
+    def mate(self):
+        X = np.full((2, 1, 1), None, dtype=object)
+        X[0, 0, 0], X[1, 0, 0] = self.parent_a, self.parent_b
+        Y = AdaptiveSinglePointCrossover()._do(None, X)
+        return Y[0, 0, 0], Y[1, 0, 0]
+
+    def test_keys_of_lists_and_individuals(self):
+        self.assertEqual(refactoring_sequence_key(list(self.parent_a)), refactoring_sequence_key(self.parent_a))
+        self.assertEqual(hash(refactoring_sequence_key(list(self.parent_a))), hash(self.parent_a.canonical_key))
+
+    def test_one_mating_step(self):
+        offspring_a, offspring_b = self.mate()
+        self.assertIsInstance(offspring_a, list)
+        # The copy of an offspring as an individual, and the copy of a parent as a plain list are duplicates
+        offspring_copy = make_individual([])
+        for refactoring in offspring_a:
+            offspring_copy.append(refactoring)
+        sequences = [self.parent_a, self.parent_b, offspring_a, offspring_b, offspring_copy, list(self.parent_b)]
+        X = np.empty((len(sequences), 1), dtype=object)
+        for i, sequence in enumerate(sequences):
+            X[i, 0] = sequence
+        pop = Population.new(X=X)
+
+        eliminator = RefactoringSequenceDuplicateElimination()
+        _, no_duplicate, is_duplicate = eliminator.do(pop, return_indices=True)
+        self.assertEqual(no_duplicate, [0, 1, 2, 3])
+        self.assertEqual(is_duplicate, [4, 5])
+        self.assertTrue(is_equal_2_refactorings_list(pop[2], pop[4]))
+        self.assertFalse(is_equal_2_refactorings_list(pop[0], pop[1]))
+
+        # The offsprings are also compared with the current population (`other`)
+        parents = Population.new(X=X[:2])
+        offsprings = eliminator.do(Population.new(X=X[2:]), parents)
+        self.assertEqual(len(offsprings), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()